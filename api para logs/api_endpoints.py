@@ -1,19 +1,32 @@
-from flask import Blueprint, request, jsonify
-import logging
+from flask import Blueprint, request, jsonify, url_for
+import json
 import random
-import time
-from datetime import datetime
-import uuid
+from rate_limit import rate_limited
+from processing import engine, records_from_payload, EngineBusyError, NdjsonStream
+from events import (
+    api_log, auth_log, error_log, user_log, LOGIN_SCENARIOS, SYSTEM_ERRORS, SYSTEM_WARNINGS,
+    log_login_attempt, log_user_registration, log_system_error, log_system_warning,
+    log_processing_result
+)
 
 # Crear blueprint para los endpoints de API
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
-# Loggers específicos
-api_logger = logging.getLogger('api_microservice')
-security_logger = logging.getLogger('security')
-error_logger = logging.getLogger('errors')
+# Respuesta HTTP de cada escenario de login fallido
+LOGIN_ERROR_RESPONSES = {
+    'invalid_password': (401, "Invalid credentials"),
+    'user_not_found': (404, "User not found"),
+    'account_locked': (423, "Account is locked")
+}
+
+# Máximo de eventos aceptados en /api/events/batch
+MAX_BATCH_EVENTS = 1000
+
+# Campos de contexto que un evento del lote puede fijar explícitamente
+BATCH_CONTEXT_FIELDS = ('request_id', 'source_ip', 'user_agent', 'timestamp')
 
 @api_bp.route('/user/login', methods=['POST'])
+@rate_limited(per_ip='30/minute', per_user='10/minute')
 def user_login():
     """Simula login de usuario - genera logs de seguridad"""
     try:
@@ -22,93 +35,28 @@ def user_login():
         password = data.get('password', '')
         
         # Simular diferentes escenarios de login
-        scenarios = ['success', 'invalid_password', 'user_not_found', 'account_locked']
-        scenario = random.choice(scenarios)
-        
-        request_id = getattr(request, 'request_id', str(uuid.uuid4()))
+        scenario = random.choice(list(LOGIN_SCENARIOS))
+        session_id = log_login_attempt(username, scenario)
         
         if scenario == 'success':
-            security_logger.info("User login successful", extra={
-                "event_type": "user_authentication",
-                "action": "login",
-                "status": "success",
-                "username": username,
-                "request_id": request_id,
-                "source_ip": request.remote_addr,
-                "user_agent": request.headers.get('User-Agent', ''),
-                "timestamp": datetime.now().isoformat(),
-                "session_id": str(uuid.uuid4())
-            })
-            
             return jsonify({
                 "status": "success",
                 "message": "Login successful",
-                "session_id": str(uuid.uuid4()),
+                "session_id": session_id,
                 "user": username
             }), 200
-            
-        elif scenario == 'invalid_password':
-            security_logger.warning("Invalid password attempt", extra={
-                "event_type": "user_authentication",
-                "action": "login",
-                "status": "failed",
-                "failure_reason": "invalid_password",
-                "username": username,
-                "request_id": request_id,
-                "source_ip": request.remote_addr,
-                "user_agent": request.headers.get('User-Agent', ''),
-                "timestamp": datetime.now().isoformat()
-            })
-            
-            return jsonify({
-                "status": "error",
-                "message": "Invalid credentials"
-            }), 401
-            
-        elif scenario == 'user_not_found':
-            security_logger.warning("Login attempt for non-existent user", extra={
-                "event_type": "user_authentication",
-                "action": "login",
-                "status": "failed",
-                "failure_reason": "user_not_found",
-                "username": username,
-                "request_id": request_id,
-                "source_ip": request.remote_addr,
-                "user_agent": request.headers.get('User-Agent', ''),
-                "timestamp": datetime.now().isoformat()
-            })
-            
-            return jsonify({
-                "status": "error",
-                "message": "User not found"
-            }), 404
-            
-        else:  # account_locked
-            security_logger.error("Login attempt on locked account", extra={
-                "event_type": "user_authentication",
-                "action": "login",
-                "status": "blocked",
-                "failure_reason": "account_locked",
-                "username": username,
-                "request_id": request_id,
-                "source_ip": request.remote_addr,
-                "user_agent": request.headers.get('User-Agent', ''),
-                "timestamp": datetime.now().isoformat(),
-                "security_alert": True
-            })
-            
-            return jsonify({
-                "status": "error",
-                "message": "Account is locked"
-            }), 423
+        
+        status_code, message = LOGIN_ERROR_RESPONSES[scenario]
+        return jsonify({
+            "status": "error",
+            "message": message
+        }), status_code
             
     except Exception as e:
-        error_logger.error("Error in login endpoint", extra={
+        error_log.error("Error in login endpoint", extra={
             "event_type": "application_error",
             "error_type": "login_exception",
-            "error_message": str(e),
-            "request_id": getattr(request, 'request_id', 'unknown'),
-            "timestamp": datetime.now().isoformat()
+            "error_message": str(e)
         })
         
         return jsonify({
@@ -117,6 +65,7 @@ def user_login():
         }), 500
 
 @api_bp.route('/user/register', methods=['POST'])
+@rate_limited(per_ip='10/minute')
 def user_register():
     """Simula registro de usuario"""
     try:
@@ -124,34 +73,20 @@ def user_register():
         username = data.get('username', 'unknown')
         email = data.get('email', 'unknown')
         
-        request_id = getattr(request, 'request_id', str(uuid.uuid4()))
-        
         # Simular registro exitoso
-        api_logger.info("User registration", extra={
-            "event_type": "user_management",
-            "action": "register",
-            "status": "success",
-            "username": username,
-            "email": email,
-            "request_id": request_id,
-            "source_ip": request.remote_addr,
-            "timestamp": datetime.now().isoformat(),
-            "user_id": str(uuid.uuid4())
-        })
+        user_id = log_user_registration(username, email)
         
         return jsonify({
             "status": "success",
             "message": "User registered successfully",
-            "user_id": str(uuid.uuid4())
+            "user_id": user_id
         }), 201
         
     except Exception as e:
-        error_logger.error("Error in register endpoint", extra={
+        error_log.error("Error in register endpoint", extra={
             "event_type": "application_error",
             "error_type": "registration_exception",
-            "error_message": str(e),
-            "request_id": getattr(request, 'request_id', 'unknown'),
-            "timestamp": datetime.now().isoformat()
+            "error_message": str(e)
         })
         
         return jsonify({
@@ -160,58 +95,58 @@ def user_register():
         }), 500
 
 @api_bp.route('/data/process', methods=['POST'])
+@rate_limited(per_ip='60/minute')
 def process_data():
-    """Simula procesamiento de datos"""
+    """
+    Procesa los registros enviados en "data" (síncrono, o asíncrono con ?mode=async).
+    Con Content-Type application/x-ndjson el cuerpo se procesa en streaming,
+    un registro por línea, siempre en modo síncrono.
+    """
     try:
-        data = request.get_json() or {}
-        processing_time = random.uniform(0.1, 2.0)
-        time.sleep(processing_time)
+        if request.mimetype == 'application/x-ndjson':
+            return _process_ndjson_stream()
         
-        request_id = getattr(request, 'request_id', str(uuid.uuid4()))
+        data = request.get_json() or {}
+        records = records_from_payload(data)
+        # Tamaño en bytes del cuerpo ya leído (sin volver a serializarlo)
+        data_size = len(request.get_data())
         
-        # Simular diferentes escenarios de procesamiento
-        if random.random() < 0.8:  # 80% éxito
-            api_logger.info("Data processing completed", extra={
-                "event_type": "data_processing",
-                "action": "process",
-                "status": "success",
-                "processing_time_seconds": round(processing_time, 3),
-                "data_size": len(str(data)),
-                "request_id": request_id,
-                "timestamp": datetime.now().isoformat(),
-                "records_processed": random.randint(1, 1000)
-            })
-            
-            return jsonify({
-                "status": "success",
-                "message": "Data processed successfully",
-                "processing_time": round(processing_time, 3),
-                "records_processed": random.randint(1, 1000)
-            }), 200
-        else:  # 20% fallo
-            error_logger.warning("Data processing failed", extra={
-                "event_type": "data_processing",
-                "action": "process",
-                "status": "failed",
-                "processing_time_seconds": round(processing_time, 3),
-                "data_size": len(str(data)),
-                "request_id": request_id,
-                "timestamp": datetime.now().isoformat(),
-                "error_reason": "data_validation_failed"
-            })
+        async_mode = request.args.get('mode') == 'async' or (isinstance(data, dict) and data.get('async') is True)
+        if async_mode:
+            def on_done(job_id, result):
+                if result is not None:
+                    log_processing_result(result, data_size, job_id)
             
+            job_id = engine.submit_job(records, on_done=on_done)
             return jsonify({
-                "status": "error",
-                "message": "Data validation failed"
-            }), 400
+                "status": "accepted",
+                "message": "Data processing job queued",
+                "job_id": job_id,
+                "status_url": url_for('api.get_processing_job', job_id=job_id)
+            }), 202
+        
+        result = engine.run(records)
+        log_processing_result(result, data_size)
+        return _processing_response(result)
+        
+    except EngineBusyError:
+        error_log.warning("Data processing rejected", extra={
+            "event_type": "data_processing",
+            "action": "process",
+            "status": "failed",
+            "error_reason": "engine_busy"
+        })
+        
+        return jsonify({
+            "status": "error",
+            "message": "Processing engine busy, retry later"
+        }), 503
             
     except Exception as e:
-        error_logger.error("Error in data processing", extra={
+        error_log.error("Error in data processing", extra={
             "event_type": "application_error",
             "error_type": "data_processing_exception",
-            "error_message": str(e),
-            "request_id": getattr(request, 'request_id', 'unknown'),
-            "timestamp": datetime.now().isoformat()
+            "error_message": str(e)
         })
         
         return jsonify({
@@ -219,29 +154,64 @@ def process_data():
             "message": "Processing failed"
         }), 500
 
-@api_bp.route('/system/error', methods=['GET'])
-def trigger_error():
-    """Endpoint para simular errores del sistema"""
-    request_id = getattr(request, 'request_id', str(uuid.uuid4()))
+def _process_ndjson_stream():
+    """Procesa un cuerpo NDJSON leyéndolo de request.stream a medida que llega"""
+    if request.args.get('mode') == 'async':
+        # La respuesta 202 cerraría el request antes de terminar de leer el cuerpo
+        return jsonify({
+            "status": "error",
+            "message": "Async mode requires a JSON body"
+        }), 400
     
-    error_types = [
-        ("database_connection_failed", "Database connection timeout"),
-        ("memory_limit_exceeded", "Memory usage exceeded 90%"),
-        ("external_service_unavailable", "External API service unreachable"),
-        ("disk_space_low", "Disk space below 5%")
-    ]
+    records = NdjsonStream(request.stream)
+    try:
+        result = engine.run(records)
+    except Exception:
+        # Timeout o motor ocupado: que el hilo del pool deje de leer request.stream
+        records.cancel()
+        raise
+    log_processing_result(result, records.bytes_read)
+    return _processing_response(result)
+
+def processing_response_body(result):
+    """Cuerpo y status HTTP de la respuesta de un lote procesado"""
+    if result["status"] == "success":
+        return {
+            "status": "success",
+            "message": "Data processed successfully",
+            "processing_time": result["processing_time_seconds"],
+            "records_processed": result["records_processed"],
+            "checksum": result["checksum"]
+        }, 200
     
-    error_type, error_message = random.choice(error_types)
+    return {
+        "status": "error",
+        "message": "Data validation failed",
+        "records_invalid": result["records_invalid"]
+    }, 400
+
+def _processing_response(result):
+    body, status_code = processing_response_body(result)
+    return jsonify(body), status_code
+
+@api_bp.route('/data/jobs/<job_id>', methods=['GET'])
+def get_processing_job(job_id):
+    """Estado de un trabajo de procesamiento asíncrono"""
+    job = engine.get_job(job_id)
+    if job is None:
+        return jsonify({
+            "status": "error",
+            "message": "Job not found"
+        }), 404
     
-    error_logger.error("System error triggered", extra={
-        "event_type": "system_error",
-        "error_type": error_type,
-        "error_message": error_message,
-        "request_id": request_id,
-        "timestamp": datetime.now().isoformat(),
-        "severity": "high",
-        "component": "system"
-    })
+    return jsonify(job), 200
+
+@api_bp.route('/system/error', methods=['GET'])
+def trigger_error():
+    """Endpoint para simular errores del sistema"""
+    error_type = random.choice(list(SYSTEM_ERRORS))
+    error_message = SYSTEM_ERRORS[error_type]
+    log_system_error(error_type, error_message)
     
     return jsonify({
         "status": "error",
@@ -252,29 +222,125 @@ def trigger_error():
 @api_bp.route('/system/warning', methods=['GET'])
 def trigger_warning():
     """Endpoint para simular warnings del sistema"""
-    request_id = getattr(request, 'request_id', str(uuid.uuid4()))
+    warning_type = random.choice(list(SYSTEM_WARNINGS))
+    warning_message = SYSTEM_WARNINGS[warning_type]
+    log_system_warning(warning_type, warning_message)
+    
+    return jsonify({
+        "status": "warning",
+        "type": warning_type,
+        "message": warning_message
+    }), 200
+
+def _parse_batch_body():
+    """Lee el lote como array JSON, {"events": [...]} o NDJSON (un evento por línea)"""
+    if request.mimetype == 'application/x-ndjson':
+        events = []
+        for line in request.get_data(as_text=True).splitlines():
+            if line.strip():
+                events.append(json.loads(line))
+        return events
+    
+    body = request.get_json(silent=True)
+    if isinstance(body, dict):
+        body = body.get('events')
+    if not isinstance(body, list):
+        raise ValueError("Body must be a JSON array of events, {\"events\": [...]} or NDJSON")
+    return body
+
+def _adapter_context(adapter, context):
+    """Solo los campos de contexto que el adapter del emisor completa en los eventos individuales"""
+    fields = adapter.fields + (('timestamp',) if adapter.timestamp else ())
+    return {field: value for field, value in context.items() if field in fields}
+
+def _validate_batch_event(event):
+    """Valida un evento del lote; devuelve (tipo, emisor, argumentos, contexto) o lanza ValueError"""
+    if not isinstance(event, dict):
+        raise ValueError("event must be an object")
     
-    warning_types = [
-        ("high_cpu_usage", "CPU usage above 80%"),
-        ("slow_response_time", "Response time above 2 seconds"),
-        ("cache_miss_rate_high", "Cache miss rate above 50%"),
-        ("connection_pool_low", "Connection pool usage above 85%")
-    ]
+    context = {}
+    for field in BATCH_CONTEXT_FIELDS:
+        if field in event:
+            if not isinstance(event[field], str):
+                raise ValueError(f"{field} must be a string")
+            context[field] = event[field]
     
-    warning_type, warning_message = random.choice(warning_types)
+    event_type = event.get('type')
+    if event_type == 'login':
+        if not isinstance(event.get('username'), str):
+            raise ValueError("login requires a string username")
+        if event.get('outcome') not in LOGIN_SCENARIOS:
+            raise ValueError(f"login outcome must be one of {', '.join(LOGIN_SCENARIOS)}")
+        return 'login', log_login_attempt, (event['username'], event['outcome']), _adapter_context(auth_log, context)
     
-    api_logger.warning("System warning triggered", extra={
-        "event_type": "system_warning",
-        "warning_type": warning_type,
-        "warning_message": warning_message,
-        "request_id": request_id,
-        "timestamp": datetime.now().isoformat(),
-        "severity": "medium",
-        "component": "system"
+    if event_type == 'register':
+        if not isinstance(event.get('username'), str):
+            raise ValueError("register requires a string username")
+        return 'register', log_user_registration, (event['username'], str(event.get('email', 'unknown'))), _adapter_context(user_log, context)
+    
+    if event_type == 'warning':
+        if event.get('warning_type') not in SYSTEM_WARNINGS:
+            raise ValueError(f"warning_type must be one of {', '.join(SYSTEM_WARNINGS)}")
+        return 'warning', log_system_warning, (event['warning_type'],), _adapter_context(api_log, context)
+    
+    if event_type == 'error':
+        if event.get('error_type') not in SYSTEM_ERRORS:
+            raise ValueError(f"error_type must be one of {', '.join(SYSTEM_ERRORS)}")
+        return 'error', log_system_error, (event['error_type'],), _adapter_context(error_log, context)
+    
+    raise ValueError("type must be one of login, register, warning, error")
+
+@api_bp.route('/events/batch', methods=['POST'])
+@rate_limited(per_ip='60/minute')
+def ingest_event_batch():
+    """
+    Ingesta de eventos por lote (login, register, warning, error)
+    Valida todo el lote en una pasada y, si es válido, emite cada evento
+    con los mismos campos que los endpoints individuales
+    """
+    try:
+        events = _parse_batch_body()
+    except ValueError as e:
+        return jsonify({
+            "status": "error",
+            "message": f"Invalid batch body: {e}"
+        }), 400
+    
+    if len(events) > MAX_BATCH_EVENTS:
+        return jsonify({
+            "status": "error",
+            "message": f"Batch exceeds {MAX_BATCH_EVENTS} events"
+        }), 413
+    
+    validated = []
+    errors = []
+    for index, event in enumerate(events):
+        try:
+            validated.append(_validate_batch_event(event))
+        except ValueError as e:
+            errors.append({"index": index, "error": str(e)})
+    
+    if errors:
+        return jsonify({
+            "status": "error",
+            "message": "Batch validation failed, no events were logged",
+            "errors": errors[:20],
+            "error_count": len(errors)
+        }), 400
+    
+    counts = {}
+    for event_type, emit, args, context in validated:
+        emit(*args, **context)
+        counts[event_type] = counts.get(event_type, 0) + 1
+    
+    api_log.info("Event batch ingested", extra={
+        "event_type": "event_batch",
+        "events": len(validated),
+        "events_by_type": counts
     })
     
     return jsonify({
-        "status": "warning",
-        "type": warning_type,
-        "message": warning_message
-    }), 200
\ No newline at end of file
+        "status": "success",
+        "accepted": len(validated),
+        "events_by_type": counts
+    }), 200
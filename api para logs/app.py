@@ -1,59 +1,228 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, current_app, g, jsonify, request
 from flask_cors import CORS
 import logging
-import json
 import os
+import threading
+import time
 from datetime import datetime
-import uuid
-from pythonjsonlogger import jsonlogger
-from config.logging_config import setup_custom_loggers
+from config.logging_config import (
+    setup_custom_loggers, get_log_pipeline, get_sampling_filter, LOG_DIR, LOG_HANDLERS, LOG_ASYNC,
+    LOG_QUEUE_OVERFLOW
+)
+from config.log_routing import LOG_ROUTING_FILE
+from config.log_archive import LOG_ARCHIVE_DIR, archive_dir_for
+from config.log_server import LOG_MULTIPROCESS, get_ship_stats
+from config.log_sinks import LOG_SINKS, get_sink_stats
 from api_endpoints import api_bp
+from logs_api import logs_bp
+from request_context import (
+    RequestContextAdapter, begin_request, end_request, current_context,
+    resolve_request_id, elapsed_ms
+)
+from metrics import metrics, LogRecordCounter
+from detection import detector
+from rate_limit import limiter
+from events import log_api_request, log_api_response
+from config.log_profiling import PROFILING_ENABLED
+from profiling import debug_bp, install_request_timing
 
-app = Flask(__name__)
-CORS(app)
+# Modo de servidor: "wsgi" (Flask/gunicorn) o "asgi" (asgi_app.py bajo uvicorn)
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
 
-# Configurar logging personalizado
-api_logger, security_logger, error_logger = setup_custom_loggers()
+# Configuración por defecto de create_app (cada clave se puede reemplazar)
+DEFAULT_CONFIG = {
+    'SERVER_MODE': SERVER_MODE,
+    'LOG_DIR': LOG_DIR,
+    'LOG_HANDLERS': LOG_HANDLERS,
+    'LOG_ARCHIVE_DIR': LOG_ARCHIVE_DIR,
+    'LOG_SINKS': LOG_SINKS,
+    'LOG_ROUTING_FILE': LOG_ROUTING_FILE,
+    'LOG_ASYNC': LOG_ASYNC,
+    'PROFILING_ENABLED': PROFILING_ENABLED
+}
 
-# Registrar blueprint de API
-app.register_blueprint(api_bp)
+# Los loggers existen desde el import; sus handlers se crean recién en configure_logging
+api_logger = logging.getLogger('api_microservice')
+security_logger = logging.getLogger('security')
+error_logger = logging.getLogger('errors')
+endpoint_log = RequestContextAdapter(api_logger, ('request_id',))
+
+# Métricas en memoria: registros emitidos por logger y estado de la cola de logs
+_log_counter = LogRecordCounter(metrics)
+_logging_key = None
+_logging_lock = threading.Lock()
+
+# Claves de la configuración que afectan al logging
+_LOGGING_KEYS = ('SERVER_MODE', 'LOG_DIR', 'LOG_HANDLERS', 'LOG_ARCHIVE_DIR', 'LOG_SINKS', 'LOG_ROUTING_FILE', 'LOG_ASYNC', 'PROFILING_ENABLED')
+
+def configure_logging(config):
+    """
+    Configura el logging una vez por proceso: se llama con el primer request, así
+    con gunicorn --preload cada worker abre sus propios archivos después del fork.
+    Solo se vuelve a configurar si cambia el proceso o la configuración de logging.
+    """
+    global _logging_key
+    key = (os.getpid(), tuple(str(config[name]) for name in _LOGGING_KEYS))
+    if _logging_key == key:
+        return
+    with _logging_lock:
+        if _logging_key == key:
+            return
+        loggers = (api_logger, security_logger, error_logger)
+        for logger in loggers:
+            logger.removeFilter(_log_counter)
+        overflow = LOG_QUEUE_OVERFLOW
+        if config['SERVER_MODE'] == 'asgi' and overflow == 'block':
+            # Con la cola llena, "block" frenaría el event loop: se descarta lo más antiguo
+            overflow = 'drop_oldest'
+        setup_custom_loggers(
+            # En modo ASGI siempre a través de la cola asíncrona
+            async_mode=config['LOG_ASYNC'] or config['SERVER_MODE'] == 'asgi',
+            log_dir=config['LOG_DIR'],
+            handlers=config['LOG_HANDLERS'],
+            archive_dir=config['LOG_ARCHIVE_DIR'],
+            sinks=config['LOG_SINKS'],
+            routing_file=config['LOG_ROUTING_FILE'],
+            overflow=overflow,
+            profiling=config['PROFILING_ENABLED']
+        )
+        # Después del muestreo: se cuentan los registros que realmente se emiten
+        for logger in loggers:
+            logger.addFilter(_log_counter)
+        _logging_key = key
+
+def _log_queue_stat(name):
+    pipeline = get_log_pipeline()
+    return pipeline.stats()[name] if pipeline else None
+
+def _sink_stat(name):
+    return {sink: stats[name] for sink, stats in get_sink_stats().items()}
+
+def _sampled_out_counts():
+    sampling = get_sampling_filter()
+    return sampling.suppressed_counts() if sampling else None
+
+# Métricas de los sinks (counters con label sink): nombre -> (descripción, getter)
+_SINK_GAUGES = {
+    'api_log_sink_records_sent_total': ('Records sent to each log sink', lambda: _sink_stat('sent')),
+    'api_log_sink_records_spilled_total': ('Records written to the disk spill buffer of each log sink',
+                                           lambda: _sink_stat('spilled')),
+    'api_log_sink_records_dropped_total': ('Spilled records discarded when the spill buffer was full',
+                                           lambda: _sink_stat('dropped'))
+}
+
+def register_gauges(config):
+    """
+    Registra las métricas calculadas según la configuración de la app (create_app).
+    El registro es del proceso: la última app creada define qué métricas se exponen.
+    """
+    metrics.register_gauge('api_log_queue_depth', 'Records waiting in the async log queue',
+                           lambda: _log_queue_stat('queue_depth'))
+    metrics.register_gauge('api_log_queue_dropped_total', 'Records dropped by the async log queue',
+                           lambda: _log_queue_stat('dropped'), metric_type='counter')
+    metrics.register_gauge('api_log_records_sampled_out_total', 'Records dropped by log sampling, by event_type',
+                           _sampled_out_counts, metric_type='counter', label='event_type')
+
+    if LOG_MULTIPROCESS:
+        metrics.register_gauge('api_log_records_unshipped_total', 'Records this worker could not send to the log writer',
+                               lambda: get_ship_stats()['unshipped'], metric_type='counter')
+    else:
+        metrics.remove_gauge('api_log_records_unshipped_total')
+
+    # En modo multiproceso los sinks están en el proceso escritor
+    sinks = config['LOG_SINKS'] and not LOG_MULTIPROCESS
+    for name, (help_text, getter) in _SINK_GAUGES.items():
+        if sinks:
+            metrics.register_gauge(name, help_text, getter, metric_type='counter', label='sink')
+        else:
+            metrics.remove_gauge(name)
+
+    if detector is not None:
+        metrics.register_gauge('api_security_alerts_total', 'Security alerts raised by the in-process detector',
+                               lambda: sum(detector.alerts.values()), metric_type='counter')
+    if limiter is not None:
+        metrics.register_gauge('api_rate_limited_total', 'Requests rejected with 429 by the rate limiter',
+                               lambda: limiter.throttled, metric_type='counter')
+
+def _request_username():
+    data = request.get_json(silent=True)
+    return data.get('username') if isinstance(data, dict) else None
+
+def ensure_logging():
+    """Configura el logging del proceso con el primer request"""
+    configure_logging(current_app.config)
+
+def apply_rate_limits():
+    """
+    Corta los requests que superan el límite de la ruta antes de loguear nada.
+    Los rechazados igual cuentan para el detector (regla 100014) y para /metrics.
+    """
+    if limiter is None:
+        return None
+    
+    start = time.perf_counter()
+    retry_after = limiter.check(
+        current_app.view_functions.get(request.endpoint),
+        request.endpoint,
+        request.remote_addr,
+        _request_username
+    )
+    if retry_after is None:
+        return None
+    
+    if detector is not None:
+        detector.observe_request(request.remote_addr)
+    g.rate_limited_start = start
+    response = jsonify({
+        "status": "error",
+        "message": "Too many requests"
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+    return response
 
-@app.before_request
 def log_request_info():
     """Log de cada request que llega a la API"""
-    request_id = str(uuid.uuid4())
-    request.request_id = request_id
+    # El contexto se arma una sola vez y lo reutilizan todos los logs del request
+    context = begin_request(
+        resolve_request_id(request.headers.get('X-Request-ID')),
+        request.remote_addr,
+        request.headers.get('User-Agent', '')
+    )
+    if detector is not None:
+        detector.observe_request(context.source_ip)
     
-    api_logger.info("Incoming request", extra={
-        "event_type": "api_request",
-        "request_id": request_id,
-        "method": request.method,
-        "endpoint": request.endpoint,
-        "remote_addr": request.remote_addr,
-        "user_agent": request.headers.get('User-Agent', ''),
-        "content_type": request.headers.get('Content-Type', ''),
-        "timestamp": datetime.now().isoformat()
-    })
+    log_api_request(context, request.method, request.endpoint, request.headers.get('Content-Type', ''))
 
-@app.after_request
 def log_response_info(response):
     """Log de cada response que devuelve la API"""
-    api_logger.info("Outgoing response", extra={
-        "event_type": "api_response",
-        "request_id": getattr(request, 'request_id', 'unknown'),
-        "status_code": response.status_code,
-        "content_length": response.content_length,
-        "timestamp": datetime.now().isoformat()
-    })
+    rate_limited_start = g.get('rate_limited_start')
+    if rate_limited_start is not None:
+        # Los rechazos se resumen en una línea por clave (rate_limit.py)
+        metrics.observe_request(request.endpoint or 'unmatched', request.method,
+                                response.status_code, time.perf_counter() - rate_limited_start)
+        return response
+    
+    context = current_context()
+    duration_ms = None
+    if context is not None:
+        duration_ms = elapsed_ms(context)
+        response.headers['X-Request-ID'] = context.request_id
+        metrics.observe_request(request.endpoint or 'unmatched', request.method,
+                                response.status_code, duration_ms / 1000)
+    
+    log_api_response(context, response.status_code, response.content_length, duration_ms)
     return response
 
-@app.route('/')
+def clear_request_context(exc):
+    """Descarta el contexto de logging del request"""
+    end_request()
+
 def home():
     """Endpoint principal de la API"""
-    api_logger.info("Home endpoint accessed", extra={
+    endpoint_log.info("Home endpoint accessed", extra={
         "event_type": "endpoint_access",
-        "endpoint": "/",
-        "request_id": getattr(request, 'request_id', 'unknown')
+        "endpoint": "/"
     })
     
     return jsonify({
@@ -62,34 +231,100 @@ def home():
         "status": "active",
         "endpoints": [
             "/health",
+            "/metrics",
             "/api/user/login",
             "/api/user/register",
             "/api/data/process",
             "/api/system/error",
-            "/api/system/warning"
+            "/api/system/warning",
+            "/api/events/batch",
+            "/api/logs/search",
+            "/api/logs/tail",
+            "/api/logs/recent"
         ]
     })
 
-@app.route('/health')
 def health_check():
     """Health check endpoint"""
-    api_logger.info("Health check performed", extra={
+    endpoint_log.info("Health check performed", extra={
         "event_type": "health_check",
-        "status": "healthy",
-        "request_id": getattr(request, 'request_id', 'unknown')
+        "status": "healthy"
     })
     
+    pipeline = get_log_pipeline()
     return jsonify({
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "uptime": "running"
+        "uptime": metrics.uptime(),
+        "uptime_seconds": round(metrics.uptime_seconds(), 3),
+        "log_queue": pipeline.stats() if pipeline else None
     })
 
-if __name__ == '__main__':
+def metrics_endpoint():
+    """Métricas del servicio en formato de texto de Prometheus"""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+def create_app(config=None):
+    """
+    Crea la aplicación. config reemplaza claves de DEFAULT_CONFIG, por ejemplo
+    {'LOG_HANDLERS': 'memory'} para usar el test client sin escribir archivos.
+    El logging no se configura acá sino con el primer request (configure_logging).
+    """
+    app = Flask(__name__)
+    app.config.update(DEFAULT_CONFIG)
+    if config:
+        app.config.update(config)
+        if 'LOG_DIR' in config and 'LOG_ARCHIVE_DIR' not in config:
+            # El archivo sigue al LOG_DIR de la app (salvo que LOG_ARCHIVE_DIR esté fijado)
+            app.config['LOG_ARCHIVE_DIR'] = archive_dir_for(config['LOG_DIR'])
+    CORS(app)
+    
+    # Registrar blueprint de API
+    app.register_blueprint(api_bp)
+    app.register_blueprint(logs_bp)
+    
+    app.before_request(ensure_logging)
+    app.before_request(apply_rate_limits)
+    app.before_request(log_request_info)
+    app.after_request(log_response_info)
+    app.teardown_request(clear_request_context)
+    
+    app.add_url_rule('/', 'home', home)
+    app.add_url_rule('/health', 'health_check', health_check)
+    app.add_url_rule('/metrics', 'metrics_endpoint', metrics_endpoint)
+    register_gauges(app.config)
+    
+    if app.config['PROFILING_ENABLED']:
+        # Tiempos por etapa en /debug/timings y profiler de los próximos N requests en /debug/profile
+        app.register_blueprint(debug_bp)
+        install_request_timing(app)
+    
+    return app
+
+app = create_app()
+
+def main():
+    """Arranca el servidor de desarrollo (SERVER_MODE=wsgi) o uvicorn (asgi)"""
+    configure_logging(app.config)
     api_logger.info("Starting API microservice", extra={
         "event_type": "application_start",
         "port": 5000,
-        "debug": True
+        "debug": SERVER_MODE != 'asgi',
+        "server_mode": SERVER_MODE
     })
     
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    if SERVER_MODE == 'asgi':
+        import uvicorn
+        from asgi_app import application
+        uvicorn.run(application, host='0.0.0.0', port=5000)
+    else:
+        app.run(debug=True, host='0.0.0.0', port=5000)
+
+if __name__ == '__main__':
+    if SERVER_MODE == 'asgi':
+        # asgi_app importa este archivo como módulo "app": se arranca desde esa copia para
+        # no tener en el proceso dos estados de logging (y la de __main__ no sirve requests)
+        import app as app_module
+        app_module.main()
+    else:
+        main()
\ No newline at end of file
@@ -0,0 +1,638 @@
+"""
+Modo de servidor ASGI (SERVER_MODE=asgi).
+
+Los endpoints de alto tráfico tienen variantes async que nunca bloquean el
+event loop: el procesamiento de datos corre en el pool de processing.py y los
+logs solo se encolan en el pipeline asíncrono (los escribe un hilo aparte).
+/api/logs/tail también es async: un cliente siguiendo un log no ocupa un hilo.
+El resto de las rutas de Flask (api_bp, logs_bp, /metrics, ...) se sirven con
+un puente WSGI sobre un pool de hilos acotado.
+
+    uvicorn asgi_app:application --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import io
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import parse_qs
+
+from app import app as flask_app, endpoint_log, configure_logging
+from logs_api import TAIL_FILTERS, TAIL_KEEPALIVE_SECONDS
+from log_index import INDEXED_LOGS
+from log_tail import get_follower, TooManySubscribersError
+from config.logging_config import get_log_pipeline
+from api_endpoints import LOGIN_ERROR_RESPONSES, processing_response_body
+from events import (
+    error_log, LOGIN_SCENARIOS, SYSTEM_ERRORS, SYSTEM_WARNINGS,
+    log_login_attempt, log_user_registration, log_system_error, log_system_warning,
+    log_processing_result, log_api_request, log_api_response
+)
+from processing import (
+    engine, process_records, records_from_payload, EngineBusyError, NdjsonStream,
+    DATA_PROCESSING_TIMEOUT
+)
+from request_context import begin_request, end_request, resolve_request_id, elapsed_ms
+from metrics import metrics
+from detection import detector
+from rate_limit import limiter
+
+# Hilos para las rutas que se sirven a través de Flask
+ASGI_BRIDGE_THREADS = int(os.environ.get('ASGI_BRIDGE_THREADS', '32'))
+# Tamaño máximo de un cuerpo JSON leído en memoria (NDJSON se procesa en streaming)
+ASGI_MAX_BODY_BYTES = int(os.environ.get('ASGI_MAX_BODY_BYTES', str(10 * 1024 * 1024)))
+
+# El event loop nunca escribe a disco: los logs pasan por la cola acotada
+flask_app.config['SERVER_MODE'] = 'asgi'
+
+_bridge_executor = ThreadPoolExecutor(ASGI_BRIDGE_THREADS, thread_name_prefix='asgi-wsgi')
+
+
+class BodyTooLargeError(Exception):
+    """El cuerpo del request supera ASGI_MAX_BODY_BYTES"""
+
+
+class AsgiStream:
+    """
+    Cuerpo en streaming de un endpoint async: los bloques de un generador async.
+    close se llama siempre al terminar (también si el cliente se desconecta).
+    """
+
+    def __init__(self, chunks, content_type, close=None):
+        self.chunks = chunks
+        self.content_type = content_type
+        self.close = close
+
+
+class AsgiRequest:
+    """Datos del request ASGI que usan los endpoints async"""
+
+    def __init__(self, scope, receive):
+        self.scope = scope
+        self.receive = receive
+        self.method = scope['method']
+        self.path = scope['path']
+        self.headers = {}
+        for name, value in scope['headers']:
+            name = name.decode('latin-1')
+            value = value.decode('latin-1')
+            self.headers[name] = f"{self.headers[name]},{value}" if name in self.headers else value
+        self.args = {k: v[0] for k, v in parse_qs(scope.get('query_string', b'').decode('latin-1')).items()}
+        client = scope.get('client')
+        self.remote_addr = client[0] if client else None
+        self.content_type = self.headers.get('content-type', '')
+        self.mimetype = self.content_type.split(';', 1)[0].strip().lower()
+        self._body = None
+        self._json = None
+
+    async def chunks(self):
+        """Itera el cuerpo a medida que llega"""
+        while True:
+            message = await self.receive()
+            if message['type'] == 'http.disconnect':
+                return
+            chunk = message.get('body', b'')
+            if chunk:
+                yield chunk
+            if not message.get('more_body', False):
+                return
+
+    async def body(self, limit=ASGI_MAX_BODY_BYTES):
+        if self._body is None:
+            parts = []
+            size = 0
+            async for chunk in self.chunks():
+                size += len(chunk)
+                if size > limit:
+                    raise BodyTooLargeError(size)
+                parts.append(chunk)
+            self._body = b''.join(parts)
+        return self._body
+
+    async def json(self):
+        """Cuerpo JSON o None si no es JSON válido (como get_json(silent=True))"""
+        if self._json is None:
+            body = await self.body()
+            try:
+                self._json = json.loads(body) if body else None
+            except ValueError:
+                self._json = None
+        return self._json
+
+    def cached_username(self):
+        data = self._json
+        return data.get('username') if isinstance(data, dict) else None
+
+
+# --- Endpoints async ---------------------------------------------------------------
+# Devuelven (cuerpo, status, headers extra) con las mismas respuestas que api_endpoints.py
+
+async def health_check(request):
+    endpoint_log.info("Health check performed", extra={
+        "event_type": "health_check",
+        "status": "healthy"
+    })
+
+    pipeline = get_log_pipeline()
+    return {
+        "status": "healthy",
+        "timestamp": datetime.now().isoformat(),
+        "uptime": metrics.uptime(),
+        "uptime_seconds": round(metrics.uptime_seconds(), 3),
+        "log_queue": pipeline.stats() if pipeline else None,
+        "server_mode": "asgi"
+    }, 200, ()
+
+
+async def user_login(request):
+    try:
+        data = await request.json() or {}
+        username = data.get('username', 'unknown')
+
+        scenario = random.choice(list(LOGIN_SCENARIOS))
+        session_id = log_login_attempt(username, scenario)
+
+        if scenario == 'success':
+            return {
+                "status": "success",
+                "message": "Login successful",
+                "session_id": session_id,
+                "user": username
+            }, 200, ()
+
+        status_code, message = LOGIN_ERROR_RESPONSES[scenario]
+        return {"status": "error", "message": message}, status_code, ()
+
+    except Exception as e:
+        error_log.error("Error in login endpoint", extra={
+            "event_type": "application_error",
+            "error_type": "login_exception",
+            "error_message": str(e)
+        })
+        return {"status": "error", "message": "Internal server error"}, 500, ()
+
+
+async def user_register(request):
+    try:
+        data = await request.json() or {}
+        username = data.get('username', 'unknown')
+        email = data.get('email', 'unknown')
+
+        user_id = log_user_registration(username, email)
+        return {
+            "status": "success",
+            "message": "User registered successfully",
+            "user_id": user_id
+        }, 201, ()
+
+    except Exception as e:
+        error_log.error("Error in register endpoint", extra={
+            "event_type": "application_error",
+            "error_type": "registration_exception",
+            "error_message": str(e)
+        })
+        return {"status": "error", "message": "Registration failed"}, 500, ()
+
+
+async def trigger_error(request):
+    error_type = random.choice(list(SYSTEM_ERRORS))
+    error_message = SYSTEM_ERRORS[error_type]
+    log_system_error(error_type, error_message)
+    return {"status": "error", "type": error_type, "message": error_message}, 500, ()
+
+
+async def trigger_warning(request):
+    warning_type = random.choice(list(SYSTEM_WARNINGS))
+    warning_message = SYSTEM_WARNINGS[warning_type]
+    log_system_warning(warning_type, warning_message)
+    return {"status": "warning", "type": warning_type, "message": warning_message}, 200, ()
+
+
+async def tail_logs(request):
+    """Misma respuesta que /api/logs/tail de logs_api.py, sin ocupar un hilo por cliente"""
+    args = request.args
+    log = args.get('log', 'api_all')
+    stream_format = args.get('format', 'sse')
+    if log not in INDEXED_LOGS or stream_format not in ('sse', 'ndjson'):
+        return {
+            "status": "error",
+            "message": f"log must be one of {', '.join(INDEXED_LOGS)} and format sse or ndjson"
+        }, 400, ()
+
+    loop = asyncio.get_running_loop()
+    wakeup = asyncio.Event()
+    scheduled = threading.Event()
+
+    def wake():
+        scheduled.clear()
+        wakeup.set()
+
+    def on_line():
+        # Desde el hilo lector: un solo aviso al event loop por tanda de líneas
+        if not scheduled.is_set():
+            scheduled.set()
+            loop.call_soon_threadsafe(wake)
+
+    filters = {field: args[param] for param, field in TAIL_FILTERS.items() if args.get(param)}
+    follower = get_follower(log, flask_app.config['LOG_DIR'])
+    try:
+        subscription = follower.subscribe(filters, on_line=on_line)
+    except TooManySubscribersError:
+        return {"status": "error", "message": "Too many log followers, retry later"}, 503, ()
+
+    if stream_format == 'sse':
+        template, keepalive, mimetype = 'data: {}\n\n', b': keepalive\n\n', 'text/event-stream'
+    else:
+        template, keepalive, mimetype = '{}\n', b'\n', 'application/x-ndjson'
+
+    async def generate():
+        yield keepalive
+        while True:
+            wakeup.clear()
+            lines = subscription.drain()
+            if lines:
+                yield ''.join(template.format(line) for line in lines).encode('utf-8')
+                continue
+            try:
+                await asyncio.wait_for(wakeup.wait(), TAIL_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield keepalive
+
+    stream = AsgiStream(generate(), mimetype, close=lambda: follower.unsubscribe(subscription))
+    return stream, 200, [(b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no')]
+
+
+class _QueueReader:
+    """Stream de solo lectura alimentado desde el event loop (para NdjsonStream)"""
+
+    def __init__(self, maxsize=16):
+        self.queue = queue.Queue(maxsize)
+        self.closed = False
+
+    def read(self, size=-1):
+        chunk = self.queue.get()
+        if chunk is None:
+            # Fin del cuerpo: dejar el centinela para lecturas posteriores
+            self.queue.put(None)
+            return b''
+        return chunk
+
+    def put(self, chunk):
+        """Encola un bloque; False si el lector ya no lo va a consumir"""
+        while not self.closed:
+            try:
+                self.queue.put(chunk, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def close(self):
+        """Descarta lo pendiente y deja el centinela: read() devuelve b'' en adelante"""
+        self.closed = True
+        while True:
+            try:
+                while True:
+                    self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                self.queue.put_nowait(None)
+                return
+            except queue.Full:
+                # Un put en curso ganó el lugar: volver a vaciar
+                continue
+
+
+async def _process_ndjson(request):
+    """Alimenta el pool de procesamiento con el cuerpo NDJSON a medida que llega"""
+    reader = _QueueReader()
+    records = NdjsonStream(reader)
+    future = asyncio.wrap_future(engine.submit(process_records, records))
+    # Si el procesamiento termina antes (error) nadie más lee: los put no deben bloquear
+    future.add_done_callback(lambda _: reader.close())
+    try:
+        async for chunk in request.chunks():
+            if reader.closed:
+                break
+            try:
+                reader.queue.put_nowait(chunk)
+            except queue.Full:
+                # El pool va más lento que la red: esperar sin bloquear el loop
+                if not await asyncio.to_thread(reader.put, chunk):
+                    break
+    finally:
+        await asyncio.to_thread(reader.put, None)
+
+    try:
+        result = await asyncio.wait_for(future, DATA_PROCESSING_TIMEOUT)
+    except asyncio.TimeoutError:
+        records.cancel()
+        raise
+    log_processing_result(result, records.bytes_read)
+    return result
+
+
+async def process_data(request):
+    try:
+        if request.mimetype == 'application/x-ndjson':
+            if request.args.get('mode') == 'async':
+                return {"status": "error", "message": "Async mode requires a JSON body"}, 400, ()
+            body, status_code = processing_response_body(await _process_ndjson(request))
+            return body, status_code, ()
+
+        data = await request.json()
+        if data is None:
+            raise ValueError("Request body must be JSON")
+        records = records_from_payload(data)
+        data_size = len(request._body)
+
+        async_mode = request.args.get('mode') == 'async' or (isinstance(data, dict) and data.get('async') is True)
+        if async_mode:
+            def on_done(job_id, result):
+                if result is not None:
+                    log_processing_result(result, data_size, job_id)
+
+            job_id = engine.submit_job(records, on_done=on_done)
+            return {
+                "status": "accepted",
+                "message": "Data processing job queued",
+                "job_id": job_id,
+                "status_url": f"/api/data/jobs/{job_id}"
+            }, 202, ()
+
+        result = await asyncio.wait_for(
+            asyncio.wrap_future(engine.submit(process_records, records)), DATA_PROCESSING_TIMEOUT
+        )
+        log_processing_result(result, data_size)
+        body, status_code = processing_response_body(result)
+        return body, status_code, ()
+
+    except EngineBusyError:
+        error_log.warning("Data processing rejected", extra={
+            "event_type": "data_processing",
+            "action": "process",
+            "status": "failed",
+            "error_reason": "engine_busy"
+        })
+        return {"status": "error", "message": "Processing engine busy, retry later"}, 503, ()
+
+    except Exception as e:
+        error_log.error("Error in data processing", extra={
+            "event_type": "application_error",
+            "error_type": "data_processing_exception",
+            "error_message": str(e) or type(e).__name__
+        })
+        return {"status": "error", "message": "Processing failed"}, 500, ()
+
+
+# (método, path) -> (handler async, nombre del endpoint de Flask equivalente)
+ASYNC_ROUTES = {
+    ('GET', '/health'): (health_check, 'health_check'),
+    ('POST', '/api/user/login'): (user_login, 'api.user_login'),
+    ('POST', '/api/user/register'): (user_register, 'api.user_register'),
+    ('POST', '/api/data/process'): (process_data, 'api.process_data'),
+    ('GET', '/api/system/error'): (trigger_error, 'api.trigger_error'),
+    ('GET', '/api/system/warning'): (trigger_warning, 'api.trigger_warning'),
+    ('GET', '/api/logs/tail'): (tail_logs, 'logs.tail_logs')
+}
+
+
+async def _send_json(send, body, status_code, headers=()):
+    payload = json.dumps(body).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status_code,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(payload)).encode('latin-1')),
+            *headers
+        ]
+    })
+    await send({'type': 'http.response.body', 'body': payload})
+    return len(payload)
+
+
+async def _wait_disconnect(request):
+    while (await request.receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def _send_stream(request, send, stream, status_code, headers=()):
+    """Envía un AsgiStream hasta que se agota o el cliente se desconecta; devuelve los bytes enviados"""
+    sent = 0
+    chunks = stream.chunks
+    disconnected = asyncio.ensure_future(_wait_disconnect(request))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': status_code,
+            'headers': [(b'content-type', stream.content_type.encode('latin-1')), *headers]
+        })
+        while True:
+            next_chunk = asyncio.ensure_future(chunks.__anext__())
+            await asyncio.wait((next_chunk, disconnected), return_when=asyncio.FIRST_COMPLETED)
+            if not next_chunk.done():
+                next_chunk.cancel()
+                try:
+                    await next_chunk
+                except (asyncio.CancelledError, StopAsyncIteration):
+                    pass
+                break
+            try:
+                chunk = next_chunk.result()
+            except StopAsyncIteration:
+                await send({'type': 'http.response.body', 'body': b''})
+                break
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            sent += len(chunk)
+    finally:
+        disconnected.cancel()
+        await chunks.aclose()
+        if stream.close is not None:
+            stream.close()
+    return sent
+
+
+async def _serve_async(request, handler, endpoint, send):
+    view = flask_app.view_functions.get(endpoint)
+    if limiter is not None and getattr(view, 'rate_limits', None) is not None:
+        if view.rate_limits[1] is not None:
+            # Límite por usuario: el username sale del cuerpo JSON
+            await request.json()
+        start = time.perf_counter()
+        retry_after = limiter.check(view, endpoint, request.remote_addr, request.cached_username)
+        if retry_after is not None:
+            # Sin log por request, pero cuenta para el detector (regla 100014) y para /metrics
+            if detector is not None:
+                detector.observe_request(request.remote_addr)
+            await _send_json(send, {"status": "error", "message": "Too many requests"}, 429,
+                             [(b'retry-after', str(max(1, int(retry_after + 0.999))).encode('latin-1'))])
+            metrics.observe_request(endpoint, request.method, 429, time.perf_counter() - start)
+            return
+
+    context = begin_request(
+        resolve_request_id(request.headers.get('x-request-id')),
+        request.remote_addr,
+        request.headers.get('user-agent', '')
+    )
+    try:
+        if detector is not None:
+            detector.observe_request(context.source_ip)
+        log_api_request(context, request.method, endpoint, request.content_type)
+
+        try:
+            body, status_code, headers = await handler(request)
+        except BodyTooLargeError:
+            body, status_code, headers = {"status": "error", "message": "Request body too large"}, 413, ()
+
+        headers = [(b'x-request-id', context.request_id.encode('latin-1')), *headers]
+        if isinstance(body, AsgiStream):
+            content_length = await _send_stream(request, send, body, status_code, headers)
+        else:
+            content_length = await _send_json(send, body, status_code, headers)
+
+        duration_ms = elapsed_ms(context)
+        metrics.observe_request(endpoint, request.method, status_code, duration_ms / 1000)
+        log_api_response(context, status_code, content_length, duration_ms)
+    finally:
+        end_request()
+
+
+# --- Puente WSGI para el resto de las rutas de Flask ------------------------------------
+
+def _wsgi_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client')
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0] if client else '',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1')
+        value = value.decode('latin-1')
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif name == 'content-length':
+            continue
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def _serve_wsgi(request, send):
+    """
+    Ejecuta la app Flask en el pool de hilos. La respuesta se envía a medida que
+    la app la genera (las rutas en streaming de larga duración tienen su variante async).
+    """
+    try:
+        body = await request.body()
+    except BodyTooLargeError:
+        await _send_json(send, {"status": "error", "message": "Request body too large"}, 413)
+        return
+
+    loop = asyncio.get_running_loop()
+    started = loop.create_future()
+    chunks = asyncio.Queue()
+    closed = threading.Event()
+
+    def start_response(status, headers, exc_info=None):
+        loop.call_soon_threadsafe(started.set_result, (status, headers))
+
+    def run():
+        try:
+            result = flask_app(_wsgi_environ(request.scope, body), start_response)
+        except BaseException as e:
+            loop.call_soon_threadsafe(started.set_exception, e)
+            return
+        try:
+            for chunk in result:
+                if closed.is_set():
+                    break
+                if chunk:
+                    loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+        finally:
+            close = getattr(result, 'close', None)
+            if close is not None:
+                close()
+            loop.call_soon_threadsafe(chunks.put_nowait, None)
+
+    worker = loop.run_in_executor(_bridge_executor, run)
+
+    async def watch_disconnect():
+        while (await request.receive())['type'] != 'http.disconnect':
+            pass
+        closed.set()
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+    try:
+        status, headers = await started
+        await send({
+            'type': 'http.response.start',
+            'status': int(status.split(' ', 1)[0]),
+            'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+        })
+        while True:
+            chunk = await chunks.get()
+            if chunk is None:
+                break
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        closed.set()
+        watcher.cancel()
+        await worker
+
+
+# --- Aplicación ASGI -------------------------------------------------------------------
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            configure_logging(flask_app.config)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            pipeline = get_log_pipeline()
+            if pipeline is not None:
+                await asyncio.to_thread(pipeline.stop)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    """Punto de entrada ASGI"""
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    configure_logging(flask_app.config)
+    request = AsgiRequest(scope, receive)
+    route = ASYNC_ROUTES.get((request.method, request.path))
+    if route is None:
+        await _serve_wsgi(request, send)
+    else:
+        await _serve_async(request, route[0], route[1], send)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark de formateadores JSON
+Compara registros/segundo de pythonjsonlogger.JsonFormatter contra FastJsonFormatter
+y verifica que la salida sea idéntica byte a byte
+
+Con --fanout N cada registro se formatea N veces, como cuando pasa por
+varios handlers (file_security + file_all)
+
+Uso: python benchmarks/formatter_bench.py [--records 50000] [--fanout 2]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pythonjsonlogger import jsonlogger
+from config.log_formatters import FastJsonFormatter, orjson
+
+FORMAT = '%(asctime)s %(name)s %(levelname)s %(pathname)s %(lineno)d %(message)s'
+DATEFMT = '%Y-%m-%d %H:%M:%S'
+
+
+def make_records(count):
+    """Genera registros similares a los del endpoint de login"""
+    records = []
+    for i in range(count):
+        record = logging.LogRecord(
+            'security', logging.WARNING, '/app/api_endpoints.py', 25,
+            "Invalid password attempt", None, None
+        )
+        record.__dict__.update({
+            "event_type": "user_authentication",
+            "action": "login",
+            "status": "failed",
+            "failure_reason": "invalid_password",
+            "username": f"user_{i % 50}",
+            "request_id": f"req-{i:08x}",
+            "source_ip": "192.168.1.100",
+            "user_agent": "python-requests/2.31.0",
+            "timestamp": datetime.now().isoformat()
+        })
+        records.append(record)
+    return records
+
+
+def run(formatter, records, fanout=1):
+    start = time.perf_counter()
+    for record in records:
+        for _ in range(fanout):
+            formatter.format(record)
+    elapsed = time.perf_counter() - start
+    return len(records) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de formateadores JSON")
+    parser.add_argument('--records', type=int, default=50000)
+    parser.add_argument('--fanout', type=int, default=1)
+    args = parser.parse_args()
+
+    formatters = [
+        ("pythonjsonlogger.JsonFormatter", jsonlogger.JsonFormatter(FORMAT, DATEFMT)),
+        ("FastJsonFormatter", FastJsonFormatter(FORMAT, DATEFMT)),
+    ]
+    if orjson is not None:
+        formatters.append(("FastJsonFormatter (orjson)", FastJsonFormatter(FORMAT, DATEFMT, use_orjson=True)))
+
+    sample = make_records(1)[0]
+    reference = formatters[0][1].format(sample)
+    if formatters[1][1].format(sample) != reference:
+        print("❌ La salida de FastJsonFormatter difiere de pythonjsonlogger")
+        return 1
+
+    baseline = None
+    for name, formatter in formatters:
+        # Registros nuevos por formatter para no reutilizar el caché de otra corrida
+        rate = run(formatter, make_records(args.records), args.fanout)
+        baseline = baseline or rate
+        print(f"{name:32} {rate:12,.0f} registros/s  ({rate / baseline:.2f}x)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Benchmark de carga reproducible
+Arma una carga con los escenarios de test_api.py (mezcla ponderada, RNG con semilla)
+y la ejecuta con N hilos concurrentes:
+
+- inprocess: test client de Flask en el mismo proceso (mide el costo propio de la app)
+- http: conexiones HTTP persistentes contra un servidor corriendo (--url)
+
+Reporta throughput, percentiles de latencia por endpoint, registros y bytes de log
+por segundo y, con --logging-baseline, el costo de logging por registro (repite la
+misma carga con el logging deshabilitado y compara).
+
+La secuencia de requests depende solo de --seed, así que dos corridas con la misma
+semilla envían exactamente los mismos requests (las respuestas de la app tienen su
+propio azar; en modo inprocess también se siembra, pero con concurrencia > 1 el orden
+entre hilos no es determinista).
+
+Uso: python benchmarks/load_bench.py [--target inprocess|http] [--requests 5000]
+     [--concurrency 8] [--mix user_activity=50,brute_force=10] [--seed 42] [--json out.json]
+"""
+
+import argparse
+import glob
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from test_api import SCENARIOS
+
+DEFAULT_MIX = "user_activity=50,data_processing=15,system_events=15,brute_force=10,health_checks=10"
+
+_LOG_RECORDS = re.compile(r'^api_log_records_total\{[^}]*\} (\d+)$', re.MULTILINE)
+
+
+def parse_mix(spec):
+    """"user_activity=50,brute_force=10" -> {escenario: peso}"""
+    mix = {}
+    for item in spec.split(','):
+        name, _, weight = item.strip().partition('=')
+        if name not in SCENARIOS:
+            raise ValueError(f"Escenario desconocido: {name} (opciones: {', '.join(SCENARIOS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def build_plan(mix, count, seed):
+    """Secuencia de (método, endpoint, datos) generada solo a partir de la semilla"""
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    plan = []
+    while len(plan) < count:
+        scenario = rng.choices(names, weights)[0]
+        for method, endpoint, data, _description, _pause in SCENARIOS[scenario](rng):
+            plan.append((method, endpoint, data))
+    return plan[:count]
+
+
+class InProcessTarget:
+    """Requests contra la app Flask importada, con un test client por hilo"""
+
+    def __init__(self, seed):
+        # El rate limiter cortaría la carga con 429: se desactiva salvo que se pida
+        os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+        from app import app
+        random.seed(seed)
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, data=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=data)
+        return response.status_code, len(response.get_data())
+
+    def metrics_text(self):
+        return self.app.test_client().get('/metrics').get_data(as_text=True)
+
+
+class HttpTarget:
+    """Requests contra un servidor corriendo, con una sesión keep-alive por hilo"""
+
+    def __init__(self, url):
+        import requests
+        self.url = url.rstrip('/')
+        self._requests = requests
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self._requests.Session()
+            adapter = self._requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        return session
+
+    def request(self, method, path, data=None):
+        response = self._session().request(method, self.url + path, json=data)
+        return response.status_code, len(response.content)
+
+    def metrics_text(self):
+        return self._session().get(self.url + '/metrics').text
+
+
+def log_records(target):
+    """Total de registros de log emitidos según /metrics"""
+    return sum(int(count) for count in _LOG_RECORDS.findall(target.metrics_text()))
+
+
+def log_bytes(log_dir):
+    """Bytes en los archivos de log (actuales y rotados)"""
+    total = 0
+    for path in glob.glob(os.path.join(log_dir, '*.log')) + glob.glob(os.path.join(log_dir, '*.log.[0-9]*')):
+        try:
+            total += os.path.getsize(path)
+        except OSError:
+            continue
+    return total
+
+
+def percentile(sorted_values, p):
+    """Percentil por rango más cercano"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def execute(target, plan, concurrency):
+    """Ejecuta el plan con N hilos. Devuelve (segundos, latencias por endpoint, status codes)"""
+    next_index = itertools.count()
+    latencies = {}
+    statuses = {}
+    lock = threading.Lock()
+
+    def worker():
+        local_latencies = {}
+        local_statuses = {}
+        while True:
+            i = next(next_index)
+            if i >= len(plan):
+                break
+            method, endpoint, data = plan[i]
+            start = time.perf_counter()
+            try:
+                status, _ = target.request(method, endpoint, data)
+            except Exception:
+                status = 'error'
+            local_latencies.setdefault(endpoint, []).append(time.perf_counter() - start)
+            local_statuses[status] = local_statuses.get(status, 0) + 1
+        with lock:
+            for endpoint, values in local_latencies.items():
+                latencies.setdefault(endpoint, []).extend(values)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    threads = [threading.Thread(target=worker, name=f"load-{i}") for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, latencies, statuses
+
+
+def latency_summary(values):
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p90_ms": round(percentile(values, 90) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if values else 0.0
+    }
+
+
+def run_benchmark(target, plan, concurrency, log_dir, settle):
+    """Ejecuta el plan midiendo registros y bytes de log. Devuelve (segundos, resultado)"""
+    records_before = log_records(target)
+    bytes_before = log_bytes(log_dir)
+
+    elapsed, latencies, statuses = execute(target, plan, concurrency)
+
+    # Dar tiempo a que la escritura agrupada / la cola asíncrona lleguen a disco
+    time.sleep(settle)
+    # La lectura de /metrics también genera 2 registros (request y response)
+    records = log_records(target) - records_before - 2
+    written = log_bytes(log_dir) - bytes_before
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    return elapsed, {
+        "requests": len(plan),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(plan) / elapsed, 1),
+        "status_codes": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        "latency": latency_summary(all_latencies),
+        "latency_by_endpoint": {endpoint: latency_summary(values) for endpoint, values in sorted(latencies.items())},
+        "log_records": records,
+        "log_records_per_second": round(records / elapsed, 1),
+        "log_bytes": written,
+        "log_bytes_per_second": round(written / elapsed, 1),
+        "log_bytes_per_record": round(written / records, 1) if records else None
+    }
+
+
+def print_report(result):
+    print(f"Requests:          {result['requests']:,} en {result['elapsed_seconds']} s "
+          f"({result['throughput_rps']:,.1f} req/s)")
+    print(f"Status codes:      {result['status_codes']}")
+    latency = result['latency']
+    print(f"Latencia (ms):     p50 {latency['p50_ms']}  p90 {latency['p90_ms']}  "
+          f"p99 {latency['p99_ms']}  max {latency['max_ms']}")
+    for endpoint, latency in result['latency_by_endpoint'].items():
+        print(f"  {endpoint:28} {latency['count']:7,}  p50 {latency['p50_ms']:8.3f}  "
+              f"p90 {latency['p90_ms']:8.3f}  p99 {latency['p99_ms']:8.3f}")
+    print(f"Registros de log:  {result['log_records']:,} ({result['log_records_per_second']:,.1f}/s)")
+    print(f"Bytes de log:      {result['log_bytes']:,} ({result['log_bytes_per_second'] / 1024:,.1f} KiB/s, "
+          f"{result['log_bytes_per_record']} bytes/registro)")
+    if 'logging_cost_us_per_record' in result:
+        print(f"Sin logging:       {result['baseline_throughput_rps']:,.1f} req/s")
+        print(f"Costo de logging:  {result['logging_cost_us_per_record']} µs/registro")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de carga con los escenarios de test_api.py")
+    parser.add_argument('--target', choices=('inprocess', 'http'), default='inprocess')
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--mix', default=DEFAULT_MIX)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--warmup', type=int, default=200)
+    parser.add_argument('--log-dir', default='logs', help="Directorio de logs del servidor (para medir bytes)")
+    parser.add_argument('--logging-baseline', action='store_true',
+                        help="Repite la carga sin logging para estimar el costo por registro (solo inprocess)")
+    parser.add_argument('--json', help="Guarda el resultado en este archivo")
+    args = parser.parse_args()
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.logging_baseline and args.target != 'inprocess':
+        parser.error("--logging-baseline solo está disponible con --target inprocess")
+
+    target = InProcessTarget(args.seed) if args.target == 'inprocess' else HttpTarget(args.url)
+    settle = 0.2 if args.target == 'inprocess' else 1.0
+
+    if args.warmup:
+        execute(target, build_plan(mix, args.warmup, args.seed + 1), args.concurrency)
+
+    plan = build_plan(mix, args.requests, args.seed)
+    elapsed, result = run_benchmark(target, plan, args.concurrency, args.log_dir, settle)
+
+    if args.logging_baseline:
+        logging.disable(logging.CRITICAL)
+        try:
+            baseline_elapsed, _, _ = execute(target, plan, args.concurrency)
+        finally:
+            logging.disable(logging.NOTSET)
+        result["baseline_throughput_rps"] = round(len(plan) / baseline_elapsed, 1)
+        if result["log_records"]:
+            cost = (elapsed - baseline_elapsed) / result["log_records"]
+            result["logging_cost_us_per_record"] = round(cost * 1e6, 2)
+
+    result = {
+        "config": {
+            "target": args.target,
+            "url": args.url if args.target == 'http' else None,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "mix": mix
+        },
+        **result
+    }
+    print_report(result)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
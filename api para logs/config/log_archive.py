@@ -0,0 +1,432 @@
+import argparse
+import atexit
+import base64
+import collections
+import glob
+import hashlib
+import itertools
+import json
+import logging.handlers
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+import zlib
+from config.process_utils import pid_alive
+
+# Formato de un archivo .ndjson.gz:
+#   [stream gzip con las líneas NDJSON][footer JSON][largo del footer: uint32 big-endian][FOOTER_MAGIC]
+# El footer permite descartar archivos completos en una búsqueda sin descomprimirlos
+# (rango de asctime y filtro de Bloom de request_id). zcat descomprime los datos pero avisa
+# "trailing garbage ignored" por el footer y sale con status 2: usar "python -m config.log_archive cat".
+FOOTER_MAGIC = b'APILOGX1'
+_TRAILER = struct.Struct('>I8s')
+
+_READ_SIZE = 1024 * 1024
+
+# Segmentos rotados pendientes de comprimir: <log>-<stamp>-<pid>-<secuencia>.log
+_SEGMENT_PATTERN = '*-????????T??????-*-*.log'
+
+
+
+def archive_dir_for(log_dir):
+    """Directorio de archivo: LOG_ARCHIVE_DIR si se fijó, si no <log_dir>/archive"""
+    return os.environ.get('LOG_ARCHIVE_DIR') or os.path.join(log_dir, 'archive')
+
+
+LOG_ARCHIVE_DIR = archive_dir_for(os.environ.get('LOG_DIR', 'logs'))
+LOG_ARCHIVE_MAX_AGE_DAYS = float(os.environ.get('LOG_ARCHIVE_MAX_AGE_DAYS', '30'))
+LOG_ARCHIVE_MAX_BYTES = int(os.environ.get('LOG_ARCHIVE_MAX_BYTES', str(1024 ** 3)))
+LOG_ARCHIVE_COMPRESSLEVEL = int(os.environ.get('LOG_ARCHIVE_COMPRESSLEVEL', '6'))
+
+
+class BloomFilter:
+    """Filtro de Bloom simple (doble hashing sobre blake2b) para request_id"""
+
+    def __init__(self, size_bits, hashes=7, bits=None):
+        self.size_bits = max(8, size_bits)
+        self.hashes = hashes
+        self.bits = bits if bits is not None else bytearray((self.size_bits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity):
+        # ~10 bits por elemento y 7 hashes: ~1% de falsos positivos
+        return cls(max(1024, capacity * 10))
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        h1, h2 = struct.unpack('<QQ', digest)
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size_bits
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    def to_dict(self):
+        return {"size_bits": self.size_bits, "hashes": self.hashes,
+                "bits": base64.b64encode(bytes(self.bits)).decode('ascii')}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["size_bits"], data["hashes"], bytearray(base64.b64decode(data["bits"])))
+
+
+def write_archive(segment_path, archive_path, log_name, compresslevel=LOG_ARCHIVE_COMPRESSLEVEL):
+    """
+    Comprime un segmento rotado a NDJSON gzip con footer de índice.
+    Escribe en un temporal y lo renombra al final, así nunca queda un archivo a medias.
+    """
+    bloom = BloomFilter.for_capacity(os.path.getsize(segment_path) // 200 + 1)
+    event_types = collections.Counter()
+    first = last = None
+    records = 0
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, 31)
+    tmp_path = f'{archive_path}.{os.getpid()}.tmp'
+
+    with open(segment_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+        for line in src:
+            if not line.strip():
+                continue
+            if not line.endswith(b'\n'):
+                line += b'\n'
+            dst.write(compressor.compress(line))
+            records += 1
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(entry, dict):
+                continue
+            request_id = entry.get('request_id')
+            if isinstance(request_id, str):
+                bloom.add(request_id)
+            asctime = entry.get('asctime')
+            if isinstance(asctime, str):
+                first = asctime if first is None or asctime < first else first
+                last = asctime if last is None or asctime > last else last
+            event_types[entry.get('event_type') or 'none'] += 1
+        dst.write(compressor.flush())
+        gzip_bytes = dst.tell()
+
+        footer = json.dumps({
+            "version": 1,
+            "log": log_name,
+            "records": records,
+            "first_asctime": first,
+            "last_asctime": last,
+            "gzip_bytes": gzip_bytes,
+            "event_types": dict(event_types),
+            "request_id_bloom": bloom.to_dict()
+        }, separators=(',', ':')).encode('utf-8')
+        dst.write(footer)
+        dst.write(_TRAILER.pack(len(footer), FOOTER_MAGIC))
+        dst.flush()
+        os.fsync(dst.fileno())
+
+    os.replace(tmp_path, archive_path)
+    return archive_path
+
+
+def read_footer(path):
+    """
+    Lee solo el footer de un archivo (sin descomprimir los datos).
+    Un archivo ajeno, truncado o con el footer dañado da ValueError
+    """
+    with open(path, 'rb') as f:
+        size = f.seek(0, os.SEEK_END)
+        if size < _TRAILER.size:
+            raise ValueError(f"{path} no es un archivo de logs válido")
+        f.seek(-_TRAILER.size, os.SEEK_END)
+        length, magic = _TRAILER.unpack(f.read(_TRAILER.size))
+        if magic != FOOTER_MAGIC or length > size - _TRAILER.size:
+            raise ValueError(f"{path} no es un archivo de logs válido")
+        f.seek(-_TRAILER.size - length, os.SEEK_END)
+        footer = json.loads(f.read(length))
+    try:
+        footer["request_id_bloom"] = BloomFilter.from_dict(footer["request_id_bloom"])
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"{path}: footer inválido ({e})") from e
+    return footer
+
+
+def report_unreadable_archive(path, error):
+    """Registra un archivo que no se pudo leer (se saltea, no corta la búsqueda)"""
+    logging.getLogger('errors').warning("Skipping unreadable log archive", extra={
+        "event_type": "system_warning",
+        "warning_type": "log_archive_unreadable",
+        "error_message": str(error) or type(error).__name__,
+        "archive": path,
+        "component": "log_archiver"
+    })
+
+
+def iter_lines(path, footer=None):
+    """Itera las líneas NDJSON (bytes) de un archivo, descomprimiendo en streaming"""
+    if footer is None:
+        footer = read_footer(path)
+    remaining = footer["gzip_bytes"]
+    decompressor = zlib.decompressobj(31)
+    pending = b''
+    with open(path, 'rb') as f:
+        while remaining > 0:
+            chunk = f.read(min(_READ_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            try:
+                data = decompressor.decompress(chunk)
+            except zlib.error as e:
+                raise ValueError(f"{path}: datos comprimidos inválidos ({e})") from e
+            lines = (pending + data).split(b'\n')
+            pending = lines.pop()
+            yield from lines
+    try:
+        pending += decompressor.flush()
+    except zlib.error as e:
+        raise ValueError(f"{path}: datos comprimidos inválidos ({e})") from e
+    if pending:
+        yield pending
+
+
+def archive_files(archive_dir, log_name):
+    """Archivos de un log, del más nuevo al más viejo"""
+    return sorted(glob.glob(os.path.join(archive_dir, f'{log_name}-*.ndjson.gz')), reverse=True)
+
+
+def search_archives(archive_dir, log_name, since=None, until=None, offset=0, limit=100, **filters):
+    """
+    Busca en los archivos comprimidos; usa el footer para saltear los que no pueden
+    contener request_id o están fuera del rango de tiempo. Devuelve (registros, archivos leídos).
+    Los archivos ilegibles (ajenos, truncados) se registran y se saltean.
+    """
+    request_id = filters.get('request_id')
+    results = []
+    scanned = 0
+    for path in archive_files(archive_dir, log_name):
+        try:
+            footer = read_footer(path)
+        except (OSError, ValueError) as e:
+            report_unreadable_archive(path, e)
+            continue
+        if request_id is not None and request_id not in footer["request_id_bloom"]:
+            continue
+        if since and footer["last_asctime"] and footer["last_asctime"] < since:
+            continue
+        if until and footer["first_asctime"] and footer["first_asctime"] > until:
+            continue
+        event_type = filters.get('event_type')
+        if event_type is not None and event_type not in footer["event_types"]:
+            continue
+
+        scanned += 1
+        matches = []
+        try:
+            for line in iter_lines(path, footer):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if not isinstance(entry, dict):
+                    continue
+                asctime = entry.get('asctime') or ''
+                if since and asctime < since or until and asctime > until:
+                    continue
+                if all(entry.get(field) == value for field, value in filters.items()):
+                    matches.append(entry)
+        except (OSError, ValueError) as e:
+            report_unreadable_archive(path, e)
+            continue
+        # Dentro de un archivo las líneas están en orden cronológico
+        for entry in reversed(matches):
+            if offset:
+                offset -= 1
+                continue
+            results.append(entry)
+            if len(results) >= limit:
+                return results, scanned
+    return results, scanned
+
+
+def _segment_owner(path):
+    """PID del proceso a cargo de un segmento: el que lo rotó (.log) o el que lo reclamó (.archiving.<pid>)"""
+    name = os.path.basename(path)
+    try:
+        if '.archiving.' in name:
+            return int(name.rsplit('.', 1)[1])
+        return int(name[:-len('.log')].rsplit('-', 2)[1])
+    except (IndexError, ValueError):
+        return None
+
+
+class LogArchiver:
+    """
+    Hook de rotación para los RotatingFileHandler.
+    En vez de renombrar a .1, .2, ... el segmento rotado se renombra con un nombre único
+    en el mismo directorio del log (atómico, aunque archive_dir esté en otro filesystem)
+    y un hilo en segundo plano lo comprime al directorio de archivo.
+    La retención es por antigüedad (max_age_days) y tamaño total (max_bytes).
+
+    Antes de comprimir, el segmento se reclama renombrándolo a .archiving.<pid>, así
+    varios workers pueden compartir el directorio: al arrancar solo se retoman los
+    segmentos de procesos que ya no existen.
+    """
+
+    def __init__(self, archive_dir=LOG_ARCHIVE_DIR, max_age_days=LOG_ARCHIVE_MAX_AGE_DAYS,
+                 max_bytes=LOG_ARCHIVE_MAX_BYTES, compresslevel=LOG_ARCHIVE_COMPRESSLEVEL):
+        self.archive_dir = archive_dir
+        self.max_age_days = max_age_days
+        self.max_bytes = max_bytes
+        self.compresslevel = compresslevel
+        self.archived = 0
+        self._queue = queue.Queue()
+        self._sequence = itertools.count(1)
+        self._thread = None
+        self._segment_dirs = set()
+
+    def rotator(self, log_name):
+        """Función para asignar a handler.rotator del log indicado"""
+        def rotate(source, dest):
+            if not os.path.exists(source):
+                return
+            stamp = time.strftime('%Y%m%dT%H%M%S')
+            # Dentro del directorio del log: un rename a otro filesystem (EXDEV) dejaría
+            # al handler con el stream cerrado y sin poder rotar
+            segment = os.path.join(os.path.dirname(source), f'{log_name}-{stamp}-{os.getpid()}-{next(self._sequence):06d}.log')
+            os.rename(source, segment)
+            self._queue.put((segment, log_name))
+        return rotate
+
+    def attach(self, handler):
+        """Conecta el hook a un RotatingFileHandler (el nombre del log sale del archivo)"""
+        log_name = os.path.splitext(os.path.basename(handler.baseFilename))[0]
+        handler.rotator = self.rotator(log_name)
+        directory = os.path.dirname(handler.baseFilename)
+        if directory not in self._segment_dirs:
+            self._segment_dirs.add(directory)
+            if self._thread is not None:
+                self._recover(directory)
+
+    def _recover(self, directory):
+        """
+        Encola los segmentos que quedaron sin comprimir (por ejemplo tras un reinicio); los de
+        procesos vivos los está comprimiendo (o por comprimir) ese proceso
+        """
+        pending = glob.glob(os.path.join(directory, _SEGMENT_PATTERN)) + \
+            glob.glob(os.path.join(directory, _SEGMENT_PATTERN + '.archiving.*'))
+        for segment in sorted(pending):
+            pid = _segment_owner(segment)
+            if pid is not None and pid != os.getpid() and not pid_alive(pid):
+                self._queue.put((segment, os.path.basename(segment).split('-', 1)[0]))
+
+    def start(self):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        # El directorio de archivo también: ahí quedaban los segmentos de versiones anteriores
+        for directory in sorted({self.archive_dir, *self._segment_dirs}):
+            self._recover(directory)
+        self._thread = threading.Thread(target=self._run, name='log-archiver', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+        return self
+
+    def stop(self, timeout=30.0):
+        """Termina de comprimir lo pendiente y detiene el hilo"""
+        if self._thread is None:
+            return
+        # Cada reconfiguración crea un archivador nuevo: que atexit no retenga los detenidos
+        atexit.unregister(self.stop)
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            segment, log_name = item
+            base = segment[:-len('.log')] if segment.endswith('.log') else segment.rsplit('.log.archiving.', 1)[0]
+            claimed = f'{base}.log.archiving.{os.getpid()}'
+            try:
+                os.rename(segment, claimed)
+            except FileNotFoundError:
+                # Otro proceso lo reclamó primero
+                continue
+            try:
+                archive_path = os.path.join(self.archive_dir, os.path.basename(base) + '.ndjson.gz')
+                write_archive(claimed, archive_path, log_name, self.compresslevel)
+                os.remove(claimed)
+                self.archived += 1
+                self.apply_retention()
+            except Exception as e:
+                logging.getLogger('errors').error("Error archiving log segment", extra={
+                    "event_type": "system_error",
+                    "error_type": "log_archive_failed",
+                    "error_message": str(e),
+                    "segment": claimed,
+                    "component": "log_archiver"
+                })
+
+    def apply_retention(self, now=None):
+        """Borra los archivos más viejos que max_age_days y los que excedan max_bytes"""
+        if now is None:
+            now = time.time()
+        files = []
+        for path in glob.glob(os.path.join(self.archive_dir, '*.ndjson.gz')):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        files.sort(reverse=True)
+
+        total = 0
+        for mtime, size, path in files:
+            total += size
+            expired = self.max_age_days and now - mtime > self.max_age_days * 86400
+            if expired or (self.max_bytes and total > self.max_bytes):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    # Lo borró la retención de otro worker
+                    pass
+
+    def stats(self):
+        return {
+            "archived": self.archived,
+            "pending": self._queue.qsize()
+        }
+
+
+def attach_archiver(archiver, loggers):
+    """Instala el hook en todos los RotatingFileHandler de los loggers"""
+    for handler in {h for logger in loggers for h in logger.handlers}:
+        if isinstance(handler, logging.handlers.RotatingFileHandler):
+            archiver.attach(handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Herramientas para los archivos de logs comprimidos")
+    parser.add_argument('command', choices=('cat', 'info'))
+    parser.add_argument('paths', nargs='+')
+    args = parser.parse_args(argv)
+
+    out = sys.stdout.buffer
+    for path in args.paths:
+        if args.command == 'info':
+            footer = read_footer(path)
+            footer["request_id_bloom"] = {"size_bits": footer["request_id_bloom"].size_bits,
+                                          "hashes": footer["request_id_bloom"].hashes}
+            print(json.dumps(dict(footer, path=path), indent=2))
+        else:
+            for line in iter_lines(path):
+                out.write(line + b'\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+import collections
+import itertools
+import logging
+import threading
+import time
+import zlib
+
+
+def parse_sample_rates(spec):
+    """Convierte "api_request=10,health_check=100" en {event_type: N}"""
+    rates = {}
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        event_type, _, rate = item.partition('=')
+        rates[event_type.strip()] = int(rate)
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Filtro de muestreo por event_type: de cada N registros de un tipo se conserva uno.
+    Nunca descarta registros de nivel keep_level o superior ni los que llevan security_alert.
+
+    Si el registro tiene request_id la decisión se toma sobre ese ID, de modo que el
+    request y la response de un mismo request se conservan o descartan juntos.
+    Los registros conservados llevan sample_rate (cuántos registros representan) y
+    cada summary_interval se emite un resumen con la cantidad de registros omitidos.
+    """
+
+    def __init__(self, rates, summary_interval=60.0, keep_level=logging.WARNING):
+        super().__init__()
+        self.rates = {event_type: rate for event_type, rate in rates.items() if rate > 1}
+        self.summary_interval = summary_interval
+        self.keep_level = keep_level
+
+        self._counters = {event_type: itertools.count() for event_type in self.rates}
+        self._pending = collections.defaultdict(collections.Counter)  # logger -> event_type -> omitidos
+        self._totals = collections.Counter()
+        self._lock = threading.Lock()
+        self._last_summary = time.monotonic()
+        self._local = threading.local()
+
+    def filter(self, record):
+        if getattr(self._local, 'emitting', False):
+            return True
+
+        if record.levelno >= self.keep_level or getattr(record, 'security_alert', False):
+            keep = True
+        else:
+            event_type = getattr(record, 'event_type', None)
+            rate = self.rates.get(event_type)
+            if rate is None:
+                keep = True
+            else:
+                request_id = getattr(record, 'request_id', None)
+                if isinstance(request_id, str):
+                    keep = zlib.crc32(request_id.encode()) % rate == 0
+                else:
+                    keep = next(self._counters[event_type]) % rate == 0
+
+                if keep:
+                    record.sample_rate = rate
+                else:
+                    with self._lock:
+                        self._pending[record.name][event_type] += 1
+                        self._totals[event_type] += 1
+
+        if self.summary_interval and time.monotonic() - self._last_summary >= self.summary_interval:
+            self.emit_summaries()
+        return keep
+
+    def emit_summaries(self):
+        """Emite un registro de resumen por logger con los omitidos desde el último"""
+        with self._lock:
+            self._last_summary = time.monotonic()
+            pending, self._pending = self._pending, collections.defaultdict(collections.Counter)
+
+        self._local.emitting = True
+        try:
+            for logger_name, counts in pending.items():
+                suppressed = sum(counts.values())
+                logging.getLogger(logger_name).info(
+                    f"{suppressed} similar messages suppressed",
+                    extra={
+                        "event_type": "log_sampling",
+                        "suppressed": suppressed,
+                        "suppressed_by_event_type": dict(counts),
+                        "sample_rates": {event_type: self.rates[event_type] for event_type in counts}
+                    }
+                )
+        finally:
+            self._local.emitting = False
+
+    def suppressed_counts(self):
+        """Total de registros omitidos por event_type desde el inicio"""
+        with self._lock:
+            return dict(self._totals)
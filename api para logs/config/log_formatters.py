@@ -0,0 +1,126 @@
+import json
+import logging
+import re
+import time
+import traceback
+import types
+from datetime import date, datetime, time as dt_time
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional
+    orjson = None
+
+# Atributos propios de LogRecord que no se emiten como campos extra
+# (los mismos que reserva pythonjsonlogger, para mantener la salida idéntica)
+RESERVED_ATTRS = frozenset((
+    'args', 'asctime', 'created', 'exc_info', 'exc_text', 'filename',
+    'funcName', 'levelname', 'levelno', 'lineno', 'module',
+    'msecs', 'message', 'msg', 'name', 'pathname', 'process',
+    'processName', 'relativeCreated', 'stack_info', 'thread', 'threadName'
+))
+
+_FIELD_PATTERN = re.compile(r'%\((.+?)\)')
+
+
+def _json_default(obj):
+    """Serializa tipos no estándar igual que pythonjsonlogger.JsonEncoder"""
+    if isinstance(obj, (date, datetime, dt_time)):
+        return obj.isoformat()
+    if isinstance(obj, types.TracebackType):
+        return ''.join(traceback.format_tb(obj)).strip()
+    try:
+        return str(obj)
+    except Exception:
+        return None
+
+
+class FastJsonFormatter(logging.Formatter):
+    """
+    Formateador JSON de camino rápido.
+    Genera la misma salida que pythonjsonlogger.jsonlogger.JsonFormatter
+    (mismos campos, orden y separadores) pero con la lista de campos
+    precompilada, el asctime cacheado por segundo y un único encoder reutilizado.
+    Con use_orjson=True (y orjson instalado) la salida es JSON compacto equivalente.
+
+    La línea generada se cachea en el propio registro: cuando un mismo registro
+    pasa por varios handlers que comparten este formatter (file_security + file_all,
+    file_errors + file_all) se serializa una sola vez y todos escriben los mismos bytes.
+    """
+
+    def __init__(self, fmt=None, datefmt=None, style='%', validate=True, use_orjson=False):
+        if style != '%':
+            raise ValueError("FastJsonFormatter solo soporta el estilo '%'")
+        super().__init__(fmt, datefmt, style, validate)
+
+        self._fields = tuple(_FIELD_PATTERN.findall(self._fmt or ''))
+        self._skip = RESERVED_ATTRS | frozenset(self._fields)
+        self._needs_asctime = 'asctime' in self._fields
+        self._time_cache = (None, None)
+        # Identifica las líneas cacheadas por esta instancia; id(self) puede reutilizarse
+        # cuando el formatter se libera, y no significa nada en otro proceso
+        self._token = object()
+
+        self._encode = json.JSONEncoder(default=_json_default).encode
+        self.use_orjson = bool(use_orjson and orjson is not None)
+
+    def _asctime(self, record):
+        second = int(record.created)
+        cached_second, cached_value = self._time_cache
+        if cached_second != second:
+            cached_value = time.strftime(self.datefmt or self.default_time_format, self.converter(second))
+            self._time_cache = (second, cached_value)
+        if self.datefmt:
+            return cached_value
+        return self.default_msec_format % (cached_value, record.msecs)
+
+    def format(self, record):
+        cached = record.__dict__.get('_json_line')
+        if cached is not None and cached[0] is self._token:
+            return cached[1]
+
+        message_dict = None
+        if isinstance(record.msg, dict):
+            message_dict = dict(record.msg)
+            record.message = ""
+        else:
+            record.message = record.getMessage()
+
+        if self._needs_asctime:
+            record.asctime = self._asctime(record)
+
+        if record.exc_info or record.exc_text or record.stack_info:
+            if message_dict is None:
+                message_dict = {}
+            if record.exc_info and not message_dict.get('exc_info'):
+                message_dict['exc_info'] = self.formatException(record.exc_info)
+            if not message_dict.get('exc_info') and record.exc_text:
+                message_dict['exc_info'] = record.exc_text
+            if record.stack_info and not message_dict.get('stack_info'):
+                message_dict['stack_info'] = self.formatStack(record.stack_info)
+
+        attrs = record.__dict__
+        log_record = {field: attrs.get(field) for field in self._fields}
+        if message_dict:
+            log_record.update(message_dict)
+
+        skip = self._skip
+        for key, value in attrs.items():
+            if key not in skip and not key.startswith('_'):
+                log_record[key] = value
+
+        line = self.serialize(log_record)
+        # Los atributos con "_" no se emiten, así que el caché no llega al JSON
+        record._json_line = (self._token, line)
+        return line
+
+    def serialize(self, log_record):
+        """Serializa el registro ya armado a una línea JSON"""
+        if self.use_orjson:
+            try:
+                return orjson.dumps(log_record, default=_json_default,
+                                    option=orjson.OPT_NON_STR_KEYS).decode()
+            except TypeError:
+                # Enteros fuera de rango u otros casos que orjson no cubre
+                pass
+        return self._encode(log_record)
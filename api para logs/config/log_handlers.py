@@ -0,0 +1,257 @@
+import collections
+import logging
+import logging.handlers
+import os
+import threading
+import time
+import weakref
+from config.log_formatters import RESERVED_ATTRS
+
+
+class _BufferFlusher:
+    """
+    Hilo compartido que vacía los buffers de los handlers
+    cuando se cumple su umbral de tiempo
+    """
+
+    def __init__(self):
+        self._handlers = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._tick = 0.025
+
+    def register(self, handler):
+        with self._lock:
+            self._handlers.add(handler)
+            self._tick = min(self._tick, handler.flush_interval / 2)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="log-buffer-flusher", daemon=True)
+                self._thread.start()
+
+    def unregister(self, handler):
+        with self._lock:
+            self._handlers.discard(handler)
+
+    def after_fork(self):
+        # El hilo no sobrevive al fork; se relanza en el hijo si hace falta
+        self._lock = threading.Lock()
+        self._thread = None
+        handlers = list(self._handlers)
+        if handlers:
+            self.register(handlers[0])
+
+    def _run(self):
+        while True:
+            time.sleep(self._tick)
+            now = time.monotonic()
+            with self._lock:
+                handlers = list(self._handlers)
+            for handler in handlers:
+                handler.flush_if_due(now)
+
+
+_flusher = _BufferFlusher()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_flusher.after_fork)
+
+
+class BufferedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    RotatingFileHandler con escritura agrupada (group commit).
+    Acumula las líneas formateadas y las escribe con un único write cuando
+    se supera flush_bytes, pasa flush_interval o llega un registro de nivel
+    flush_level o superior. Los registros con security_alert se escriben
+    y sincronizan a disco (fsync) inmediatamente.
+    La rotación respeta maxBytes/backupCount igual que RotatingFileHandler.
+    """
+
+    def __init__(self, filename, mode='a', maxBytes=0, backupCount=0, encoding=None,
+                 delay=False, errors=None, flush_bytes=65536, flush_interval=0.05,
+                 flush_level=logging.WARNING):
+        self._buffer = []
+        self._pending = 0
+        self._first_pending = None
+        self._size = 0
+        self._encoding = None
+        super().__init__(filename, mode, maxBytes, backupCount, encoding, delay, errors=errors)
+
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.flush_level = logging._checkLevel(flush_level)
+        # bpo-45401: nunca rotar algo que no sea un archivo regular
+        self._rotatable = not (os.path.exists(self.baseFilename) and not os.path.isfile(self.baseFilename))
+        _flusher.register(self)
+
+    def _open(self):
+        stream = super()._open()
+        # El encoding real del archivo (con encoding=None, self.encoding vale "locale")
+        self._encoding = stream.encoding
+        stream.seek(0, 2)
+        self._size = stream.tell()
+        return stream
+
+    def emit(self, record):
+        try:
+            msg = self.format(record) + self.terminator
+
+            if self.stream is None:
+                self.stream = self._open()
+            # maxBytes y flush_bytes cuentan bytes en disco, no caracteres
+            size = len(msg.encode(self._encoding, self.errors or 'strict'))
+            if self.maxBytes > 0 and self._rotatable:
+                if self._size + self._pending + size >= self.maxBytes:
+                    self._write_buffer()
+                    self.doRollover()
+
+            if not self._buffer:
+                self._first_pending = time.monotonic()
+            self._buffer.append(msg)
+            self._pending += size
+
+            if getattr(record, 'security_alert', False):
+                self._write_buffer(sync=True)
+            elif record.levelno >= self.flush_level or self._pending >= self.flush_bytes:
+                self._write_buffer()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def _write_buffer(self, sync=False):
+        if self._buffer:
+            if self.stream is None:
+                self.stream = self._open()
+            data = ''.join(self._buffer)
+            size = self._pending
+            self._buffer.clear()
+            self._pending = 0
+            self._first_pending = None
+            self.stream.write(data)
+            self.stream.flush()
+            self._size += size
+        if sync and self.stream is not None:
+            os.fsync(self.stream.fileno())
+
+    def flush(self):
+        self.acquire()
+        try:
+            self._write_buffer()
+        finally:
+            self.release()
+
+    def flush_if_due(self, now):
+        """Vacía el buffer si la línea más antigua superó flush_interval"""
+        first = self._first_pending
+        if first is not None and now - first >= self.flush_interval:
+            self.flush()
+
+    def close(self):
+        _flusher.unregister(self)
+        self.acquire()
+        try:
+            self._write_buffer()
+        finally:
+            self.release()
+        super().close()
+
+
+class InMemoryHandler(logging.Handler):
+    """
+    Guarda las líneas formateadas en memoria en lugar de escribirlas a disco
+    (tests con el test client, tooling). Con capacity solo conserva las últimas.
+    """
+
+    def __init__(self, capacity=None):
+        super().__init__()
+        self.lines = collections.deque(maxlen=capacity)
+
+    def emit(self, record):
+        try:
+            self.lines.append(self.format(record))
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def clear(self):
+        self.lines.clear()
+
+
+class _RecentRecord:
+    """Entrada del ring buffer: solo lo que devuelve /api/logs/recent, sin el LogRecord"""
+
+    __slots__ = ('created', 'levelno', 'name', 'message', 'extras')
+
+    def __init__(self, created, levelno, name, message, extras):
+        self.created = created
+        self.levelno = levelno
+        self.name = name
+        self.message = message
+        self.extras = extras
+
+
+class RecentRecordsHandler(logging.Handler):
+    """
+    Ring buffer de los últimos registros de cada logger, para consultarlos sin leer disco.
+    Guarda entradas compactas (created, levelno, name, mensaje, extras) en un deque de
+    tamaño fijo por logger: append O(1), sin formatear y con memoria acotada; no retiene
+    args, exc_info ni el LogRecord. Un logger muy verboso no desplaza los registros de los demás.
+    """
+
+    def __init__(self, capacity=1000):
+        super().__init__()
+        self.capacity = capacity
+        self._records = {}
+
+    def emit(self, record):
+        try:
+            buffer = self._records.get(record.name)
+            if buffer is None:
+                buffer = self._records.setdefault(record.name, collections.deque(maxlen=self.capacity))
+            # Mismos campos extra que emite FastJsonFormatter (los atributos con "_" son internos)
+            extras = {key: value for key, value in record.__dict__.items()
+                      if key not in RESERVED_ATTRS and not key.startswith('_')}
+            buffer.append(_RecentRecord(record.created, record.levelno, record.name, record.getMessage(), extras))
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def recent(self, logger=None, level=logging.NOTSET, limit=None, **fields):
+        """
+        Registros más recientes primero, como dicts con los campos de las líneas JSON.
+        fields filtra por igualdad sobre los campos extra (por ejemplo event_type).
+        """
+        self.acquire()
+        try:
+            if logger is not None:
+                snapshot = list(self._records.get(logger, ()))
+            else:
+                snapshot = [entry for buffer in self._records.values() for entry in buffer]
+        finally:
+            self.release()
+
+        snapshot.sort(key=lambda entry: entry.created, reverse=True)
+        records = []
+        for entry in snapshot:
+            extras = entry.extras
+            if entry.levelno < level or any(extras.get(key) != value for key, value in fields.items()):
+                continue
+            records.append({
+                "asctime": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry.created)),
+                "name": entry.name,
+                "levelname": logging.getLevelName(entry.levelno),
+                "message": entry.message,
+                **extras
+            })
+            if limit is not None and len(records) >= limit:
+                break
+        return records
+
+    def clear(self):
+        self.acquire()
+        try:
+            self._records.clear()
+        finally:
+            self.release()
@@ -0,0 +1,176 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import threading
+
+# Políticas de desborde de la cola de logs
+OVERFLOW_POLICIES = ('block', 'drop_oldest', 'drop')
+
+_SENTINEL = object()
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    Handler que solo encola el registro en la cola del pipeline.
+    El formateo JSON y la escritura a disco los hacen los hilos escritores.
+    """
+
+    def __init__(self, pipeline, targets):
+        super().__init__(pipeline.queue)
+        self.pipeline = pipeline
+        self.targets = tuple(targets)
+
+    def prepare(self, record):
+        # Solo se resuelven los argumentos del mensaje para no retener
+        # objetos mutables; el resto del registro viaja intacto
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record):
+        self.pipeline.put((self.targets, record))
+
+
+class AsyncLogPipeline:
+    """
+    Pipeline asíncrono de logging con cola acotada.
+    Los loggers solo encolan registros y uno o más hilos escritores
+    los consumen en lotes, delegando en los handlers originales.
+    """
+
+    def __init__(self, loggers, maxsize=10000, overflow='block', workers=1, batch_size=256):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Política de desborde inválida: {overflow}")
+
+        self.queue = queue.Queue(maxsize)
+        self.overflow = overflow
+        self.workers = max(1, workers)
+        self.batch_size = batch_size
+        self.dropped = 0
+
+        self._loggers = list(loggers)
+        self._original_handlers = {}
+        self._threads = []
+        self._lock = threading.Lock()
+        self._running = False
+
+    def put(self, item):
+        """Encola un item aplicando la política de desborde"""
+        if self.overflow == 'block':
+            self.queue.put(item)
+            return
+
+        try:
+            self.queue.put_nowait(item)
+            return
+        except queue.Full:
+            if self.overflow == 'drop':
+                self._count_drop()
+                return
+
+        # drop_oldest: descartar el registro más antiguo hasta que haya lugar
+        while True:
+            try:
+                self.queue.get_nowait()
+                self._count_drop()
+            except queue.Empty:
+                pass
+            try:
+                self.queue.put_nowait(item)
+                return
+            except queue.Full:
+                continue
+
+    def _count_drop(self):
+        with self._lock:
+            self.dropped += 1
+
+    def start(self):
+        """Reemplaza los handlers de los loggers por la cola e inicia los escritores"""
+        if self._running:
+            return self
+
+        for logger in self._loggers:
+            handlers = list(logger.handlers)
+            self._original_handlers[logger] = handlers
+            for handler in handlers:
+                logger.removeHandler(handler)
+            logger.addHandler(BoundedQueueHandler(self, handlers))
+
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"log-writer-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        self._running = True
+        atexit.register(self.stop)
+        return self
+
+    def stop(self, timeout=5.0):
+        """Drena la cola, detiene los escritores y restaura los handlers originales"""
+        if not self._running:
+            return
+        self._running = False
+        # start() lo registra en cada arranque: sin esto se acumulan al reiniciar el pipeline
+        atexit.unregister(self.stop)
+
+        for logger, handlers in self._original_handlers.items():
+            for handler in list(logger.handlers):
+                if isinstance(handler, BoundedQueueHandler) and handler.pipeline is self:
+                    logger.removeHandler(handler)
+            for handler in handlers:
+                logger.addHandler(handler)
+
+        for _ in self._threads:
+            self.queue.put(_SENTINEL)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+        for handlers in self._original_handlers.values():
+            for handler in handlers:
+                handler.flush()
+
+    def stats(self):
+        """Estado actual de la cola"""
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_maxsize": self.queue.maxsize,
+            "overflow_policy": self.overflow,
+            "dropped": self.dropped,
+            "workers": self.workers
+        }
+
+    def _worker(self):
+        q = self.queue
+        while True:
+            batch = [q.get()]
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(q.get_nowait())
+            except queue.Empty:
+                pass
+
+            sentinels = 0
+            touched = set()
+            for item in batch:
+                if item is _SENTINEL:
+                    sentinels += 1
+                    continue
+                targets, record = item
+                for handler in targets:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+                        touched.add(handler)
+
+            # Un flush por handler y por lote
+            for handler in touched:
+                handler.flush()
+
+            if sentinels:
+                # Devolver los centinelas que correspondían a otros escritores
+                for _ in range(sentinels - 1):
+                    q.put(_SENTINEL)
+                return
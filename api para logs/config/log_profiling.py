@@ -0,0 +1,137 @@
+import contextvars
+import functools
+import os
+import threading
+import time
+
+# Instrumentación opt-in: tiempos por etapa de cada request y de cada handler/formatter
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '0') == '1'
+
+# Métodos de los handlers que se cronometran (si existen). emit incluye format;
+# en los handlers con buffer la escritura real a disco queda en flush
+TIMED_HANDLER_METHODS = ('format', 'emit', 'flush', 'shouldRollover', 'doRollover')
+
+_current_timing = contextvars.ContextVar('request_timing', default=None)
+
+
+class StageTimings:
+    """Agregado en memoria por etapa: cantidad, total y máximo en nanosegundos"""
+
+    def __init__(self):
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, ns):
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                self._stages[stage] = [1, ns, ns]
+            else:
+                entry[0] += 1
+                entry[1] += ns
+                if ns > entry[2]:
+                    entry[2] = ns
+
+    def snapshot(self):
+        with self._lock:
+            stages = {stage: list(entry) for stage, entry in self._stages.items()}
+        return {
+            stage: {
+                "count": count,
+                "total_ms": round(total / 1e6, 3),
+                "mean_us": round(total / count / 1e3, 3),
+                "max_us": round(peak / 1e3, 3)
+            }
+            for stage, (count, total, peak) in sorted(stages.items())
+        }
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+
+
+stage_timings = StageTimings()
+
+
+class RequestTiming:
+    """Acumulador de un request: lo llenan los hooks de profiling.py y los wrappers de logging"""
+
+    __slots__ = ('start_ns', 'routing_ns', 'endpoint_ns', 'logging_ns', 'logging_in_endpoint_ns', 'in_endpoint')
+
+    def __init__(self, start_ns):
+        self.start_ns = start_ns
+        self.routing_ns = 0
+        self.endpoint_ns = 0
+        self.logging_ns = 0
+        self.logging_in_endpoint_ns = 0
+        self.in_endpoint = False
+
+
+def begin_timing(start_ns):
+    timing = RequestTiming(start_ns)
+    _current_timing.set(timing)
+    return timing
+
+
+def current_timing():
+    return _current_timing.get()
+
+
+def end_timing():
+    _current_timing.set(None)
+
+
+def _timed(method, stage, timings):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter_ns()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            timings.record(stage, time.perf_counter_ns() - start)
+    wrapper.timed_original = method
+    return wrapper
+
+
+def _timed_logger_handle(handle, stage, timings):
+    # Tiempo de la llamada de logging en el hilo que loguea (con el pipeline
+    # asíncrono es solo el encolado); se suma también al request en curso
+    @functools.wraps(handle)
+    def wrapper(record):
+        start = time.perf_counter_ns()
+        try:
+            return handle(record)
+        finally:
+            elapsed = time.perf_counter_ns() - start
+            timings.record(stage, elapsed)
+            timing = _current_timing.get()
+            if timing is not None:
+                timing.logging_ns += elapsed
+                if timing.in_endpoint:
+                    timing.logging_in_endpoint_ns += elapsed
+    wrapper.timed_original = handle
+    return wrapper
+
+
+def _original(method):
+    return getattr(method, 'timed_original', method)
+
+
+def instrument_loggers(loggers, timings=stage_timings):
+    """Instala los wrappers de tiempo en los loggers, sus handlers y formatters"""
+    for logger in loggers:
+        logger.handle = _timed_logger_handle(_original(logger.handle), f"logger.{logger.name}.handle", timings)
+
+    for handler in {h for logger in loggers for h in logger.handlers}:
+        name = handler.get_name() or type(handler).__name__
+        for method_name in TIMED_HANDLER_METHODS:
+            method = getattr(handler, method_name, None)
+            if method is not None:
+                setattr(handler, method_name, _timed(_original(method), f"handler.{name}.{method_name}", timings))
+
+
+def uninstrument_loggers(loggers):
+    """Quita los wrappers de los loggers (los handlers se recrean en cada configuración)"""
+    for logger in loggers:
+        if 'handle' in vars(logger):
+            del logger.handle
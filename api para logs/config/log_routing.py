@@ -0,0 +1,163 @@
+import json
+import logging
+import os
+from config.log_sinks import LogSinkHandler
+
+# Tabla de ruteo (event_type y nivel -> destinos); se compila una vez al configurar el logging
+LOG_ROUTING_FILE = os.environ.get('LOG_ROUTING_FILE', os.path.join(os.path.dirname(__file__), 'log_routing.json'))
+
+# Destinos que puede nombrar la tabla -> handlers de get_logging_config que los implementan
+# (solo los que estén configurados; "sinks" son todos los LogSinkHandler)
+DESTINATIONS = {
+    'all': ('file_all', 'memory_all'),
+    'errors': ('file_errors', 'memory_errors'),
+    'security': ('file_security', 'memory_security'),
+    'console': ('console',),
+    'recent': ('recent',),
+    'sinks': ()
+}
+
+# Niveles para los que se precompila el despacho; el resto se resuelve con el primer registro
+_STANDARD_LEVELS = (logging.DEBUG, logging.INFO, logging.WARNING, logging.ERROR, logging.CRITICAL)
+
+# Tope de combinaciones resueltas al vuelo (event_types fuera de la tabla, niveles propios)
+_MAX_DISPATCH_ENTRIES = 4096
+
+
+def _levelno(level):
+    levelno = logging.getLevelName(level.upper()) if isinstance(level, str) else level
+    if not isinstance(levelno, int):
+        raise ValueError(f"Nivel inválido en la tabla de ruteo: {level}")
+    return levelno
+
+
+def load_routing_table(path=LOG_ROUTING_FILE):
+    """
+    Lee y valida la tabla de ruteo JSON (ver config/log_routing.json); un destino o
+    nivel inválido da ValueError antes de tocar la configuración de logging
+    """
+    with open(path, encoding='utf-8') as f:
+        table = json.load(f)
+    for section in ('events', 'default'):
+        for levels in table.get(section, {}).values():
+            for level, names in levels.items():
+                _levelno(level)
+                for name in names:
+                    if name not in DESTINATIONS:
+                        raise ValueError(f"Destino inválido en la tabla de ruteo: {name} (opciones: {', '.join(DESTINATIONS)})")
+    return table
+
+
+def destination_handlers(handlers):
+    """
+    {nombre: handler} de la configuración -> {destino: tupla de handlers}.
+    En un worker multiproceso todo lo que no es el ring buffer sale por log_server:
+    el proceso escritor vuelve a rutear con la misma tabla.
+    """
+    ship = handlers.get('log_server')
+    resolved = {}
+    for destination, names in DESTINATIONS.items():
+        if ship is not None and destination != 'recent':
+            resolved[destination] = (ship,)
+        elif destination == 'sinks':
+            resolved[destination] = tuple(h for h in handlers.values() if isinstance(h, LogSinkHandler))
+        else:
+            resolved[destination] = tuple(handlers[name] for name in names if name in handlers)
+    return resolved
+
+
+def _compile_levels(levels, destinations):
+    """{"INFO": [...], "WARNING": [...]} -> ((20, handlers), (30, handlers)) ordenado por nivel"""
+    thresholds = []
+    for level, names in levels.items():
+        handlers = []
+        for name in names:
+            handlers.extend(h for h in destinations[name] if h not in handlers)
+        thresholds.append((_levelno(level), tuple(handlers)))
+    return tuple(sorted(thresholds, key=lambda item: item[0]))
+
+
+class EventRouter:
+    """
+    Tabla de ruteo compilada: (logger, event_type, nivel) -> tupla de handlers.
+
+    "events" rutea por event_type, sin importar con qué logger se emitió el registro;
+    "default" cubre, por logger, los registros sin event_type o con uno que no está en
+    la tabla. Para cada nivel aplica la entrada de umbral más alto que no lo supere:
+    por debajo del umbral más bajo, o con una lista vacía, el registro no va a ningún lado.
+    """
+
+    def __init__(self, table, destinations, loggers=()):
+        self._events = {
+            event_type: _compile_levels(levels, destinations)
+            for event_type, levels in table.get('events', {}).items()
+        }
+        self._default = {
+            logger: _compile_levels(levels, destinations)
+            for logger, levels in table.get('default', {}).items()
+        }
+
+        # Todas las combinaciones conocidas quedan resueltas de antemano
+        self._dispatch = {}
+        for logger in {*self._default, *loggers}:
+            for event_type in (*self._events, None):
+                for levelno in _STANDARD_LEVELS:
+                    self._dispatch[(logger, event_type, levelno)] = self._resolve(logger, event_type, levelno)
+
+        self.handlers = tuple({
+            handler: None
+            for routes in (*self._events.values(), *self._default.values())
+            for _, handlers in routes
+            for handler in handlers
+        })
+
+    def _resolve(self, logger, event_type, levelno):
+        thresholds = self._events.get(event_type)
+        if thresholds is None:
+            thresholds = self._default.get(logger, ())
+        targets = ()
+        for threshold, handlers in thresholds:
+            if levelno < threshold:
+                break
+            targets = handlers
+        # El nivel de cada handler también queda resuelto acá
+        return tuple(handler for handler in targets if levelno >= handler.level)
+
+    def targets(self, logger, event_type, levelno):
+        """Handlers que reciben un registro; vacío si nadie está suscripto"""
+        key = (logger, event_type, levelno)
+        try:
+            targets = self._dispatch.get(key)
+        except TypeError:
+            # event_type no hasheable (un extra mal armado): se rutea como si no tuviera
+            return self._resolve(logger, None, levelno)
+        if targets is None:
+            targets = self._resolve(logger, event_type, levelno)
+            if len(self._dispatch) < _MAX_DISPATCH_ENTRIES:
+                self._dispatch[key] = targets
+        return targets
+
+
+class RoutingHandler(logging.Handler):
+    """
+    Único handler de los loggers de la API: entrega cada registro a los handlers que le
+    asigna la tabla compilada, con una sola búsqueda en un dict. Un registro sin destinos
+    no se formatea. Los filtros y el lock de cada handler se respetan (handle).
+    """
+
+    def __init__(self, router):
+        super().__init__()
+        self.router = router
+
+    def handle(self, record):
+        targets = self.router.targets(record.name, getattr(record, 'event_type', None), record.levelno)
+        for handler in targets:
+            handler.handle(record)
+        return bool(targets)
+
+    def emit(self, record):
+        self.handle(record)
+
+    def flush(self):
+        for handler in self.router.handlers:
+            handler.flush()
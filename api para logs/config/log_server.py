@@ -0,0 +1,205 @@
+import argparse
+import logging
+import logging.handlers
+import os
+import pickle
+import signal
+import socket
+import socketserver
+import struct
+import subprocess
+import sys
+import threading
+import time
+import weakref
+
+# Modo multiproceso (gunicorn con varios workers): los workers no abren los archivos,
+# envían los registros por un socket Unix a un único proceso escritor que formatea,
+# rota y escribe api_all.log, api_errors.log y api_security.log
+LOG_MULTIPROCESS = os.environ.get('LOG_MULTIPROCESS', '0') == '1'
+LOG_SERVER_SOCKET = os.environ.get('LOG_SERVER_SOCKET', os.path.join('logs', 'log_server.sock'))
+
+# Mismo framing que logging.handlers.SocketHandler: largo (uint32 big-endian) + pickle
+_LENGTH = struct.Struct('>L')
+
+_ship_handlers = weakref.WeakSet()
+
+
+def _after_fork():
+    # La conexión heredada del padre no se comparte: cada proceso abre la suya
+    for handler in list(_ship_handlers):
+        handler.sock = None
+        handler.retryTime = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+class LogShipHandler(logging.handlers.SocketHandler):
+    """
+    Envía cada registro al proceso escritor por el socket Unix.
+    Si el escritor no está disponible el registro se descarta y se cuenta
+    (SocketHandler reintenta la conexión con backoff exponencial).
+    """
+
+    def __init__(self, address=LOG_SERVER_SOCKET):
+        super().__init__(address, None)
+        self.shipped = 0
+        self.unshipped = 0
+        _ship_handlers.add(self)
+
+    def send(self, s):
+        if self.sock is None:
+            self.createSocket()
+        if self.sock is None:
+            self.unshipped += 1
+            return
+        try:
+            self.sock.sendall(s)
+            self.shipped += 1
+        except OSError:
+            self.unshipped += 1
+            self.sock.close()
+            self.sock = None
+
+    def stats(self):
+        return {
+            "shipped": self.shipped,
+            "unshipped": self.unshipped,
+            "connected": self.sock is not None
+        }
+
+
+def get_ship_stats():
+    """Totales de los handlers de envío del proceso (ceros si no hay modo multiproceso)"""
+    totals = {"shipped": 0, "unshipped": 0}
+    for handler in list(_ship_handlers):
+        totals["shipped"] += handler.shipped
+        totals["unshipped"] += handler.unshipped
+    return totals
+
+
+class _RecordStreamHandler(socketserver.StreamRequestHandler):
+    """Una conexión por worker: lee registros y los pasa a los loggers locales"""
+
+    def handle(self):
+        read = self.rfile.read
+        while True:
+            header = read(_LENGTH.size)
+            if len(header) < _LENGTH.size:
+                return
+            (length,) = _LENGTH.unpack(header)
+            data = read(length)
+            if len(data) < length:
+                return
+            record = logging.makeLogRecord(pickle.loads(data))
+            logging.getLogger(record.name).handle(record)
+
+
+class LogServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Servidor del proceso escritor. Al haber un único proceso dueño de los archivos
+    la rotación no compite entre workers y las líneas nunca se intercalan.
+    El socket se crea con permisos 0600: los registros viajan como pickle.
+    """
+
+    daemon_threads = False
+    block_on_close = True
+
+    def __init__(self, address=LOG_SERVER_SOCKET):
+        os.makedirs(os.path.dirname(address) or '.', exist_ok=True)
+        if os.path.exists(address):
+            os.remove(address)
+        old_umask = os.umask(0o177)
+        try:
+            super().__init__(address, _RecordStreamHandler)
+        finally:
+            os.umask(old_umask)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.remove(self.server_address)
+        except OSError:
+            pass
+
+
+def serve(address=LOG_SERVER_SOCKET):
+    """
+    Corre el proceso escritor hasta recibir SIGTERM/SIGINT.
+    Configura los handlers de archivo reales (sin muestreo: ya se aplicó en los workers).
+    """
+    from config.logging_config import setup_custom_loggers, get_log_archiver
+
+    setup_custom_loggers(async_mode=False, sample_rates={}, multiprocess=False)
+    server = LogServer(address)
+
+    def stop(signum, frame):
+        # shutdown() espera a serve_forever: se llama desde otro hilo
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    try:
+        server.serve_forever()
+    finally:
+        # Espera a que los workers cierren su conexión y vacía los buffers
+        server.server_close()
+        archiver = get_log_archiver()
+        if archiver is not None:
+            archiver.stop()
+        logging.shutdown()
+
+
+def _accepting(address):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(address)
+        except OSError:
+            return False
+    return True
+
+
+def start_log_server(address=LOG_SERVER_SOCKET, timeout=10.0):
+    """
+    Lanza el proceso escritor (python -m config.log_server) y espera a que el socket
+    acepte conexiones. Es un proceso aparte y no un fork: los workers de gunicorn
+    no heredan nada de él.
+    """
+    app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [app_dir, env.get('PYTHONPATH')]))
+    process = subprocess.Popen([sys.executable, '-m', 'config.log_server', '--socket', address], env=env)
+
+    deadline = time.monotonic() + timeout
+    while not _accepting(address):
+        if process.poll() is not None or time.monotonic() > deadline:
+            stop_log_server(process)
+            raise RuntimeError(f"El proceso escritor de logs no arrancó (socket {address})")
+        time.sleep(0.05)
+    return process
+
+
+def stop_log_server(process, timeout=10.0):
+    """Detiene el proceso escritor (termina de escribir lo recibido)"""
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Proceso escritor de logs para el modo multiproceso")
+    parser.add_argument('--socket', default=LOG_SERVER_SOCKET)
+    args = parser.parse_args(argv)
+    serve(args.socket)
+
+
+if __name__ == '__main__':
+    main()
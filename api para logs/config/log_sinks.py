@@ -0,0 +1,669 @@
+import argparse
+import datetime
+import glob
+import logging
+import os
+import queue
+import random
+import select
+import socket
+import socketserver
+import sys
+import threading
+import time
+import urllib.parse
+import weakref
+from config.process_utils import pid_alive
+
+# Destinos de red para los registros JSON (syslog sobre TCP/UDP o un socket Unix):
+# "tcp://wazuh:514,unix:///var/run/collector.sock?format=json" (vacío = sin sinks).
+# Parámetros por destino: format, framing, pool, facility y name
+LOG_SINKS = os.environ.get('LOG_SINKS', '')
+LOG_SINK_FORMAT = os.environ.get('LOG_SINK_FORMAT', 'rfc3164')
+LOG_SINK_FRAMING = os.environ.get('LOG_SINK_FRAMING', 'newline')
+LOG_SINK_FACILITY = os.environ.get('LOG_SINK_FACILITY', 'local0')
+# Conexiones persistentes por destino (un hilo emisor por conexión)
+LOG_SINK_POOL_SIZE = int(os.environ.get('LOG_SINK_POOL_SIZE', '1'))
+LOG_SINK_QUEUE_SIZE = int(os.environ.get('LOG_SINK_QUEUE_SIZE', '10000'))
+LOG_SINK_BATCH_SIZE = int(os.environ.get('LOG_SINK_BATCH_SIZE', '256'))
+LOG_SINK_FLUSH_INTERVAL = float(os.environ.get('LOG_SINK_FLUSH_INTERVAL', '0.05'))
+LOG_SINK_CONNECT_TIMEOUT = float(os.environ.get('LOG_SINK_CONNECT_TIMEOUT', '2'))
+LOG_SINK_BACKOFF_INITIAL = float(os.environ.get('LOG_SINK_BACKOFF_INITIAL', '0.5'))
+LOG_SINK_BACKOFF_MAX = float(os.environ.get('LOG_SINK_BACKOFF_MAX', '30'))
+# Buffer en disco mientras el colector no está disponible (o la cola está llena)
+LOG_SINK_SPILL_DIR = os.environ.get('LOG_SINK_SPILL_DIR', os.path.join('logs', 'spill'))
+LOG_SINK_SPILL_MAX_BYTES = int(os.environ.get('LOG_SINK_SPILL_MAX_BYTES', str(100 * 1024 ** 2)))
+LOG_SINK_SPILL_SEGMENT_BYTES = int(os.environ.get('LOG_SINK_SPILL_SEGMENT_BYTES', str(4 * 1024 ** 2)))
+
+# program_name que espera config/wazuh_decoders.xml
+SYSLOG_APP_NAME = 'api_microservice'
+
+SINK_TRANSPORTS = ('tcp', 'udp', 'unix')
+SINK_FORMATS = ('rfc3164', 'rfc5424', 'json')
+SINK_FRAMINGS = ('newline', 'octet')
+
+# El agente agrega log_type con <label>; por la red va dentro del JSON (regla 100001)
+_LOG_TYPES = {'security': 'api_security', 'errors': 'api_errors'}
+
+_FACILITIES = {
+    'kern': 0, 'user': 1, 'daemon': 3, 'auth': 4, 'syslog': 5, 'authpriv': 10,
+    'local0': 16, 'local1': 17, 'local2': 18, 'local3': 19,
+    'local4': 20, 'local5': 21, 'local6': 22, 'local7': 23
+}
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+_SPILL_READ_LINES = 1024
+
+_sink_handlers = weakref.WeakSet()
+
+
+def _severity(levelno):
+    if levelno >= logging.CRITICAL:
+        return 2
+    if levelno >= logging.ERROR:
+        return 3
+    if levelno >= logging.WARNING:
+        return 4
+    if levelno >= logging.INFO:
+        return 6
+    return 7
+
+
+def parse_sink_url(url):
+    """
+    "tcp://host:514?format=rfc5424&pool=2" -> dict con transport, address y opciones.
+    Los valores que no vienen en la URL salen de las variables LOG_SINK_*
+    """
+    parsed = urllib.parse.urlsplit(url.strip())
+    params = dict(urllib.parse.parse_qsl(parsed.query))
+    transport = parsed.scheme
+    if transport not in SINK_TRANSPORTS:
+        raise ValueError(f"Destino de logs inválido: {url} (opciones: {', '.join(SINK_TRANSPORTS)})")
+    if transport == 'unix':
+        address = parsed.path
+        if not address:
+            raise ValueError(f"Falta la ruta del socket en {url}")
+    else:
+        if not parsed.hostname or not parsed.port:
+            raise ValueError(f"Falta host:puerto en {url}")
+        address = (parsed.hostname, parsed.port)
+
+    sink = {
+        "transport": transport,
+        "address": address,
+        "format": params.get('format', LOG_SINK_FORMAT),
+        "framing": params.get('framing', LOG_SINK_FRAMING),
+        "facility": params.get('facility', LOG_SINK_FACILITY),
+        "pool": int(params.get('pool', LOG_SINK_POOL_SIZE)),
+        "name": params.get('name')
+    }
+    if sink["format"] not in SINK_FORMATS:
+        raise ValueError(f"format debe ser uno de {', '.join(SINK_FORMATS)}")
+    if sink["framing"] not in SINK_FRAMINGS:
+        raise ValueError(f"framing debe ser uno de {', '.join(SINK_FRAMINGS)}")
+    if sink["facility"] not in _FACILITIES:
+        raise ValueError(f"facility debe ser una de {', '.join(_FACILITIES)}")
+    if sink["pool"] < 1:
+        raise ValueError("pool debe ser al menos 1")
+    return sink
+
+
+def parse_sinks(spec):
+    """"tcp://a:514,unix:///x.sock" (o una lista) -> [(nombre del handler, url)]"""
+    if isinstance(spec, str):
+        spec = [url.strip() for url in spec.split(',') if url.strip()]
+    sinks = []
+    for index, url in enumerate(spec):
+        sinks.append((parse_sink_url(url)["name"] or f'sink_{index}', url))
+    return sinks
+
+
+class _Connection:
+    """Socket conectado al colector; envía un lote ya enmarcado"""
+
+    def __init__(self, transport, address, timeout):
+        if transport == 'unix':
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            family = socket.getaddrinfo(address[0], address[1])[0][0]
+            kind = socket.SOCK_DGRAM if transport == 'udp' else socket.SOCK_STREAM
+            self.sock = socket.socket(family, kind)
+        self.datagram = transport == 'udp'
+        try:
+            self.sock.settimeout(timeout)
+            self.sock.connect(address)
+        except OSError:
+            self.sock.close()
+            raise
+
+    def alive(self):
+        """Falso si el colector cerró la conexión (evita perder el próximo lote en un socket muerto)"""
+        if self.datagram:
+            return True
+        try:
+            readable, _, _ = select.select([self.sock], [], [], 0)
+            # El colector no envía nada: si hay algo para leer es el cierre (b'')
+            return not readable or self.sock.recv(1, socket.MSG_PEEK) != b''
+        except (OSError, ValueError):
+            return False
+
+    def send(self, frames):
+        if self.datagram:
+            for frame in frames:
+                self.sock.send(frame)
+        else:
+            self.sock.sendall(b''.join(frames))
+
+    def close(self):
+        self.sock.close()
+
+
+class ConnectionPool:
+    """
+    Conexiones persistentes a un colector (hasta size). Tras un error de conexión
+    no se reintenta hasta que pasa el backoff, que se duplica con cada fallo
+    (con jitter) hasta backoff_max y vuelve a cero con la primera conexión exitosa.
+    """
+
+    def __init__(self, transport, address, size=1, timeout=LOG_SINK_CONNECT_TIMEOUT,
+                 backoff_initial=LOG_SINK_BACKOFF_INITIAL, backoff_max=LOG_SINK_BACKOFF_MAX):
+        self.transport = transport
+        self.address = address
+        self.size = size
+        self.timeout = timeout
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.failures = 0
+        self._idle = []
+        self._open = 0
+        self._backoff = 0.0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Conexión lista para enviar, o None si el colector no está disponible"""
+        with self._lock:
+            while self._idle:
+                connection = self._idle.pop()
+                if connection.alive():
+                    return connection
+                connection.close()
+                self._open -= 1
+            if self._open >= self.size or time.monotonic() < self._retry_at:
+                return None
+            self._open += 1
+        try:
+            connection = _Connection(self.transport, self.address, self.timeout)
+        except OSError:
+            with self._lock:
+                self._open -= 1
+                self._failed()
+            return None
+        with self._lock:
+            self._backoff = 0.0
+        return connection
+
+    def release(self, connection):
+        with self._lock:
+            self._idle.append(connection)
+
+    def discard(self, connection):
+        """La conexión falló al enviar: se cierra y empieza el backoff"""
+        connection.close()
+        with self._lock:
+            self._open -= 1
+            self._failed()
+
+    def _failed(self):
+        self.failures += 1
+        self._backoff = min(self.backoff_max, self._backoff * 2 or self.backoff_initial)
+        self._retry_at = time.monotonic() + self._backoff * random.uniform(0.5, 1.0)
+
+    def connected(self):
+        with self._lock:
+            return self._open
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for connection in idle:
+            connection.close()
+
+
+class DiskSpillBuffer:
+    """
+    Registros pendientes en disco, un mensaje por línea, en segmentos
+    spill-<ns>-<pid>.part (el que se está escribiendo) que se cierran como .log.
+    Para reenviar un segmento se lo reclama renombrándolo (.sending), así varios
+    procesos pueden compartir el directorio; los .part/.sending de procesos que ya
+    no existen se recuperan. Al superar max_bytes se descartan los segmentos más viejos.
+    """
+
+    def __init__(self, directory, max_bytes=LOG_SINK_SPILL_MAX_BYTES, segment_bytes=LOG_SINK_SPILL_SEGMENT_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.dropped = 0
+        self._file = None
+        self._path = None
+        self._size = 0
+        self._lock = threading.Lock()
+        self._drain_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+        self.has_pending = bool(self._segments())
+
+    def _segments(self):
+        """Segmentos cerrados, del más viejo al más nuevo"""
+        return sorted(glob.glob(os.path.join(self.directory, 'spill-*.log')))
+
+    def _recover(self):
+        for path in glob.glob(os.path.join(self.directory, 'spill-*.part')) + \
+                glob.glob(os.path.join(self.directory, 'spill-*.sending')):
+            base, _, _suffix = path.rpartition('.')
+            try:
+                pid = int(base.rsplit('-', 1)[1])
+            except (IndexError, ValueError):
+                continue
+            if pid != os.getpid() and not pid_alive(pid):
+                try:
+                    os.replace(path, base + '.log')
+                except OSError:
+                    continue
+
+    def append(self, messages):
+        data = b''.join(message + b'\n' for message in messages)
+        with self._lock:
+            if self._file is None:
+                self._path = os.path.join(self.directory, f'spill-{time.time_ns():020d}-{os.getpid()}.part')
+                self._file = open(self._path, 'ab')
+                self._size = 0
+            self._file.write(data)
+            self._size += len(data)
+            self.has_pending = True
+            if self._size >= self.segment_bytes:
+                self._seal()
+                self._enforce_limit()
+
+    def _seal(self):
+        if self._file is not None:
+            self._file.close()
+            os.replace(self._path, self._path[:-len('.part')] + '.log')
+            self._file = None
+
+    def seal(self):
+        """Cierra el segmento en curso para que pueda reenviarse (también desde otro proceso)"""
+        with self._lock:
+            self._seal()
+
+    def _enforce_limit(self):
+        segments = self._segments()
+        sizes = []
+        for path in segments:
+            try:
+                sizes.append(os.path.getsize(path))
+            except OSError:
+                sizes.append(0)
+        total = sum(sizes)
+        for path, size in zip(segments, sizes):
+            if total <= self.max_bytes:
+                break
+            try:
+                with open(path, 'rb') as f:
+                    lines = sum(block.count(b'\n') for block in iter(lambda: f.read(1024 * 1024), b''))
+                os.remove(path)
+            except OSError:
+                continue
+            self.dropped += lines
+            total -= size
+
+    def drain(self, send):
+        """
+        Reenvía los segmentos pendientes en orden con send(mensajes) -> bool.
+        Si un envío falla, lo que quedó sin enviar vuelve al disco y se corta.
+        Devuelve la cantidad de mensajes reenviados
+        """
+        if not self._drain_lock.acquire(blocking=False):
+            return 0
+        sent = 0
+        try:
+            self.seal()
+            for path in self._segments():
+                claimed = path[:-len('.log')] + '.sending'
+                try:
+                    os.replace(path, claimed)
+                except OSError:
+                    continue
+                with open(claimed, 'rb') as f:
+                    while True:
+                        lines = [line.rstrip(b'\n') for _, line in zip(range(_SPILL_READ_LINES), f)]
+                        if not lines:
+                            break
+                        if not send(lines):
+                            rest = f.read()
+                            with open(path + '.tmp', 'wb') as out:
+                                out.write(b''.join(line + b'\n' for line in lines) + rest)
+                            os.replace(path + '.tmp', path)
+                            os.remove(claimed)
+                            return sent
+                        sent += len(lines)
+                os.remove(claimed)
+            with self._lock:
+                self.has_pending = self._file is not None or bool(self._segments())
+            return sent
+        finally:
+            self._drain_lock.release()
+
+    def close(self):
+        self.seal()
+
+
+class LogSinkHandler(logging.Handler):
+    """
+    Envía los registros JSON a un colector (syslog por TCP/UDP o socket Unix) con el
+    program_name api_microservice. emit solo formatea y encola; los hilos emisores
+    (uno por conexión del pool) envían lotes de hasta batch_size mensajes por write.
+    Si el colector no está disponible, o la cola se llena, los mensajes van al buffer
+    en disco y se reenvían, en orden, cuando vuelve la conexión.
+    """
+
+    def __init__(self, url, app_name=SYSLOG_APP_NAME, queue_size=LOG_SINK_QUEUE_SIZE,
+                 batch_size=LOG_SINK_BATCH_SIZE, flush_interval=LOG_SINK_FLUSH_INTERVAL,
+                 spill_dir=LOG_SINK_SPILL_DIR, spill_max_bytes=LOG_SINK_SPILL_MAX_BYTES,
+                 close_timeout=5.0):
+        super().__init__()
+        sink = parse_sink_url(url)
+        self.url = url
+        self.format_name = sink["format"]
+        self.framing = sink["framing"]
+        self.facility = _FACILITIES[sink["facility"]]
+        self.pool = ConnectionPool(sink["transport"], sink["address"], sink["pool"])
+        self.app_name = app_name
+        self.hostname = socket.gethostname().split('.')[0] or '-'
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_dir = spill_dir
+        self.spill_max_bytes = spill_max_bytes
+        self.close_timeout = close_timeout
+        self.sent = 0
+        self.spilled = 0
+        self._pid = None
+        self._queue = None
+        self._spill = None
+        self._threads = []
+        self._stopping = False
+        self._start_lock = threading.Lock()
+        _sink_handlers.add(self)
+
+    def _start(self):
+        # Al primer registro (ya con nombre asignado) y de nuevo en el hijo tras un fork
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            name = self.get_name() or 'sink'
+            if self._pid is not None:
+                self.pool = ConnectionPool(self.pool.transport, self.pool.address, self.pool.size)
+            self._queue = queue.Queue(self.queue_size)
+            self._spill = DiskSpillBuffer(os.path.join(self.spill_dir, name), self.spill_max_bytes)
+            self._threads = [
+                threading.Thread(target=self._run, name=f"log-{name}-{i}", daemon=True)
+                for i in range(self.pool.size)
+            ]
+            for thread in self._threads:
+                thread.start()
+            self._pid = os.getpid()
+
+    def message(self, record):
+        """Registro -> mensaje (bytes, una línea) en el formato del destino"""
+        payload = self.format(record)
+        if payload.startswith('{'):
+            log_type = _LOG_TYPES.get(record.name, 'api_microservice')
+            payload = f'{{"log_type": "{log_type}", "service": "api_logs", ' + payload[1:]
+        if '\n' in payload:
+            payload = payload.replace('\n', ' ')
+        if self.format_name == 'json':
+            return payload.encode('utf-8')
+
+        pri = self.facility * 8 + _severity(record.levelno)
+        if self.format_name == 'rfc5424':
+            timestamp = datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc)
+            timestamp = timestamp.isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+            return f"<{pri}>1 {timestamp} {self.hostname} {self.app_name} {record.process} - - {payload}".encode('utf-8')
+        local = time.localtime(record.created)
+        timestamp = f"{_MONTHS[local.tm_mon - 1]} {local.tm_mday:2d} {local.tm_hour:02d}:{local.tm_min:02d}:{local.tm_sec:02d}"
+        return f"<{pri}>{timestamp} {self.hostname} {self.app_name}[{record.process}]: {payload}".encode('utf-8')
+
+    def frame(self, message):
+        if self.framing == 'octet':
+            return b'%d %s' % (len(message), message)
+        return message + b'\n'
+
+    def emit(self, record):
+        try:
+            if self._pid != os.getpid():
+                self._start()
+            message = self.message(record)
+            try:
+                self._queue.put_nowait(message)
+            except queue.Full:
+                # Contrapresión: el excedente va al disco en lugar de frenar al que loguea
+                self._spill_messages([message])
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def _spill_messages(self, messages):
+        self._spill.append(messages)
+        self.spilled += len(messages)
+
+    def _send(self, messages):
+        """Envía un lote por una conexión del pool. False si el colector no está disponible"""
+        connection = self.pool.acquire()
+        if connection is None:
+            return False
+        try:
+            connection.send([self.frame(message) for message in messages])
+        except OSError:
+            self.pool.discard(connection)
+            return False
+        self.pool.release(connection)
+        self.sent += len(messages)
+        return True
+
+    def _collector_up(self):
+        connection = self.pool.acquire()
+        if connection is None:
+            return False
+        self.pool.release(connection)
+        return True
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return [message for message in batch if message is not None]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if self._spill.has_pending and not self._stopping and self._collector_up():
+                # Primero lo que quedó en disco, para respetar el orden
+                self._spill.drain(self._send)
+            if batch and (self._spill.has_pending or not self._send(batch)):
+                self._spill_messages(batch)
+            if self._stopping and self._queue.empty():
+                return
+
+    def stats(self):
+        return {
+            "sent": self.sent,
+            "spilled": self.spilled,
+            "dropped": self._spill.dropped if self._spill else 0,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "connections": self.pool.connected(),
+            "connect_failures": self.pool.failures
+        }
+
+    def close(self):
+        if self._pid == os.getpid():
+            self._stopping = True
+            for _ in self._threads:
+                try:
+                    self._queue.put(None, timeout=self.close_timeout)
+                except queue.Full:
+                    break
+            deadline = time.monotonic() + self.close_timeout
+            for thread in self._threads:
+                thread.join(max(0.0, deadline - time.monotonic()))
+            # Lo que no se llegó a enviar queda en disco para el próximo arranque
+            leftover = []
+            while True:
+                try:
+                    message = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if message is not None:
+                    leftover.append(message)
+            if leftover:
+                self._spill_messages(leftover)
+            self._spill.close()
+            self.pool.close()
+            self._pid = None
+        super().close()
+
+
+def get_sink_stats():
+    """Estadísticas de cada sink del proceso, por nombre de handler"""
+    return {handler.get_name() or handler.url: handler.stats() for handler in list(_sink_handlers)}
+
+
+class _ListenerStreamHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.server.connections.add(self.request)
+
+    def finish(self):
+        self.server.connections.discard(self.request)
+        super().finish()
+
+    def handle(self):
+        read = self.rfile.read
+        while True:
+            if self.server.framing == 'octet':
+                # RFC 6587: "<largo> <mensaje>"
+                length = b''
+                while True:
+                    char = read(1)
+                    if not char:
+                        return
+                    if char == b' ':
+                        break
+                    length += char
+                message = read(int(length))
+            else:
+                line = self.rfile.readline()
+                if not line:
+                    return
+                message = line.rstrip(b'\n')
+            self.server.received(message)
+
+
+class _ListenerDatagramHandler(socketserver.DatagramRequestHandler):
+    def handle(self):
+        self.server.received(self.rfile.read().rstrip(b'\n'))
+
+
+# Subclases propias: fijar los atributos en las clases de socketserver cambiaría a todos
+# los servidores del proceso
+class _TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class _UnixStreamServer(socketserver.ThreadingUnixStreamServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class _UDPServer(socketserver.UDPServer):
+    allow_reuse_address = True
+
+
+class SinkListener:
+    """
+    Colector de prueba (sustituto local de Wazuh/rsyslog): acepta el mismo URL que
+    LogSinkHandler y llama a on_message(bytes) con cada mensaje recibido
+    """
+
+    def __init__(self, url, on_message):
+        sink = parse_sink_url(url)
+        transport, address = sink["transport"], sink["address"]
+        if transport == 'unix':
+            if os.path.exists(address):
+                os.remove(address)
+            server_class, handler = _UnixStreamServer, _ListenerStreamHandler
+        elif transport == 'udp':
+            server_class, handler = _UDPServer, _ListenerDatagramHandler
+        else:
+            server_class, handler = _TCPServer, _ListenerStreamHandler
+        self.server = server_class(address, handler)
+        self.server.framing = sink["framing"]
+        self.server.connections = set()
+        self.server.received = on_message
+        self.address = self.server.server_address
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='sink-listener', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Cierra también las conexiones abiertas, como un colector que se cae"""
+        self.server.shutdown()
+        self.server.server_close()
+        for connection in list(self.server.connections):
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if isinstance(self.address, str):
+            try:
+                os.remove(self.address)
+            except OSError:
+                pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Colector de prueba para los sinks de logs (imprime cada mensaje)")
+    parser.add_argument('--listen', required=True, help="tcp://127.0.0.1:5514, udp://... o unix:///tmp/sink.sock")
+    args = parser.parse_args(argv)
+
+    out = sys.stdout.buffer
+    lock = threading.Lock()
+
+    def on_message(message):
+        with lock:
+            out.write(message + b'\n')
+            out.flush()
+
+    listener = SinkListener(args.listen, on_message).start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,98 +1,325 @@
 import logging
 import logging.config
 import os
-from pythonjsonlogger import jsonlogger
+from config.log_pipeline import AsyncLogPipeline
+from config.log_filters import SamplingFilter, parse_sample_rates
+from config.log_archive import LogArchiver, attach_archiver, archive_dir_for
+from config.log_server import LOG_MULTIPROCESS, LOG_SERVER_SOCKET
+from config.log_profiling import PROFILING_ENABLED, instrument_loggers, uninstrument_loggers
+from config.log_sinks import LOG_SINKS, LOG_SINK_SPILL_DIR, parse_sinks
+from config.log_routing import LOG_ROUTING_FILE, EventRouter, RoutingHandler, destination_handlers, load_routing_table
 
-def get_logging_config():
+# Directorio de los archivos y handlers a usar: "file" (archivos rotados),
+# "memory" (InMemoryHandler, sin tocar el disco) y/o "console"
+LOG_DIR = os.environ.get('LOG_DIR', 'logs')
+LOG_HANDLERS = os.environ.get('LOG_HANDLERS', 'file,console')
+LOG_HANDLER_KINDS = ('file', 'memory', 'console')
+
+# Registros que conserva en memoria el ring buffer de cada logger (/api/logs/recent)
+LOG_RECENT_CAPACITY = int(os.environ.get('LOG_RECENT_CAPACITY', '1000'))
+
+# Modo asíncrono (opt-in): los loggers solo encolan registros y
+# los hilos escritores se encargan del formateo y la escritura
+LOG_ASYNC = os.environ.get('LOG_ASYNC', '0') == '1'
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+LOG_QUEUE_OVERFLOW = os.environ.get('LOG_QUEUE_OVERFLOW', 'block')
+LOG_QUEUE_WORKERS = int(os.environ.get('LOG_QUEUE_WORKERS', '1'))
+
+# Escritura agrupada de los archivos JSON (LOG_BUFFERED=0 vuelve a un write por registro)
+LOG_BUFFERED = os.environ.get('LOG_BUFFERED', '1') == '1'
+LOG_FLUSH_INTERVAL = float(os.environ.get('LOG_FLUSH_INTERVAL', '0.05'))
+LOG_FLUSH_BYTES = int(os.environ.get('LOG_FLUSH_BYTES', '65536'))
+
+# Serialización JSON con orjson (si está instalado); la salida pasa a ser JSON compacto
+LOG_ORJSON = os.environ.get('LOG_ORJSON', '0') == '1'
+
+# Muestreo de eventos INFO de alto volumen: "api_request=10,api_response=10,health_check=100"
+# conserva 1 de cada N registros de ese event_type (vacío = sin muestreo)
+LOG_SAMPLE_RATES = parse_sample_rates(os.environ.get('LOG_SAMPLE_RATES', ''))
+LOG_SAMPLE_SUMMARY_INTERVAL = float(os.environ.get('LOG_SAMPLE_SUMMARY_INTERVAL', '60'))
+
+# Archivado de segmentos rotados: en vez de backups .1-.5 se comprimen a logs/archive
+# con retención por antigüedad/tamaño (ver config/log_archive.py)
+LOG_ARCHIVE = os.environ.get('LOG_ARCHIVE', '0') == '1'
+
+_pipeline = None
+_sampling_filter = None
+_archiver = None
+_router = None
+_handlers = {}
+
+def parse_handler_kinds(handlers):
+    """"file,console" (o una lista) -> tupla de tipos de handler válidos"""
+    if isinstance(handlers, str):
+        handlers = [kind.strip() for kind in handlers.split(',') if kind.strip()]
+    for kind in handlers:
+        if kind not in LOG_HANDLER_KINDS:
+            raise ValueError(f"Tipo de handler inválido: {kind} (opciones: {', '.join(LOG_HANDLER_KINDS)})")
+    return tuple(handlers)
+
+def get_logging_config(log_server=None, log_dir=LOG_DIR, handlers=LOG_HANDLERS, sinks=LOG_SINKS):
     """
     Configuración detallada de logging para el microservicio
     Genera logs en formato JSON optimizado para Wazuh
+    Con log_server (ruta del socket) los loggers envían los registros al proceso escritor
+    handlers elige los destinos ("file", "memory", "console"); los archivos se abren
+    recién con el primer registro (delay). El ring buffer "recent" está siempre activo
+    sinks agrega destinos de red (config/log_sinks.py) que reciben lo mismo que api_all
+    Los loggers de la API reciben todos los handlers como candidatos: qué registro va a
+    cuál lo decide la tabla de ruteo (config/log_routing.py) que instala setup_custom_loggers
     """
+    kinds = parse_handler_kinds(handlers)
+    sink_names = []
+    
+    if LOG_BUFFERED:
+        file_handler = {
+            'class': 'config.log_handlers.BufferedRotatingFileHandler',
+            'flush_interval': LOG_FLUSH_INTERVAL,
+            'flush_bytes': LOG_FLUSH_BYTES
+        }
+    else:
+        file_handler = {'class': 'logging.handlers.RotatingFileHandler'}
+    
+    # Archivos: all (todo), errors (WARNING+) y security
+    destinations = {
+        'all': 'INFO',
+        'errors': 'WARNING',
+        'security': 'INFO'
+    }
+    config_handlers = {}
+    for destination, level in destinations.items():
+        if 'file' in kinds:
+            config_handlers[f'file_{destination}'] = {
+                'level': level,
+                **file_handler,
+                'filename': os.path.join(log_dir, f'api_{destination}.log'),
+                'maxBytes': 10485760,  # 10MB
+                'backupCount': 5,
+                'delay': True,
+                'formatter': 'json'
+            }
+        if 'memory' in kinds:
+            config_handlers[f'memory_{destination}'] = {
+                'level': level,
+                'class': 'config.log_handlers.InMemoryHandler',
+                'formatter': 'json'
+            }
+    if 'console' in kinds:
+        config_handlers['console'] = {
+            'level': 'INFO',
+            'class': 'logging.StreamHandler',
+            'formatter': 'standard'
+        }
+    
+    for name, url in parse_sinks(sinks):
+        config_handlers[name] = {
+            'level': 'INFO',
+            'class': 'config.log_sinks.LogSinkHandler',
+            'url': url,
+            'spill_dir': LOG_SINK_SPILL_DIR,
+            'formatter': 'json'
+        }
+        sink_names.append(name)
+    
+    # Siempre activo: últimos registros estructurados de cada logger, sin formatear
+    config_handlers['recent'] = {
+        'level': 'INFO',
+        'class': 'config.log_handlers.RecentRecordsHandler',
+        'capacity': LOG_RECENT_CAPACITY
+    }
+    
+    def targets(*names):
+        return [name for name in names if name in config_handlers]
     
-    # Asegurar que el directorio de logs existe
-    log_dir = "logs"
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir)
+    if 'file' in kinds:
+        # Asegurar que el directorio de logs existe
+        os.makedirs(log_dir, exist_ok=True)
     
     config = {
         'version': 1,
         'disable_existing_loggers': False,
         'formatters': {
             'json': {
-                '()': 'pythonjsonlogger.jsonlogger.JsonFormatter',
+                '()': 'config.log_formatters.FastJsonFormatter',
                 'format': '%(asctime)s %(name)s %(levelname)s %(pathname)s %(lineno)d %(message)s',
-                'datefmt': '%Y-%m-%d %H:%M:%S'
+                'datefmt': '%Y-%m-%d %H:%M:%S',
+                'use_orjson': LOG_ORJSON
             },
             'standard': {
                 'format': '%(asctime)s [%(levelname)s] %(name)s: %(message)s',
                 'datefmt': '%Y-%m-%d %H:%M:%S'
             }
         },
-        'handlers': {
-            'file_all': {
-                'level': 'INFO',
-                'class': 'logging.handlers.RotatingFileHandler',
-                'filename': f'{log_dir}/api_all.log',
-                'maxBytes': 10485760,  # 10MB
-                'backupCount': 5,
-                'formatter': 'json'
-            },
-            'file_errors': {
-                'level': 'WARNING',
-                'class': 'logging.handlers.RotatingFileHandler',
-                'filename': f'{log_dir}/api_errors.log',
-                'maxBytes': 10485760,  # 10MB
-                'backupCount': 5,
-                'formatter': 'json'
-            },
-            'file_security': {
-                'level': 'INFO',
-                'class': 'logging.handlers.RotatingFileHandler',
-                'filename': f'{log_dir}/api_security.log',
-                'maxBytes': 10485760,  # 10MB
-                'backupCount': 5,
-                'formatter': 'json'
-            },
-            'console': {
-                'level': 'INFO',
-                'class': 'logging.StreamHandler',
-                'formatter': 'standard'
-            }
-        },
+        'handlers': config_handlers,
         'loggers': {
             'api_microservice': {
-                'handlers': ['file_all', 'console'],
+                'handlers': list(config_handlers),
                 'level': 'INFO',
                 'propagate': False
             },
             'security': {
-                'handlers': ['file_security', 'file_all'],
+                'handlers': list(config_handlers),
                 'level': 'INFO',
                 'propagate': False
             },
             'errors': {
-                'handlers': ['file_errors', 'file_all'],
+                'handlers': list(config_handlers),
                 'level': 'WARNING',
                 'propagate': False
             }
         },
         'root': {
             'level': 'INFO',
-            'handlers': ['file_all', 'console']
+            'handlers': targets('file_all', 'memory_all', 'console', *sink_names)
         }
     }
     
+    if log_server:
+        # Worker en modo multiproceso: no abre archivos, todo va al proceso escritor
+        config['handlers'] = {
+            'log_server': {
+                'level': 'INFO',
+                'class': 'config.log_server.LogShipHandler',
+                'address': log_server
+            },
+            'recent': config_handlers['recent']
+        }
+        for logger_config in config['loggers'].values():
+            logger_config['handlers'] = ['log_server', 'recent']
+        config['root']['handlers'] = ['log_server']
+    
     return config
 
-def setup_custom_loggers():
+def setup_custom_loggers(async_mode=None, sample_rates=None, archive=None, multiprocess=None, profiling=None,
+                         log_dir=None, handlers=None, archive_dir=None, sinks=None, routing_file=None,
+                         overflow=None):
     """
     Configura loggers específicos para diferentes tipos de eventos
+    Con async_mode (o LOG_ASYNC=1) los loggers escriben a través de una cola acotada
+    Con sample_rates (o LOG_SAMPLE_RATES) se muestrean los eventos INFO indicados
+    Con archive (o LOG_ARCHIVE=1) los segmentos rotados se comprimen y archivan
+    Con multiprocess (o LOG_MULTIPROCESS=1) los registros se envían al proceso escritor
+    (config/log_server.py), que es el único que abre y rota los archivos
+    Con profiling (o PROFILING_ENABLED=1) se cronometran los loggers, handlers y formatters
+    log_dir, handlers, archive_dir y sinks reemplazan a LOG_DIR, LOG_HANDLERS, LOG_ARCHIVE_DIR y LOG_SINKS
+    (sin archive_dir ni LOG_ARCHIVE_DIR se archiva en <log_dir>/archive)
+    (en modo multiproceso los sinks los usa solo el proceso escritor)
+    routing_file reemplaza a LOG_ROUTING_FILE: la tabla que decide a qué destinos va cada event_type
+    overflow reemplaza a LOG_QUEUE_OVERFLOW (política de desborde de la cola asíncrona)
     """
-    logging.config.dictConfig(get_logging_config())
+    global _pipeline, _sampling_filter, _archiver, _router, _handlers
+    
+    if _pipeline is not None:
+        _pipeline.stop()
+        _pipeline = None
+    
+    if multiprocess is None:
+        multiprocess = LOG_MULTIPROCESS
+    
+    routing_table = load_routing_table(routing_file or LOG_ROUTING_FILE)
+    logging.config.dictConfig(get_logging_config(
+        LOG_SERVER_SOCKET if multiprocess else None,
+        log_dir=log_dir or LOG_DIR,
+        handlers=handlers if handlers is not None else LOG_HANDLERS,
+        sinks=sinks if sinks is not None else LOG_SINKS
+    ))
     
     # Loggers específicos
     api_logger = logging.getLogger('api_microservice')
     security_logger = logging.getLogger('security')
     error_logger = logging.getLogger('errors')
     
-    return api_logger, security_logger, error_logger
\ No newline at end of file
+    _handlers = {
+        handler.get_name(): handler
+        for logger in (api_logger, security_logger, error_logger, logging.getLogger())
+        for handler in logger.handlers
+    }
+    
+    if _sampling_filter is not None:
+        for logger in (api_logger, security_logger, error_logger):
+            logger.removeFilter(_sampling_filter)
+        _sampling_filter = None
+    
+    if sample_rates is None:
+        sample_rates = LOG_SAMPLE_RATES
+    
+    if sample_rates:
+        # Filtro a nivel de logger: lo descartado no se formatea ni se encola
+        _sampling_filter = SamplingFilter(sample_rates, summary_interval=LOG_SAMPLE_SUMMARY_INTERVAL)
+        for logger in (api_logger, security_logger, error_logger):
+            logger.addFilter(_sampling_filter)
+    
+    if _archiver is not None:
+        _archiver.stop()
+        _archiver = None
+    
+    if archive is None:
+        archive = LOG_ARCHIVE
+    
+    if archive and not multiprocess:
+        # En modo multiproceso archiva el proceso escritor
+        _archiver = LogArchiver(archive_dir or archive_dir_for(log_dir or LOG_DIR)).start()
+        attach_archiver(_archiver, [api_logger, security_logger, error_logger])
+    
+    loggers = [api_logger, security_logger, error_logger, logging.getLogger()]
+    uninstrument_loggers(loggers)
+    if profiling is None:
+        profiling = PROFILING_ENABLED
+    
+    if profiling:
+        # Antes del pipeline: los handlers instrumentados pasan a los hilos escritores
+        instrument_loggers(loggers)
+    
+    # Después de archivar e instrumentar (necesitan los handlers reales): cada logger de la
+    # API queda con un único handler que despacha según la tabla compilada
+    _router = EventRouter(
+        routing_table,
+        destination_handlers(_handlers),
+        loggers=[logger.name for logger in (api_logger, security_logger, error_logger)]
+    )
+    routing_handler = RoutingHandler(_router)
+    for logger in (api_logger, security_logger, error_logger):
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        logger.addHandler(routing_handler)
+    
+    if async_mode is None:
+        async_mode = LOG_ASYNC
+    
+    if async_mode:
+        _pipeline = AsyncLogPipeline(
+            [api_logger, security_logger, error_logger],
+            maxsize=LOG_QUEUE_SIZE,
+            overflow=overflow or LOG_QUEUE_OVERFLOW,
+            workers=LOG_QUEUE_WORKERS
+        ).start()
+    
+    return api_logger, security_logger, error_logger
+
+def get_log_pipeline():
+    """
+    Devuelve el pipeline asíncrono activo, o None en modo síncrono
+    """
+    return _pipeline
+
+def get_sampling_filter():
+    """
+    Devuelve el filtro de muestreo activo, o None si no hay muestreo
+    """
+    return _sampling_filter
+
+def get_log_archiver():
+    """
+    Devuelve el archivador de segmentos activo, o None si no está habilitado
+    """
+    return _archiver
+
+def get_event_router():
+    """
+    Devuelve la tabla de ruteo compilada, o None si todavía no se configuró el logging
+    """
+    return _router
+
+def get_recent_records():
+    """Ring buffer de los últimos registros de los loggers (o None si no se configuró el logging)"""
+    return _handlers.get('recent')
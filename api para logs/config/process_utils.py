@@ -0,0 +1,15 @@
+import os
+
+
+def pid_alive(pid):
+    """True si existe un proceso con ese PID (segmentos y spill de workers que ya terminaron)"""
+    if os.name != 'posix':
+        # En Windows os.kill(pid, 0) termina el proceso: se asume vivo
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
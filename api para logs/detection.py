@@ -0,0 +1,182 @@
+import collections
+import logging
+import os
+import threading
+import time
+from request_context import RequestContextAdapter
+
+# Umbrales del detector; por defecto replican las reglas de Wazuh
+# 100010 (5 fallos de login en 300 s) y 100014 (100 requests en 60 s por IP)
+DETECT_ENABLED = os.environ.get('DETECT_ENABLED', '1') == '1'
+DETECT_LOGIN_FAILURES = int(os.environ.get('DETECT_LOGIN_FAILURES', '5'))
+DETECT_LOGIN_WINDOW = float(os.environ.get('DETECT_LOGIN_WINDOW', '300'))
+DETECT_REQUEST_FLOOD = int(os.environ.get('DETECT_REQUEST_FLOOD', '100'))
+DETECT_REQUEST_WINDOW = float(os.environ.get('DETECT_REQUEST_WINDOW', '60'))
+DETECT_MAX_KEYS = int(os.environ.get('DETECT_MAX_KEYS', '10000'))
+# Durante una alerta activa, omitir los logs de fallo redundantes de esa clave
+DETECT_SUPPRESS_FAILURES = os.environ.get('DETECT_SUPPRESS_FAILURES', '0') == '1'
+
+alert_log = RequestContextAdapter(logging.getLogger('security'), ('request_id',), timestamp=True)
+
+
+class _WindowState:
+    """Contadores de una clave: un anillo de buckets más el estado de la alerta"""
+
+    __slots__ = ('counts', 'epochs', 'alert_until', 'suppressed')
+
+    def __init__(self, buckets):
+        self.counts = [0] * buckets
+        self.epochs = [-1] * buckets
+        self.alert_until = 0.0
+        self.suppressed = 0
+
+
+class SlidingWindowCounter:
+    """
+    Cuenta eventos por clave en una ventana deslizante aproximada.
+    La ventana se divide en un anillo de buckets (memoria fija por clave) y
+    las claves se acotan a max_keys descartando la usada hace más tiempo.
+    """
+
+    def __init__(self, threshold, window, buckets=20, max_keys=DETECT_MAX_KEYS):
+        self.threshold = threshold
+        self.window = window
+        self.buckets = buckets
+        self.bucket_width = window / buckets
+        self.max_keys = max_keys
+        self._states = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, now=None):
+        """
+        Registra un evento de la clave. Devuelve (estado, conteo en la ventana, alertar);
+        alertar es True solo la primera vez que se supera el umbral en cada ventana.
+        """
+        if now is None:
+            now = time.monotonic()
+        epoch = int(now / self.bucket_width)
+        slot = epoch % self.buckets
+
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                state = self._states[key] = _WindowState(self.buckets)
+                if len(self._states) > self.max_keys:
+                    self._states.popitem(last=False)
+            else:
+                self._states.move_to_end(key)
+
+            if state.epochs[slot] != epoch:
+                state.epochs[slot] = epoch
+                state.counts[slot] = 0
+            state.counts[slot] += 1
+
+            oldest = epoch - self.buckets
+            count = 0
+            for bucket_epoch, bucket_count in zip(state.epochs, state.counts):
+                if bucket_epoch > oldest:
+                    count += bucket_count
+
+            alert = count >= self.threshold and now >= state.alert_until
+            if alert:
+                state.alert_until = now + self.window
+            return state, count, alert
+
+    def __len__(self):
+        return len(self._states)
+
+
+class SecurityDetector:
+    """
+    Detector en proceso de fuerza bruta e inundación de requests.
+    Lo alimentan los mismos eventos que se loguean; al superar un umbral emite
+    un único registro agregado con security_alert en el logger de seguridad.
+    """
+
+    def __init__(self, login_failures=DETECT_LOGIN_FAILURES, login_window=DETECT_LOGIN_WINDOW,
+                 request_flood=DETECT_REQUEST_FLOOD, request_window=DETECT_REQUEST_WINDOW,
+                 max_keys=DETECT_MAX_KEYS, suppress_failures=DETECT_SUPPRESS_FAILURES):
+        self.failures_by_user = SlidingWindowCounter(login_failures, login_window, max_keys=max_keys)
+        self.failures_by_ip = SlidingWindowCounter(login_failures, login_window, max_keys=max_keys)
+        self.requests_by_ip = SlidingWindowCounter(request_flood, request_window, max_keys=max_keys)
+        self.suppress_failures = suppress_failures
+        self.alerts = collections.Counter()
+        self.suppressed = 0
+        self._lock = threading.Lock()
+
+    def observe_login_failure(self, username, source_ip, now=None):
+        """
+        Registra un login fallido. Devuelve True si el log individual del fallo
+        puede omitirse porque ya hay una alerta activa para esa clave.
+        """
+        if now is None:
+            now = time.monotonic()
+        states = []
+        redundant = True
+
+        for alert_type, counter, field, key in (
+            ('brute_force_user', self.failures_by_user, 'username', username),
+            ('brute_force_ip', self.failures_by_ip, 'source_ip', source_ip)
+        ):
+            if key is None:
+                redundant = False
+                continue
+            state, count, alert = counter.hit(key, now)
+            states.append(state)
+            if alert:
+                self._emit_alert(alert_type, counter, field, key, count, state, "100010")
+                redundant = False
+            elif count <= counter.threshold or now >= state.alert_until:
+                redundant = False
+
+        if redundant and self.suppress_failures:
+            # Se informa en la próxima alerta de cada clave
+            with self._lock:
+                for state in states:
+                    state.suppressed += 1
+                self.suppressed += 1
+            return True
+        return False
+
+    def observe_request(self, source_ip, now=None):
+        """Registra un request entrante de source_ip"""
+        if source_ip is None:
+            return
+        state, count, alert = self.requests_by_ip.hit(source_ip, now)
+        if alert:
+            self._emit_alert('request_flood', self.requests_by_ip, 'source_ip', source_ip, count, state, "100014")
+
+    def _emit_alert(self, alert_type, counter, field, key, count, state, mirrors_rule):
+        with self._lock:
+            self.alerts[alert_type] += 1
+            suppressed = state.suppressed
+            state.suppressed = 0
+        extra = {
+            "event_type": "security_alert",
+            "alert_type": alert_type,
+            field: key,
+            "event_count": count,
+            "threshold": counter.threshold,
+            "window_seconds": counter.window,
+            "mirrors_rule": mirrors_rule,
+            "suppressed_events": suppressed,
+            "security_alert": True
+        }
+        message = "Request flood detected" if alert_type == 'request_flood' else "Brute force attack detected"
+        alert_log.error(message, extra=extra)
+
+    def stats(self):
+        """Alertas emitidas, logs omitidos y claves en seguimiento"""
+        return {
+            "alerts": dict(self.alerts),
+            "suppressed_failures": self.suppressed,
+            "tracked_keys": {
+                "failures_by_user": len(self.failures_by_user),
+                "failures_by_ip": len(self.failures_by_ip),
+                "requests_by_ip": len(self.requests_by_ip)
+            }
+        }
+
+
+# Detector compartido por el proceso
+detector = SecurityDetector() if DETECT_ENABLED else None
@@ -0,0 +1,192 @@
+import logging
+import uuid
+from datetime import datetime
+from request_context import RequestContextAdapter, current_context
+from detection import detector
+from config.logging_config import get_event_router
+
+# Loggers específicos
+api_logger = logging.getLogger('api_microservice')
+security_logger = logging.getLogger('security')
+error_logger = logging.getLogger('errors')
+
+# Adapters que completan request_id, source_ip, user_agent y timestamp
+# desde el contexto del request (armado una vez en log_request_info)
+auth_log = RequestContextAdapter(security_logger, ('request_id', 'source_ip', 'user_agent'), timestamp=True)
+user_log = RequestContextAdapter(api_logger, ('request_id', 'source_ip'), timestamp=True)
+api_log = RequestContextAdapter(api_logger, ('request_id',), timestamp=True)
+error_log = RequestContextAdapter(error_logger, ('request_id',), timestamp=True)
+
+# Escenario de login -> (nivel, mensaje, status)
+LOGIN_SCENARIOS = {
+    'success': (logging.INFO, "User login successful", "success"),
+    'invalid_password': (logging.WARNING, "Invalid password attempt", "failed"),
+    'user_not_found': (logging.WARNING, "Login attempt for non-existent user", "failed"),
+    'account_locked': (logging.ERROR, "Login attempt on locked account", "blocked")
+}
+
+SYSTEM_ERRORS = {
+    "database_connection_failed": "Database connection timeout",
+    "memory_limit_exceeded": "Memory usage exceeded 90%",
+    "external_service_unavailable": "External API service unreachable",
+    "disk_space_low": "Disk space below 5%"
+}
+
+SYSTEM_WARNINGS = {
+    "high_cpu_usage": "CPU usage above 80%",
+    "slow_response_time": "Response time above 2 seconds",
+    "cache_miss_rate_high": "Cache miss rate above 50%",
+    "connection_pool_low": "Connection pool usage above 85%"
+}
+
+
+def _routed(logger, level, event_type):
+    """Falso si la tabla de ruteo no manda el evento a ningún destino: ni se arma el registro"""
+    router = get_event_router()
+    return router is None or bool(router.targets(logger.name, event_type, level))
+
+
+def log_login_attempt(username, scenario, **fields):
+    """
+    Log de un intento de login. Devuelve el session_id si fue exitoso.
+    fields permite fijar request_id, source_ip, user_agent o timestamp
+    (por ejemplo al reenviar eventos por lote); si no, salen del contexto.
+    """
+    level, message, status = LOGIN_SCENARIOS[scenario]
+    extra = {
+        "event_type": "user_authentication",
+        "action": "login",
+        "status": status
+    }
+    if scenario != 'success':
+        extra["failure_reason"] = scenario
+    extra["username"] = username
+    extra.update(fields)
+
+    if status == 'failed' and detector is not None:
+        # Mismo criterio que la regla 100010: fallos por usuario (y por IP)
+        source_ip = fields.get('source_ip')
+        if source_ip is None:
+            context = current_context()
+            source_ip = context.source_ip if context is not None else None
+        if detector.observe_login_failure(username, source_ip):
+            return None
+
+    session_id = None
+    if scenario == 'success':
+        session_id = str(uuid.uuid4())
+        extra["session_id"] = session_id
+    elif scenario == 'account_locked':
+        extra["security_alert"] = True
+
+    if _routed(security_logger, level, "user_authentication"):
+        auth_log.log(level, message, extra=extra)
+    return session_id
+
+
+def log_user_registration(username, email, **fields):
+    """Log de un registro de usuario. Devuelve el user_id generado"""
+    user_id = str(uuid.uuid4())
+    if not _routed(api_logger, logging.INFO, "user_management"):
+        return user_id
+    extra = {
+        "event_type": "user_management",
+        "action": "register",
+        "status": "success",
+        "username": username,
+        "email": email
+    }
+    extra.update(fields)
+    extra["user_id"] = user_id
+
+    user_log.info("User registration", extra=extra)
+    return user_id
+
+
+def log_system_error(error_type, error_message=None, **fields):
+    """Log de un error del sistema"""
+    if not _routed(error_logger, logging.ERROR, "system_error"):
+        return
+    extra = {
+        "event_type": "system_error",
+        "error_type": error_type,
+        "error_message": error_message or SYSTEM_ERRORS[error_type],
+        "severity": "high",
+        "component": "system"
+    }
+    extra.update(fields)
+
+    error_log.error("System error triggered", extra=extra)
+
+
+def log_system_warning(warning_type, warning_message=None, **fields):
+    """Log de un warning del sistema"""
+    if not _routed(api_logger, logging.WARNING, "system_warning"):
+        return
+    extra = {
+        "event_type": "system_warning",
+        "warning_type": warning_type,
+        "warning_message": warning_message or SYSTEM_WARNINGS[warning_type],
+        "severity": "medium",
+        "component": "system"
+    }
+    extra.update(fields)
+
+    api_log.warning("System warning triggered", extra=extra)
+
+
+def log_processing_result(result, data_size, job_id=None):
+    """Log del resultado de un lote procesado (síncrono o asíncrono)"""
+    if result["status"] == "success":
+        logger, level = api_logger, logging.INFO
+    else:
+        logger, level = error_logger, logging.WARNING
+    if not _routed(logger, level, "data_processing"):
+        return
+    extra = {
+        "event_type": "data_processing",
+        "action": "process",
+        "status": result["status"],
+        "processing_time_seconds": result["processing_time_seconds"],
+        "data_size": data_size
+    }
+    if job_id is not None:
+        extra["job_id"] = job_id
+
+    if result["status"] == "success":
+        extra["records_processed"] = result["records_processed"]
+        api_log.info("Data processing completed", extra=extra)
+    else:
+        extra["records_invalid"] = result["records_invalid"]
+        extra["error_reason"] = "data_validation_failed"
+        error_log.warning("Data processing failed", extra=extra)
+
+
+def log_api_request(context, method, endpoint, content_type):
+    """Log de cada request que llega a la API (servidor WSGI o ASGI)"""
+    if not _routed(api_logger, logging.INFO, "api_request"):
+        return
+    api_logger.info("Incoming request", extra={
+        "event_type": "api_request",
+        "request_id": context.request_id,
+        "method": method,
+        "endpoint": endpoint,
+        "remote_addr": context.source_ip,
+        "user_agent": context.user_agent,
+        "content_type": content_type,
+        "timestamp": datetime.now().isoformat()
+    })
+
+
+def log_api_response(context, status_code, content_length, duration_ms):
+    """Log de cada response que devuelve la API (servidor WSGI o ASGI)"""
+    if not _routed(api_logger, logging.INFO, "api_response"):
+        return
+    api_logger.info("Outgoing response", extra={
+        "event_type": "api_response",
+        "request_id": context.request_id if context else 'unknown',
+        "status_code": status_code,
+        "content_length": content_length,
+        "duration_ms": duration_ms,
+        "timestamp": datetime.now().isoformat()
+    })
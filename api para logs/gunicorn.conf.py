@@ -0,0 +1,47 @@
+"""
+Configuración de gunicorn con logging multiproceso.
+
+    gunicorn app:app
+
+Los workers no escriben los archivos de log: envían los registros por un socket Unix
+a un único proceso escritor (config/log_server.py) que el master lanza al arrancar.
+Así la rotación no compite entre procesos y Wazuh nunca lee JSON intercalado.
+"""
+import multiprocessing
+import os
+
+# Debe estar definido antes de que los workers importen app.py
+os.environ['LOG_MULTIPROCESS'] = '1'
+
+from config.log_server import start_log_server, stop_log_server
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', str(multiprocessing.cpu_count() * 2 + 1)))
+threads = int(os.environ.get('GUNICORN_THREADS', '1'))
+
+# El logging se configura en cada worker con su primer request (app.configure_logging),
+# así que precargar la app en el master no comparte archivos ni conexiones entre workers
+preload_app = os.environ.get('GUNICORN_PRELOAD', '0') == '1'
+
+_log_server = None
+
+
+def on_starting(server):
+    global _log_server
+    _log_server = start_log_server()
+    server.log.info("Log writer started (pid %s)", _log_server.pid)
+
+
+def on_exit(server):
+    # Los workers ya terminaron: el escritor vacía lo recibido y cierra los archivos
+    stop_log_server(_log_server)
+
+
+def worker_exit(server, worker):
+    # Vaciar la cola asíncrona y enviar lo pendiente antes de que el worker termine
+    import logging
+    from config.logging_config import get_log_pipeline
+    pipeline = get_log_pipeline()
+    if pipeline is not None:
+        pipeline.stop()
+    logging.shutdown()
@@ -0,0 +1,266 @@
+import json
+import os
+import sqlite3
+import threading
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson es opcional
+    orjson = None
+
+LOG_DIR = os.environ.get('LOG_DIR', 'logs')
+LOG_INDEX_PATH = os.environ.get('LOG_INDEX_PATH', os.path.join(LOG_DIR, 'log_index.sqlite3'))
+
+# Archivos indexados (sin extensión) y backups de RotatingFileHandler (backupCount)
+INDEXED_LOGS = ('api_all', 'api_errors', 'api_security')
+LOG_BACKUPS = 5
+
+# Campos por los que se puede filtrar una búsqueda
+INDEXED_FIELDS = ('request_id', 'username', 'source_ip', 'event_type', 'levelname', 'logger')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    inode INTEGER PRIMARY KEY,
+    log_name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    indexed_bytes INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    inode INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    log TEXT NOT NULL,
+    asctime TEXT,
+    logger TEXT,
+    levelname TEXT,
+    event_type TEXT,
+    request_id TEXT,
+    username TEXT,
+    source_ip TEXT
+);
+CREATE INDEX IF NOT EXISTS entries_time ON entries (log, asctime);
+CREATE INDEX IF NOT EXISTS entries_inode ON entries (inode);
+CREATE INDEX IF NOT EXISTS entries_request_id ON entries (request_id) WHERE request_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS entries_username ON entries (username) WHERE username IS NOT NULL;
+CREATE INDEX IF NOT EXISTS entries_source_ip ON entries (source_ip) WHERE source_ip IS NOT NULL;
+CREATE INDEX IF NOT EXISTS entries_event_type ON entries (event_type, asctime);
+"""
+
+
+def _loads(line):
+    if orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line)
+
+
+def _backup_number(path):
+    """0 para el archivo actual, N para el backup .N"""
+    suffix = path.rsplit('.', 1)[-1]
+    return int(suffix) if suffix.isdigit() else 0
+
+
+def _field(entry, name):
+    value = entry.get(name)
+    return value if isinstance(value, str) else None
+
+
+class LogIndex:
+    """
+    Índice en disco (SQLite) de los logs JSON, incluidos los backups rotados.
+    Guarda por cada línea los campos de búsqueda y su posición (inode + offset),
+    de modo que una búsqueda lee solo las líneas que coinciden.
+    Los archivos se identifican por inode: al rotar cambia el nombre pero no el
+    inode, así que lo ya indexado se conserva y solo se indexa lo nuevo.
+    """
+
+    def __init__(self, log_dir=LOG_DIR, db_path=LOG_INDEX_PATH, logs=INDEXED_LOGS, backups=LOG_BACKUPS):
+        self.log_dir = log_dir
+        self.db_path = db_path
+        self.logs = tuple(logs)
+        self.backups = backups
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        with self._lock:
+            self._connection().executescript(_SCHEMA)
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+            connection = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def _log_files(self):
+        """(log, path, stat) de cada archivo existente, del backup más antiguo al actual"""
+        files = []
+        for log in self.logs:
+            base = os.path.join(self.log_dir, f'{log}.log')
+            for i in range(self.backups, -1, -1):
+                path = f'{base}.{i}' if i else base
+                try:
+                    files.append((log, path, os.stat(path)))
+                except FileNotFoundError:
+                    continue
+        return files
+
+    def refresh(self):
+        """Indexa incrementalmente lo escrito desde la última llamada. Devuelve las líneas nuevas"""
+        with self._lock:
+            db = self._connection()
+            # Serializa el refresh entre procesos que comparten el índice
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                added = self._refresh(db)
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+            db.execute('COMMIT')
+            return added
+
+    def _refresh(self, db):
+        known = {inode: (log, path, indexed) for inode, log, path, indexed in
+                 db.execute('SELECT inode, log_name, path, indexed_bytes FROM files')}
+        present = set()
+        added = 0
+
+        for log, path, stat in self._log_files():
+            inode = stat.st_ino
+            present.add(inode)
+            previous = known.get(inode)
+            start = 0
+            if previous is not None:
+                previous_log, previous_path, start = previous
+                # La rotación solo mueve un archivo hacia backups más viejos del mismo log;
+                # si el inode aparece en otra posición es un archivo distinto
+                reused = previous_log != log or _backup_number(path) < _backup_number(previous_path)
+                if reused or stat.st_size < start:
+                    # Archivo truncado o inode reutilizado: reindexar desde cero
+                    db.execute('DELETE FROM entries WHERE inode = ?', (inode,))
+                    start = 0
+
+            if previous is None or start == 0 or stat.st_size > start or previous[1] != path:
+                indexed = start
+                if stat.st_size > start:
+                    indexed, count = self._index_file(db, log, path, inode, start)
+                    added += count
+                db.execute(
+                    'INSERT INTO files (inode, log_name, path, indexed_bytes) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT(inode) DO UPDATE SET log_name = excluded.log_name, path = excluded.path, '
+                    'indexed_bytes = excluded.indexed_bytes',
+                    (inode, log, path, indexed)
+                )
+
+        # Backups que la rotación ya borró
+        for inode in set(known) - present:
+            db.execute('DELETE FROM entries WHERE inode = ?', (inode,))
+            db.execute('DELETE FROM files WHERE inode = ?', (inode,))
+
+        return added
+
+    def _index_file(self, db, log, path, inode, start):
+        rows = []
+        offset = start
+        with open(path, 'rb') as f:
+            f.seek(start)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # Línea todavía incompleta: se indexa en el próximo refresh
+                    break
+                try:
+                    entry = _loads(line)
+                except ValueError:
+                    entry = None
+                if isinstance(entry, dict):
+                    rows.append((
+                        inode, offset, log,
+                        _field(entry, 'asctime'),
+                        _field(entry, 'name'),
+                        _field(entry, 'levelname'),
+                        _field(entry, 'event_type'),
+                        _field(entry, 'request_id'),
+                        _field(entry, 'username'),
+                        _field(entry, 'source_ip') or _field(entry, 'remote_addr')
+                    ))
+                offset += len(line)
+
+        db.executemany(
+            'INSERT INTO entries (inode, offset, log, asctime, logger, levelname, event_type, '
+            'request_id, username, source_ip) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            rows
+        )
+        return offset, len(rows)
+
+    def search(self, log='api_all', since=None, until=None, page=1, per_page=100, **filters):
+        """
+        Busca registros por los campos indexados y rango de asctime
+        ("YYYY-MM-DD HH:MM:SS"), del más reciente al más antiguo.
+        Devuelve (registros, total).
+        """
+        self.refresh()
+
+        where = ['log = ?']
+        params = [log]
+        for field in INDEXED_FIELDS:
+            value = filters.get(field)
+            if value is not None:
+                where.append(f'{field} = ?')
+                params.append(value)
+        if since:
+            where.append('asctime >= ?')
+            params.append(since)
+        if until:
+            where.append('asctime <= ?')
+            params.append(until)
+        clause = ' AND '.join(where)
+
+        db = self._connection()
+        total = db.execute(f'SELECT COUNT(*) FROM entries WHERE {clause}', params).fetchone()[0]
+        rows = db.execute(
+            f'SELECT e.inode, e.offset, f.path FROM entries e JOIN files f ON f.inode = e.inode '
+            f'WHERE {clause} '
+            f'ORDER BY e.asctime DESC, e.id DESC LIMIT ? OFFSET ?',
+            params + [per_page, (page - 1) * per_page]
+        ).fetchall()
+        return self._read_lines(rows), total
+
+    def _read_lines(self, rows):
+        """Lee las líneas indicadas con seek, abriendo cada archivo una sola vez"""
+        by_file = {}
+        for position, (inode, offset, path) in enumerate(rows):
+            by_file.setdefault((inode, path), []).append((offset, position))
+
+        records = [None] * len(rows)
+        for (inode, path), offsets in by_file.items():
+            try:
+                f = open(path, 'rb')
+            except FileNotFoundError:
+                continue
+            with f:
+                # Si el archivo rotó entre el refresh y la lectura, el path ya es otro archivo
+                if os.fstat(f.fileno()).st_ino != inode:
+                    continue
+                for offset, position in sorted(offsets):
+                    f.seek(offset)
+                    records[position] = _loads(f.readline())
+
+        return [record for record in records if record is not None]
+
+
+_indexes = {}
+_index_lock = threading.Lock()
+
+
+def get_log_index(log_dir=LOG_DIR):
+    """Índice compartido por el proceso para ese directorio de logs (se crea al primer uso)"""
+    index = _indexes.get(log_dir)
+    if index is None:
+        with _index_lock:
+            index = _indexes.get(log_dir)
+            if index is None:
+                db_path = LOG_INDEX_PATH if log_dir == LOG_DIR else os.path.join(log_dir, 'log_index.sqlite3')
+                index = _indexes[log_dir] = LogIndex(log_dir, db_path)
+    return index
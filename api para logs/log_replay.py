@@ -0,0 +1,510 @@
+#!/usr/bin/env python3
+"""
+Re-análisis offline de los logs JSON (incluidos los backups rotados y los archivados)
+Vuelve a correr la detección sobre archivos históricos para ver cómo habrían
+disparado las reglas de Wazuh 100010 (fallos de login) y 100014 (requests por IP):
+
+- los archivos se parten en chunks que procesa un pool de procesos (orjson si está
+  instalado); cada chunk devuelve conteos por clave y segundo
+- el proceso principal combina los chunks en orden y evalúa ventanas deslizantes
+  exactas (resolución de 1 s, la de asctime), conservando solo los segundos que
+  todavía entran en alguna ventana: la memoria no depende del tamaño de los logs
+- además arma totales por nivel y event_type y la línea de tiempo de tipos de error
+
+Los archivos se leen del más viejo al más nuevo (.5 ... .1, actual). Los registros
+muestreados cuentan por su sample_rate.
+
+Uso: python log_replay.py [--log api_all] [--log-dir logs] [--archives] [--workers 4]
+     [--json reporte.json] [archivos ...]
+"""
+
+import argparse
+import calendar
+import collections
+import concurrent.futures
+import itertools
+import json
+import os
+import sys
+import time
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional
+    orjson = None
+
+from config.log_archive import LOG_ARCHIVE_DIR, archive_files, iter_lines, read_footer, report_unreadable_archive
+from detection import DETECT_LOGIN_FAILURES, DETECT_LOGIN_WINDOW, DETECT_REQUEST_FLOOD, DETECT_REQUEST_WINDOW
+from log_index import LOG_DIR, INDEXED_LOGS, LOG_BACKUPS
+
+REPLAY_CHUNK_BYTES = 32 * 1024 * 1024
+_READ_SIZE = 1024 * 1024
+# Desorden tolerado entre registros (hilos que escriben en paralelo, cola asíncrona)
+REPLAY_LATENESS = 120
+REPLAY_ERROR_INTERVAL = 3600
+REPLAY_TOP = 10
+REPLAY_MAX_ALERTS = 1000
+
+_ASCTIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+_FAILED_LOGIN = ('user_authentication', 'failed')
+_REQUEST = ('api_request', None)
+
+
+_loads = orjson.loads if orjson is not None else json.loads
+
+
+def _parse_asctime(asctime):
+    """"2025-09-21 23:49:07" -> segundos (se toma como UTC, solo importan las diferencias)"""
+    if len(asctime) != 19:
+        raise ValueError(asctime)
+    return calendar.timegm((int(asctime[0:4]), int(asctime[5:7]), int(asctime[8:10]),
+                            int(asctime[11:13]), int(asctime[14:16]), int(asctime[17:19])))
+
+
+def _asctime(second):
+    return time.strftime(_ASCTIME_FORMAT, time.gmtime(second))
+
+
+def window_rules(login_failures=DETECT_LOGIN_FAILURES, login_window=DETECT_LOGIN_WINDOW,
+                 request_flood=DETECT_REQUEST_FLOOD, request_window=DETECT_REQUEST_WINDOW):
+    """
+    Agregaciones por ventana: (nombre, regla que replica, (event_type, status), campo clave,
+    umbral, ventana en segundos). Por defecto los umbrales del detector en proceso.
+    Los api_request llevan la IP del cliente en remote_addr (los logins, en source_ip)
+    """
+    return (
+        ('failed_logins_by_user', '100010', _FAILED_LOGIN, 'username', login_failures, int(login_window)),
+        ('failed_logins_by_ip', '100010', _FAILED_LOGIN, 'source_ip', login_failures, int(login_window)),
+        ('requests_by_ip', '100014', _REQUEST, 'remote_addr', request_flood, int(request_window))
+    )
+
+
+def log_files(log_name='api_all', log_dir=LOG_DIR, archives=False, archive_dir=LOG_ARCHIVE_DIR,
+              backups=LOG_BACKUPS):
+    """Archivos de un log del más viejo al más nuevo: archivados, backups .N ... .1 y el actual"""
+    paths = list(reversed(archive_files(archive_dir, log_name))) if archives else []
+    base = os.path.join(log_dir, f'{log_name}.log')
+    for i in range(backups, -1, -1):
+        path = f'{base}.{i}' if i else base
+        if os.path.exists(path):
+            paths.append(path)
+    return paths
+
+
+def plan_chunks(paths, chunk_bytes=REPLAY_CHUNK_BYTES):
+    """
+    (ruta, inicio, fin) de cada chunk; los .ndjson.gz se leen enteros (fin None).
+    Los archivados ilegibles (ajenos, truncados) se registran y se saltean
+    """
+    chunks = []
+    for path in paths:
+        if path.endswith('.gz'):
+            try:
+                read_footer(path)
+            except (OSError, ValueError) as e:
+                report_unreadable_archive(path, e)
+                continue
+            chunks.append((path, 0, None))
+            continue
+        size = os.path.getsize(path)
+        for start in range(0, size, chunk_bytes):
+            chunks.append((path, start, min(start + chunk_bytes, size)))
+    return chunks
+
+
+def _chunk_blocks(path, start, end):
+    """
+    Listas de líneas que empiezan en [inicio, fin), leídas en bloques de _READ_SIZE;
+    la que cruza el final se lee completa (y la que cruza el inicio es del chunk anterior)
+    """
+    if end is None:
+        lines = []
+        try:
+            for line in iter_lines(path):
+                lines.append(line)
+                if len(lines) >= 8192:
+                    yield lines
+                    lines = []
+        except (OSError, ValueError) as e:
+            # Datos dañados a mitad del archivo: se usa lo leído hasta ahí
+            report_unreadable_archive(path, e)
+        yield lines
+        return
+    with open(path, 'rb') as f:
+        if start:
+            f.seek(start - 1)
+            start += len(f.readline()) - 1
+        f.seek(start)
+        remaining = end - start
+        pending = b''
+        while remaining > 0:
+            block = f.read(min(_READ_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            lines = (pending + block).split(b'\n')
+            pending = lines.pop()
+            yield lines
+        if pending:
+            yield [pending + f.readline()]
+
+
+def replay_chunk(task):
+    """
+    Procesa un chunk (corre en los procesos del pool). Devuelve conteos parciales
+    que se combinan sumando: por ventana {(clave, segundo): n}, errores por intervalo, totales
+    """
+    path, start, end, rules, error_interval = task
+    windows = {name: collections.Counter() for name, *_ in rules}
+    matchers = [(windows[name], match, field) for name, _rule, match, field, _threshold, _window in rules]
+    levels = collections.Counter()
+    event_types = collections.Counter()
+    errors = collections.Counter()
+    logged_alerts = collections.Counter()
+    records = invalid = untimed = 0
+    first = last = None
+    last_asctime = second = None
+
+    for line in itertools.chain.from_iterable(_chunk_blocks(path, start, end)):
+        if not line:
+            continue
+        try:
+            entry = _loads(line)
+        except ValueError:
+            invalid += 1
+            continue
+        if not isinstance(entry, dict):
+            invalid += 1
+            continue
+        records += 1
+
+        asctime = entry.get('asctime')
+        if asctime != last_asctime:
+            # Los registros consecutivos suelen compartir el segundo: se parsea una vez
+            last_asctime = asctime
+            try:
+                second = _parse_asctime(asctime)
+            except (TypeError, ValueError):
+                second = None
+        if second is None:
+            untimed += 1
+            continue
+        if first is None or second < first:
+            first = second
+        if last is None or second > last:
+            last = second
+
+        levelname = entry.get('levelname')
+        event_type = entry.get('event_type')
+        levels[levelname] += 1
+        event_types[event_type] += 1
+        weight = entry.get('sample_rate') or 1
+
+        for counts, (match_type, match_status), field in matchers:
+            if event_type == match_type and (match_status is None or entry.get('status') == match_status):
+                key = entry.get(field)
+                if isinstance(key, str):
+                    counts[(key, second)] += weight
+
+        if levelname in ('ERROR', 'CRITICAL'):
+            error_type = entry.get('error_type') or event_type or 'unknown'
+            errors[(second - second % error_interval, error_type)] += 1
+        if event_type == 'security_alert':
+            logged_alerts[entry.get('alert_type')] += 1
+
+    return {
+        "records": records,
+        "invalid": invalid,
+        "untimed": untimed,
+        "first": first,
+        "last": last,
+        "levels": levels,
+        "event_types": event_types,
+        "errors": errors,
+        "logged_alerts": logged_alerts,
+        "windows": windows
+    }
+
+
+def _peak_rank(key, peak):
+    count, second = peak
+    return count, -second, str(key)
+
+
+class _KeyWindow:
+    """Segundos de una clave que siguen dentro de la ventana y su suma"""
+
+    __slots__ = ('seconds', 'total', 'alert_until')
+
+    def __init__(self):
+        self.seconds = collections.deque()
+        self.total = 0
+        self.alert_until = 0
+
+
+class WindowReplay:
+    """
+    Ventana deslizante exacta sobre conteos (clave, segundo) que llegan en el orden de
+    los archivos. Un segundo se evalúa cuando queda por detrás de la marca de agua
+    (último segundo visto - lateness); los que llegan después de evaluado cuentan como late.
+    Como el detector en proceso, alerta una vez por ventana al alcanzar el umbral.
+    """
+
+    def __init__(self, name, rule, field, threshold, window, top=REPLAY_TOP, max_alerts=REPLAY_MAX_ALERTS):
+        self.name = name
+        self.rule = rule
+        self.field = field
+        self.threshold = threshold
+        self.window = window
+        self.top = top
+        self.max_alerts = max_alerts
+        self.events = 0
+        self.late = 0
+        self.alert_count = 0
+        self.alerts = []
+        self.watermark = None
+        self._pending = {}
+        self._keys = {}
+        self._peaks = {}
+        self._floor = None
+
+    def add(self, counts):
+        for (key, second), count in counts.items():
+            self.events += count
+            if self.watermark is not None and second < self.watermark:
+                self.late += count
+                continue
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._pending[key] = collections.Counter()
+            pending[second] += count
+
+    def advance(self, watermark):
+        """Evalúa los segundos anteriores a watermark y descarta los que ya no entran en ninguna ventana"""
+        for key, pending in list(self._pending.items()):
+            due = sorted(second for second in pending if second < watermark)
+            if not due:
+                continue
+            state = self._keys.get(key)
+            if state is None:
+                state = self._keys[key] = _KeyWindow()
+            for second in due:
+                self._evaluate(key, state, second, pending.pop(second))
+            if not pending:
+                del self._pending[key]
+
+        horizon = watermark - self.window
+        for key, state in list(self._keys.items()):
+            seconds = state.seconds
+            while seconds and seconds[0][0] <= horizon:
+                state.total -= seconds.popleft()[1]
+            if not seconds and key not in self._pending:
+                del self._keys[key]
+        self.watermark = watermark
+
+    def finish(self):
+        if self._pending:
+            self.advance(max(max(pending) for pending in self._pending.values()) + 1)
+
+    def _evaluate(self, key, state, second, count):
+        seconds = state.seconds
+        seconds.append((second, count))
+        state.total += count
+        oldest = second - self.window
+        while seconds[0][0] <= oldest:
+            state.total -= seconds.popleft()[1]
+        total = state.total
+
+        peaks = self._peaks
+        peak = peaks.get(key)
+        if peak is not None:
+            if total > peak[0]:
+                peaks[key] = (total, second)
+                self._floor = None
+        elif len(peaks) < self.top:
+            peaks[key] = (total, second)
+            self._floor = None
+        else:
+            # Solo se conservan las top claves por pico de la ventana (empates: el más temprano)
+            if self._floor is None:
+                self._floor = min((_peak_rank(k, p), k) for k, p in peaks.items())
+            floor_rank, floor_key = self._floor
+            if total >= floor_rank[0] and _peak_rank(key, (total, second)) > floor_rank:
+                del peaks[floor_key]
+                peaks[key] = (total, second)
+                self._floor = None
+
+        if total >= self.threshold and second >= state.alert_until:
+            state.alert_until = second + self.window
+            self.alert_count += 1
+            if len(self.alerts) < self.max_alerts:
+                self.alerts.append({
+                    self.field: key,
+                    "window_start": _asctime(seconds[0][0]),
+                    "alert_at": _asctime(second),
+                    "event_count": total
+                })
+
+    def tracked_keys(self):
+        return len(self._keys) + sum(1 for key in self._pending if key not in self._keys)
+
+    def report(self):
+        peaks = sorted(self._peaks.items(), key=lambda item: _peak_rank(*item), reverse=True)
+        return {
+            "mirrors_rule": self.rule,
+            "key_field": self.field,
+            "threshold": self.threshold,
+            "window_seconds": self.window,
+            "events": self.events,
+            "late_events": self.late,
+            "alerts": self.alert_count,
+            "alert_list": sorted(self.alerts, key=lambda alert: (alert["alert_at"], str(alert[self.field]))),
+            "alert_list_truncated": self.alert_count > len(self.alerts),
+            "top_peaks": [{self.field: key, "event_count": count, "at": _asctime(second)}
+                          for key, (count, second) in peaks]
+        }
+
+
+def _run_chunks(tasks, workers):
+    """Resultados de los chunks en orden, con a lo sumo 2 chunks en vuelo por proceso"""
+    if workers <= 1:
+        yield from map(replay_chunk, tasks)
+        return
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = collections.deque()
+        tasks = iter(tasks)
+        for task in tasks:
+            in_flight.append(pool.submit(replay_chunk, task))
+            if len(in_flight) >= workers * 2:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+def replay(paths, rules=None, workers=None, chunk_bytes=REPLAY_CHUNK_BYTES, lateness=REPLAY_LATENESS,
+           error_interval=REPLAY_ERROR_INTERVAL, top=REPLAY_TOP, max_alerts=REPLAY_MAX_ALERTS):
+    """Procesa los archivos (en orden cronológico) y devuelve el reporte como dict"""
+    if rules is None:
+        rules = window_rules()
+    if workers is None:
+        workers = os.cpu_count() or 1
+    chunks = plan_chunks(paths, chunk_bytes)
+    replays = [WindowReplay(name, rule, field, threshold, window, top, max_alerts)
+               for name, rule, _match, field, threshold, window in rules]
+    totals = collections.Counter()
+    levels = collections.Counter()
+    event_types = collections.Counter()
+    errors = collections.Counter()
+    logged_alerts = collections.Counter()
+    first = last = None
+    peak_keys = 0
+
+    start = time.perf_counter()
+    tasks = [(path, chunk_start, chunk_end, rules, error_interval) for path, chunk_start, chunk_end in chunks]
+    for result in _run_chunks(tasks, workers):
+        for field in ('records', 'invalid', 'untimed'):
+            totals[field] += result[field]
+        levels.update(result["levels"])
+        event_types.update(result["event_types"])
+        errors.update(result["errors"])
+        logged_alerts.update(result["logged_alerts"])
+        if result["first"] is not None:
+            first = result["first"] if first is None else min(first, result["first"])
+            last = result["last"] if last is None else max(last, result["last"])
+        for window_replay in replays:
+            window_replay.add(result["windows"][window_replay.name])
+            if last is not None:
+                window_replay.advance(last - lateness)
+        peak_keys = max(peak_keys, sum(window_replay.tracked_keys() for window_replay in replays))
+    for window_replay in replays:
+        window_replay.finish()
+    elapsed = time.perf_counter() - start
+
+    input_bytes = sum(os.path.getsize(path) for path in paths)
+    timeline = collections.defaultdict(dict)
+    for (interval_start, error_type), count in sorted(errors.items()):
+        timeline[interval_start][error_type] = count
+
+    return {
+        "files": paths,
+        "chunks": len(chunks),
+        "workers": workers,
+        "elapsed_seconds": round(elapsed, 3),
+        "input_bytes": input_bytes,
+        "mb_per_second": round(input_bytes / elapsed / 1024 ** 2, 1) if elapsed else None,
+        "records": totals["records"],
+        "invalid_lines": totals["invalid"],
+        "untimed_records": totals["untimed"],
+        "first_record": _asctime(first) if first is not None else None,
+        "last_record": _asctime(last) if last is not None else None,
+        "levels": dict(levels.most_common()),
+        "event_types": {str(event_type): count for event_type, count in event_types.most_common()},
+        "windows": {window_replay.name: window_replay.report() for window_replay in replays},
+        "logged_alerts": {str(alert_type): count for alert_type, count in logged_alerts.most_common()},
+        "peak_tracked_keys": peak_keys,
+        "error_interval_seconds": error_interval,
+        "errors_over_time": [{"interval_start": _asctime(interval_start), "errors": counts}
+                             for interval_start, counts in timeline.items()]
+    }
+
+
+def print_report(report):
+    print(f"Archivos:          {len(report['files'])} ({report['input_bytes']:,} bytes, {report['chunks']} chunks, "
+          f"{report['workers']} procesos)")
+    print(f"Tiempo:            {report['elapsed_seconds']} s ({report['mb_per_second']} MiB/s)")
+    print(f"Registros:         {report['records']:,} ({report['invalid_lines']:,} líneas inválidas, "
+          f"{report['untimed_records']:,} sin asctime)")
+    print(f"Rango:             {report['first_record']} .. {report['last_record']}")
+    print(f"Niveles:           {report['levels']}")
+    for name, window in report['windows'].items():
+        print(f"{name} (regla {window['mirrors_rule']}, {window['threshold']} en {window['window_seconds']} s): "
+              f"{window['events']:,} eventos, {window['alerts']:,} alertas")
+        field = window['key_field']
+        for alert in window['alert_list'][:REPLAY_TOP]:
+            print(f"  alerta  {alert['alert_at']}  {alert[field]:24} {alert['event_count']:,} desde {alert['window_start']}")
+        for peak in window['top_peaks']:
+            print(f"  pico    {peak['at']}  {peak[field]:24} {peak['event_count']:,}")
+    print(f"Alertas logueadas: {report['logged_alerts']}")
+    for interval in report['errors_over_time']:
+        print(f"  errores {interval['interval_start']}  {interval['errors']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-análisis offline de los logs JSON (ventanas de las reglas 100010/100014)")
+    parser.add_argument('paths', nargs='*', help="Archivos a procesar, en orden cronológico (por defecto los de --log)")
+    parser.add_argument('--log', choices=INDEXED_LOGS, default='api_all')
+    parser.add_argument('--log-dir', default=LOG_DIR)
+    parser.add_argument('--archives', action='store_true', help="Incluye los segmentos archivados (.ndjson.gz)")
+    parser.add_argument('--archive-dir', default=LOG_ARCHIVE_DIR)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-mb', type=float, default=REPLAY_CHUNK_BYTES / 1024 ** 2)
+    parser.add_argument('--lateness', type=int, default=REPLAY_LATENESS,
+                        help="Segundos de desorden tolerado entre registros")
+    parser.add_argument('--login-failures', type=int, default=DETECT_LOGIN_FAILURES)
+    parser.add_argument('--login-window', type=float, default=DETECT_LOGIN_WINDOW)
+    parser.add_argument('--request-flood', type=int, default=DETECT_REQUEST_FLOOD)
+    parser.add_argument('--request-window', type=float, default=DETECT_REQUEST_WINDOW)
+    parser.add_argument('--error-interval', type=int, default=REPLAY_ERROR_INTERVAL,
+                        help="Segundos de cada intervalo de la línea de tiempo de errores")
+    parser.add_argument('--top', type=int, default=REPLAY_TOP)
+    parser.add_argument('--json', help="Guarda el reporte en este archivo")
+    args = parser.parse_args(argv)
+
+    paths = args.paths or log_files(args.log, args.log_dir, args.archives, args.archive_dir)
+    if not paths:
+        parser.error(f"No hay archivos de {args.log} en {args.log_dir}")
+
+    rules = window_rules(args.login_failures, args.login_window, args.request_flood, args.request_window)
+    report = replay(paths, rules, workers=args.workers, chunk_bytes=max(1, int(args.chunk_mb * 1024 ** 2)),
+                    lateness=args.lateness, error_interval=args.error_interval, top=args.top)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
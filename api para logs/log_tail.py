@@ -0,0 +1,189 @@
+import json
+import os
+import queue
+import threading
+from log_index import LOG_DIR, INDEXED_LOGS
+
+LOG_TAIL_POLL_INTERVAL = float(os.environ.get('LOG_TAIL_POLL_INTERVAL', '0.25'))
+LOG_TAIL_MAX_SUBSCRIBERS = int(os.environ.get('LOG_TAIL_MAX_SUBSCRIBERS', '100'))
+# Líneas pendientes por suscriptor; si un cliente lento se atrasa se descartan las más viejas
+LOG_TAIL_QUEUE_SIZE = int(os.environ.get('LOG_TAIL_QUEUE_SIZE', '1000'))
+
+_READ_SIZE = 1024 * 1024
+
+
+class TooManySubscribersError(Exception):
+    """El archivo ya tiene el máximo de clientes siguiéndolo"""
+
+
+class Subscription:
+    """Cliente que sigue un archivo: filtros y cola de líneas pendientes"""
+
+    def __init__(self, filters, maxsize=LOG_TAIL_QUEUE_SIZE, on_line=None):
+        # filters: {campo del registro: valor}, por ejemplo {'levelname': 'ERROR'}
+        self.filters = filters
+        self.queue = queue.Queue(maxsize)
+        self.dropped = 0
+        # Se llama (desde el hilo lector) después de encolar cada línea: clientes async
+        self.on_line = on_line
+
+    def matches(self, record):
+        for field, value in self.filters.items():
+            if record.get(field) != value:
+                return False
+        return True
+
+    def offer(self, line):
+        try:
+            self.queue.put_nowait(line)
+        except queue.Full:
+            # drop_oldest: el cliente ve lo más reciente
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+            try:
+                self.queue.put_nowait(line)
+            except queue.Full:
+                self.dropped += 1
+        if self.on_line is not None:
+            self.on_line()
+
+    def drain(self):
+        """Todas las líneas pendientes, sin esperar"""
+        lines = []
+        try:
+            while True:
+                lines.append(self.queue.get_nowait())
+        except queue.Empty:
+            return lines
+
+    def get(self, timeout):
+        """Siguiente línea, o None si no llegó nada en timeout segundos"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class LogFollower:
+    """
+    Un único hilo lector por archivo que reparte las líneas nuevas entre
+    todos los suscriptores. Lee en bloques grandes desde la última posición
+    y, si RotatingFileHandler rota el archivo (cambia el inode del path),
+    termina de leer el archivo viejo y sigue con el nuevo desde el principio.
+    El hilo solo corre mientras haya suscriptores.
+    """
+
+    def __init__(self, path, poll_interval=LOG_TAIL_POLL_INTERVAL, max_subscribers=LOG_TAIL_MAX_SUBSCRIBERS):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.max_subscribers = max_subscribers
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def subscribe(self, filters=None, on_line=None):
+        subscription = Subscription(filters or {}, on_line=on_line)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise TooManySubscribersError(self.path)
+            self._subscribers = self._subscribers + [subscription]
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"log-tail-{os.path.basename(self.path)}",
+                                                daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s is not subscription]
+            if not self._subscribers:
+                self._wakeup.set()
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def _open(self, from_end):
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return None, None
+        if from_end:
+            f.seek(0, os.SEEK_END)
+        return f, os.fstat(f.fileno()).st_ino
+
+    def _run(self):
+        f, inode = self._open(from_end=True)
+        pending = b''
+        try:
+            while True:
+                with self._lock:
+                    if not self._subscribers:
+                        self._thread = None
+                        return
+
+                if f is None:
+                    f, inode = self._open(from_end=False)
+
+                if f is not None:
+                    chunk = f.read(_READ_SIZE)
+                    if chunk:
+                        lines = (pending + chunk).split(b'\n')
+                        pending = lines.pop()
+                        self._dispatch(lines)
+                        if len(chunk) == _READ_SIZE:
+                            continue
+                    elif self._rotated(inode):
+                        # El archivo viejo ya se leyó completo: seguir con el nuevo
+                        f.close()
+                        f, inode = self._open(from_end=False)
+                        pending = b''
+                        continue
+
+                if self._wakeup.wait(self.poll_interval):
+                    self._wakeup.clear()
+        finally:
+            if f is not None:
+                f.close()
+
+    def _rotated(self, inode):
+        try:
+            return os.stat(self.path).st_ino != inode
+        except FileNotFoundError:
+            return False
+
+    def _dispatch(self, lines):
+        subscribers = self._subscribers
+        filtered = [s for s in subscribers if s.filters]
+        for line in lines:
+            if not line:
+                continue
+            text = line.decode('utf-8', 'replace')
+            record = None
+            if filtered:
+                try:
+                    record = json.loads(text)
+                except ValueError:
+                    record = {}
+            for subscriber in subscribers:
+                if not subscriber.filters or (isinstance(record, dict) and subscriber.matches(record)):
+                    subscriber.offer(text)
+
+
+_followers = {}
+_followers_lock = threading.Lock()
+
+
+def get_follower(log, log_dir=LOG_DIR):
+    """Follower compartido del log indicado (api_all, api_errors o api_security)"""
+    if log not in INDEXED_LOGS:
+        raise ValueError(f"Unknown log: {log}")
+    path = os.path.join(log_dir, f'{log}.log')
+    with _followers_lock:
+        follower = _followers.get(path)
+        if follower is None:
+            follower = _followers[path] = LogFollower(path)
+        return follower
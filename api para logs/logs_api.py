@@ -0,0 +1,191 @@
+import logging
+from datetime import datetime, timedelta
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from log_index import get_log_index, INDEXED_LOGS
+from log_tail import get_follower, TooManySubscribersError
+from config.log_archive import search_archives
+from config.logging_config import get_recent_records
+
+# Blueprint para consultar los logs generados por el servicio
+logs_bp = Blueprint('logs', __name__, url_prefix='/api/logs')
+
+MAX_PER_PAGE = 500
+
+# Parámetro de query -> campo del registro JSON en los archivos comprimidos
+ARCHIVE_FIELDS = {
+    'level': 'levelname',
+    'logger': 'name'
+}
+
+# Segundos sin líneas nuevas tras los que /tail envía un keepalive
+TAIL_KEEPALIVE_SECONDS = 15
+
+# Parámetro de query -> campo del registro JSON en /tail
+TAIL_FILTERS = {
+    'logger': 'name',
+    'level': 'levelname',
+    'event_type': 'event_type'
+}
+
+# Parámetro de query -> campo indexado
+SEARCH_FILTERS = {
+    'request_id': 'request_id',
+    'username': 'username',
+    'source_ip': 'source_ip',
+    'event_type': 'event_type',
+    'level': 'levelname',
+    'logger': 'logger'
+}
+
+# Loggers con ring buffer en memoria (/recent)
+RECENT_LOGGERS = ('api_microservice', 'security', 'errors')
+
+# Parámetro de query -> campo extra del registro en /recent
+RECENT_FILTERS = ('event_type', 'request_id', 'username', 'source_ip')
+
+def _parse_time(value):
+    """Acepta "YYYY-MM-DD HH:MM:SS" o ISO 8601 y lo lleva al formato de asctime"""
+    if not value:
+        return None
+    return datetime.fromisoformat(value).strftime('%Y-%m-%d %H:%M:%S')
+
+@logs_bp.route('/search', methods=['GET'])
+def search_logs():
+    """
+    Busca en los logs (incluidos los rotados) usando el índice en disco.
+    Filtros: request_id, username, source_ip, event_type, level, logger,
+    since/until o last_minutes; paginación con page y per_page.
+    Con source=archive busca en los segmentos archivados y comprimidos.
+    """
+    args = request.args
+    log = args.get('log', 'api_all')
+    if log not in INDEXED_LOGS:
+        return jsonify({
+            "status": "error",
+            "message": f"log must be one of {', '.join(INDEXED_LOGS)}"
+        }), 400
+
+    try:
+        page = max(1, int(args.get('page', 1)))
+        per_page = min(MAX_PER_PAGE, max(1, int(args.get('per_page', 100))))
+        since = _parse_time(args.get('since'))
+        until = _parse_time(args.get('until'))
+        if args.get('last_minutes'):
+            since = (datetime.now() - timedelta(minutes=float(args['last_minutes']))).strftime('%Y-%m-%d %H:%M:%S')
+    except ValueError as e:
+        return jsonify({
+            "status": "error",
+            "message": f"Invalid search parameter: {e}"
+        }), 400
+
+    if args.get('source') == 'archive':
+        # Archivos comprimidos: se filtra por los campos del registro JSON
+        filters = {ARCHIVE_FIELDS.get(param, param): args[param] for param in SEARCH_FILTERS if args.get(param)}
+        records, scanned = search_archives(
+            current_app.config['LOG_ARCHIVE_DIR'], log, since=since, until=until,
+            offset=(page - 1) * per_page, limit=per_page, **filters
+        )
+        return jsonify({
+            "status": "success",
+            "log": log,
+            "source": "archive",
+            "page": page,
+            "per_page": per_page,
+            "archives_scanned": scanned,
+            "records": records
+        }), 200
+
+    filters = {field: args[param] for param, field in SEARCH_FILTERS.items() if args.get(param)}
+    records, total = get_log_index(current_app.config['LOG_DIR']).search(
+        log=log, since=since, until=until, page=page, per_page=per_page, **filters
+    )
+
+    return jsonify({
+        "status": "success",
+        "log": log,
+        "page": page,
+        "per_page": per_page,
+        "total": total,
+        "records": records
+    }), 200
+
+@logs_bp.route('/tail', methods=['GET'])
+def tail_logs():
+    """
+    Sigue un log en vivo como Server-Sent Events (por defecto) o NDJSON (format=ndjson).
+    Filtros opcionales: logger, level y event_type.
+    """
+    args = request.args
+    log = args.get('log', 'api_all')
+    stream_format = args.get('format', 'sse')
+    if log not in INDEXED_LOGS or stream_format not in ('sse', 'ndjson'):
+        return jsonify({
+            "status": "error",
+            "message": f"log must be one of {', '.join(INDEXED_LOGS)} and format sse or ndjson"
+        }), 400
+
+    filters = {field: args[param] for param, field in TAIL_FILTERS.items() if args.get(param)}
+    follower = get_follower(log, current_app.config['LOG_DIR'])
+    try:
+        subscription = follower.subscribe(filters)
+    except TooManySubscribersError:
+        return jsonify({
+            "status": "error",
+            "message": "Too many log followers, retry later"
+        }), 503
+
+    if stream_format == 'sse':
+        template, keepalive, mimetype = 'data: {}\n\n', ': keepalive\n\n', 'text/event-stream'
+    else:
+        template, keepalive, mimetype = '{}\n', '\n', 'application/x-ndjson'
+
+    def generate():
+        try:
+            # Los headers salen con el primer bloque: no esperar a la primera línea
+            yield keepalive
+            while True:
+                line = subscription.get(TAIL_KEEPALIVE_SECONDS)
+                yield keepalive if line is None else template.format(line)
+        finally:
+            follower.unsubscribe(subscription)
+
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@logs_bp.route('/recent', methods=['GET'])
+def recent_logs():
+    """
+    Últimos registros guardados en memoria (sin leer disco), del más reciente al más antiguo.
+    Filtros: logger, level (nivel mínimo), event_type, request_id, username, source_ip y limit.
+    """
+    args = request.args
+    logger = args.get('logger')
+    level_name = args.get('level', 'NOTSET').upper()
+    level = logging.getLevelName(level_name)
+    if (logger is not None and logger not in RECENT_LOGGERS) or not isinstance(level, int):
+        return jsonify({
+            "status": "error",
+            "message": f"logger must be one of {', '.join(RECENT_LOGGERS)} and level a valid level name"
+        }), 400
+
+    try:
+        limit = min(MAX_PER_PAGE, max(1, int(args.get('limit', 100))))
+    except ValueError as e:
+        return jsonify({
+            "status": "error",
+            "message": f"Invalid limit: {e}"
+        }), 400
+
+    filters = {field: args[field] for field in RECENT_FILTERS if args.get(field)}
+    recent = get_recent_records()
+    records = recent.recent(logger=logger, level=level, limit=limit, **filters) if recent else []
+
+    return jsonify({
+        "status": "success",
+        "logger": logger,
+        "level": level_name,
+        "count": len(records),
+        "records": records
+    }), 200
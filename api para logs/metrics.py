@@ -0,0 +1,192 @@
+import bisect
+import logging
+import threading
+import time
+from datetime import timedelta
+
+# Límites de los buckets de latencia en segundos (convención de Prometheus)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Shard:
+    """Contadores de un único hilo: solo ese hilo los modifica, sin locks"""
+
+    __slots__ = ('thread', 'requests', 'latency', 'log_records')
+
+    def __init__(self, thread):
+        self.thread = thread
+        self.requests = {}     # (endpoint, method, status) -> cantidad
+        self.latency = {}      # endpoint -> [conteo por bucket..., +Inf, suma]
+        self.log_records = {}  # (logger, level) -> cantidad
+
+
+def _merge_counts(target, source):
+    for key, value in source.items():
+        target[key] = target.get(key, 0) + value
+
+
+def _merge_histograms(target, source):
+    for key, values in source.items():
+        current = target.get(key)
+        if current is None:
+            target[key] = list(values)
+        else:
+            for i, value in enumerate(values):
+                current[i] += value
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsRegistry:
+    """
+    Métricas en memoria de bajo costo.
+    Cada hilo escribe en su propio shard; el scrape suma todos los shards
+    y consolida los de hilos que ya terminaron.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.started_at = time.time()
+        self._started_monotonic = time.monotonic()
+        self._local = threading.local()
+        self._shards = []
+        self._retired = _Shard(None)
+        self._lock = threading.Lock()
+        self._gauges = {}
+
+    def uptime_seconds(self):
+        return time.monotonic() - self._started_monotonic
+
+    def uptime(self):
+        return str(timedelta(seconds=int(self.uptime_seconds())))
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = _Shard(threading.current_thread())
+            self._local.shard = shard
+            with self._lock:
+                self._shards.append(shard)
+                # Servidores con un hilo por request: consolidar shards muertos
+                if len(self._shards) > 256:
+                    self._retire_dead_shards()
+        return shard
+
+    def _retire_dead_shards(self):
+        alive = []
+        for shard in self._shards:
+            if shard.thread.is_alive():
+                alive.append(shard)
+            else:
+                _merge_counts(self._retired.requests, shard.requests)
+                _merge_histograms(self._retired.latency, shard.latency)
+                _merge_counts(self._retired.log_records, shard.log_records)
+        self._shards = alive
+
+    def observe_request(self, endpoint, method, status, duration_seconds):
+        """Registra un request terminado"""
+        shard = self._shard()
+        key = (endpoint, method, status)
+        shard.requests[key] = shard.requests.get(key, 0) + 1
+
+        histogram = shard.latency.get(endpoint)
+        if histogram is None:
+            histogram = shard.latency[endpoint] = [0] * (len(self.buckets) + 2)
+        histogram[bisect.bisect_left(self.buckets, duration_seconds)] += 1
+        histogram[-1] += duration_seconds
+
+    def count_log_record(self, logger_name, level):
+        """Registra un log emitido"""
+        records = self._shard().log_records
+        key = (logger_name, level)
+        records[key] = records.get(key, 0) + 1
+
+    def register_gauge(self, name, help_text, getter, metric_type='gauge', label=None):
+        """
+        Agrega una métrica calculada en cada scrape (getter devuelve un número o None).
+        Con label, getter devuelve un dict {valor del label: número}.
+        Registrar otra vez el mismo nombre reemplaza la métrica anterior.
+        """
+        self._gauges[name] = (help_text, getter, metric_type, label)
+
+    def remove_gauge(self, name):
+        """Quita una métrica registrada (si existe)"""
+        self._gauges.pop(name, None)
+
+    def snapshot(self):
+        """Suma de todos los shards"""
+        totals = _Shard(None)
+        with self._lock:
+            self._retire_dead_shards()
+            shards = [self._retired] + list(self._shards)
+        for shard in shards:
+            _merge_counts(totals.requests, dict(shard.requests))
+            _merge_histograms(totals.latency, {k: list(v) for k, v in dict(shard.latency).items()})
+            _merge_counts(totals.log_records, dict(shard.log_records))
+        return totals
+
+    def render_prometheus(self):
+        """Genera las métricas en formato de texto de Prometheus"""
+        totals = self.snapshot()
+        lines = [
+            "# HELP api_uptime_seconds Seconds since the service started",
+            "# TYPE api_uptime_seconds gauge",
+            f"api_uptime_seconds {self.uptime_seconds():.3f}",
+            "# HELP api_requests_total HTTP requests by endpoint, method and status code",
+            "# TYPE api_requests_total counter"
+        ]
+        for (endpoint, method, status), count in sorted(totals.requests.items(), key=str):
+            lines.append(
+                f'api_requests_total{{endpoint="{_escape(endpoint)}",method="{_escape(method)}",'
+                f'status="{status}"}} {count}'
+            )
+
+        lines.append("# HELP api_request_duration_seconds HTTP request latency")
+        lines.append("# TYPE api_request_duration_seconds histogram")
+        for endpoint, histogram in sorted(totals.latency.items(), key=str):
+            label = _escape(endpoint)
+            cumulative = 0
+            for bound, count in zip(self.buckets, histogram):
+                cumulative += count
+                lines.append(f'api_request_duration_seconds_bucket{{endpoint="{label}",le="{bound}"}} {cumulative}')
+            cumulative += histogram[len(self.buckets)]
+            lines.append(f'api_request_duration_seconds_bucket{{endpoint="{label}",le="+Inf"}} {cumulative}')
+            lines.append(f'api_request_duration_seconds_sum{{endpoint="{label}"}} {histogram[-1]:.6f}')
+            lines.append(f'api_request_duration_seconds_count{{endpoint="{label}"}} {cumulative}')
+
+        lines.append("# HELP api_log_records_total Log records emitted by logger and level")
+        lines.append("# TYPE api_log_records_total counter")
+        for (logger_name, level), count in sorted(totals.log_records.items()):
+            lines.append(f'api_log_records_total{{logger="{_escape(logger_name)}",level="{level}"}} {count}')
+
+        for name, (help_text, getter, metric_type, label) in list(self._gauges.items()):
+            value = getter()
+            if value is None:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            if label is None:
+                lines.append(f"{name} {value}")
+            else:
+                for label_value, labeled in sorted(value.items()):
+                    lines.append(f'{name}{{{label}="{_escape(label_value)}"}} {labeled}')
+
+        return "\n".join(lines) + "\n"
+
+
+class LogRecordCounter(logging.Filter):
+    """Filtro que cuenta los registros emitidos por cada logger sin descartar ninguno"""
+
+    def __init__(self, registry):
+        super().__init__()
+        self.registry = registry
+
+    def filter(self, record):
+        self.registry.count_log_record(record.name, record.levelname)
+        return True
+
+
+# Registro global del proceso
+metrics = MetricsRegistry()
@@ -0,0 +1,240 @@
+import collections
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+DATA_PROCESSING_WORKERS = int(os.environ.get('DATA_PROCESSING_WORKERS', '4'))
+DATA_PROCESSING_QUEUE = int(os.environ.get('DATA_PROCESSING_QUEUE', '32'))
+DATA_PROCESSING_TIMEOUT = float(os.environ.get('DATA_PROCESSING_TIMEOUT', '30'))
+NDJSON_MAX_LINE_BYTES = int(os.environ.get('NDJSON_MAX_LINE_BYTES', str(1024 * 1024)))
+
+
+class EngineBusyError(Exception):
+    """El motor de procesamiento no admite más trabajos pendientes"""
+
+
+def records_from_payload(payload):
+    """Extrae la lista de registros del cuerpo enviado a /api/data/process"""
+    if isinstance(payload, list):
+        return payload
+    if not isinstance(payload, dict):
+        return [payload]
+    data = payload.get('data')
+    if data is None:
+        return []
+    if isinstance(data, list):
+        return data
+    return [data]
+
+
+# Marca de línea vacía en NdjsonStream (distinta de None, que es registro inválido)
+_BLANK = object()
+
+
+class NdjsonStream:
+    """
+    Itera los registros de un cuerpo NDJSON leyendo el stream en bloques,
+    sin cargar el cuerpo completo en memoria. Las líneas vacías se ignoran;
+    las que no son JSON válido o superan max_line_bytes se entregan como None
+    (registro inválido). bytes_read lleva la cuenta de bytes consumidos.
+    """
+
+    def __init__(self, stream, max_line_bytes=NDJSON_MAX_LINE_BYTES, chunk_size=64 * 1024):
+        self.stream = stream
+        self.max_line_bytes = max_line_bytes
+        self.chunk_size = chunk_size
+        self.bytes_read = 0
+        self.cancelled = False
+
+    def cancel(self):
+        """
+        Corta la lectura (por ejemplo tras un timeout): cierra el stream y el iterador
+        termina antes del próximo bloque, sin seguir ocupando un hilo del pool
+        """
+        self.cancelled = True
+        close = getattr(self.stream, 'close', None)
+        if close is not None:
+            try:
+                close()
+            except Exception:
+                pass
+
+    def _parse(self, line):
+        line = line.strip()
+        if not line:
+            return _BLANK
+        try:
+            return json.loads(line)
+        except ValueError:
+            return None
+
+    def __iter__(self):
+        # Se lee en bloques: el readline de los streams WSGI suele leer byte a byte
+        read = self.stream.read
+        pending = b''
+        oversized = False
+        while not self.cancelled:
+            try:
+                chunk = read(self.chunk_size)
+            except ValueError:
+                # Lectura sobre el stream ya cerrado por cancel()
+                if self.cancelled:
+                    return
+                raise
+            if not chunk or self.cancelled:
+                break
+            self.bytes_read += len(chunk)
+
+            lines = (pending + chunk).split(b'\n')
+            pending = lines.pop()
+            for line in lines:
+                if oversized:
+                    # Resto de una línea demasiado larga ya descartada
+                    oversized = False
+                    yield None
+                    continue
+                if len(line) > self.max_line_bytes:
+                    yield None
+                    continue
+                record = self._parse(line)
+                if record is not _BLANK:
+                    yield record
+
+            if len(pending) > self.max_line_bytes:
+                pending = b''
+                oversized = True
+
+        if self.cancelled:
+            return
+        if oversized:
+            yield None
+        elif pending:
+            record = self._parse(pending)
+            if record is not _BLANK:
+                yield record
+
+
+def process_records(records):
+    """
+    Procesa los registros uno a uno: descarta los vacíos, normaliza el resto
+    a JSON canónico y calcula un checksum SHA-256 del lote.
+    Acepta cualquier iterable, por lo que el lote no necesita estar en memoria.
+    """
+    start = time.perf_counter()
+    digest = hashlib.sha256()
+    processed = 0
+    invalid = 0
+
+    for record in records:
+        if record is None or record == '' or record == {} or record == []:
+            invalid += 1
+            continue
+        if isinstance(record, str):
+            encoded = record.encode('utf-8')
+        else:
+            encoded = json.dumps(record, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        digest.update(encoded)
+        digest.update(b'\n')
+        processed += 1
+
+    return {
+        "status": "success" if processed and not invalid else "failed",
+        "records_processed": processed,
+        "records_invalid": invalid,
+        "checksum": digest.hexdigest(),
+        "processing_time_seconds": round(time.perf_counter() - start, 3)
+    }
+
+
+class ProcessingEngine:
+    """
+    Pool de hilos acotado para procesar lotes de datos.
+    Admite como máximo max_workers trabajos en ejecución más max_pending en espera;
+    por encima de eso submit() lanza EngineBusyError en lugar de encolar sin límite.
+    Los trabajos corren con una copia del contexto del request que los creó.
+    """
+
+    def __init__(self, max_workers=DATA_PROCESSING_WORKERS, max_pending=DATA_PROCESSING_QUEUE, max_jobs=1000):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='data-processing')
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._jobs = collections.OrderedDict()
+        self._jobs_lock = threading.Lock()
+        self.max_jobs = max_jobs
+
+    def submit(self, fn, *args):
+        """Envía una función al pool respetando el límite de trabajos pendientes"""
+        if not self._slots.acquire(blocking=False):
+            raise EngineBusyError("Processing queue is full")
+        context = contextvars.copy_context()
+        future = self._executor.submit(context.run, fn, *args)
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run(self, records, timeout=DATA_PROCESSING_TIMEOUT):
+        """Modo síncrono: procesa el lote en el pool y espera el resultado"""
+        return self.submit(process_records, records).result(timeout)
+
+    def submit_job(self, records, on_done=None):
+        """Modo asíncrono: encola el lote y devuelve el ID del trabajo"""
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "status": "queued",
+            "submitted_at": datetime.now().isoformat(),
+            "finished_at": None,
+            "result": None
+        }
+        with self._jobs_lock:
+            self._jobs[job_id] = job
+            self._evict_finished_jobs()
+
+        try:
+            self.submit(self._run_job, job, records, on_done)
+        except EngineBusyError:
+            with self._jobs_lock:
+                self._jobs.pop(job_id, None)
+            raise
+        return job_id
+
+    def _run_job(self, job, records, on_done):
+        job["status"] = "running"
+        try:
+            result = process_records(records)
+            job["result"] = result
+            job["status"] = "completed" if result["status"] == "success" else "failed"
+        except Exception as e:
+            result = None
+            job["status"] = "error"
+            job["error"] = str(e)
+        job["finished_at"] = datetime.now().isoformat()
+        if on_done is not None:
+            on_done(job["job_id"], result)
+
+    def _evict_finished_jobs(self):
+        # Mantiene acotada la tabla de trabajos descartando los terminados más antiguos
+        excess = len(self._jobs) - self.max_jobs
+        if excess <= 0:
+            return
+        for job_id in list(self._jobs):
+            if excess <= 0:
+                break
+            if self._jobs[job_id]["finished_at"] is not None:
+                del self._jobs[job_id]
+                excess -= 1
+
+    def get_job(self, job_id):
+        """Devuelve una copia del estado del trabajo, o None si no existe"""
+        with self._jobs_lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+
+# Motor compartido por el proceso
+engine = ProcessingEngine()
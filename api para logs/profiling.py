@@ -0,0 +1,245 @@
+import cProfile
+import collections
+import functools
+import os
+import pstats
+import sys
+import threading
+import time
+from flask import Blueprint, request, jsonify
+from config.log_profiling import stage_timings, begin_timing, current_timing, end_timing
+
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join('logs', 'profiles'))
+PROFILE_MAX_REQUESTS = int(os.environ.get('PROFILE_MAX_REQUESTS', '1000'))
+# Intervalo del profiler por muestreo (segundos)
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', '0.001'))
+
+PROFILE_MODES = ('cprofile', 'sample')
+
+_START_KEY = 'profiling.start_ns'
+
+
+class ProfilerBusyError(Exception):
+    """Ya hay una captura en curso"""
+
+
+class RequestProfiler:
+    """
+    Perfila los próximos N requests y deja el resultado en PROFILE_DIR:
+    - cprofile: un cProfile por request (en su hilo), combinados en un .pstats
+    - sample: un hilo muestrea las pilas de los hilos de esos requests y escribe
+      un .collapsed (formato de flamegraph.pl / speedscope)
+    """
+
+    def __init__(self, profile_dir=PROFILE_DIR, sample_interval=PROFILE_SAMPLE_INTERVAL):
+        self.profile_dir = profile_dir
+        self.sample_interval = sample_interval
+        self.last_output = None
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.mode = None
+        self.remaining = 0
+        self.captured = 0
+        self._in_flight = 0
+        self._stats = None
+        self._stacks = collections.Counter()
+        self._threads = set()
+        self._sampler = None
+
+    def arm(self, count, mode='cprofile'):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"mode must be one of {', '.join(PROFILE_MODES)}")
+        with self._lock:
+            if self.remaining or self._in_flight:
+                raise ProfilerBusyError()
+            self._reset()
+            self.mode = mode
+            self.remaining = count
+            if mode == 'sample':
+                self._sampler = threading.Thread(target=self._sample, name='request-sampler', daemon=True)
+                self._sampler.start()
+
+    def start_request(self):
+        """Devuelve un token si este request se perfila, o None"""
+        if not self.remaining:
+            return None
+        with self._lock:
+            if not self.remaining:
+                return None
+            self.remaining -= 1
+            self._in_flight += 1
+            mode = self.mode
+            if mode == 'sample':
+                self._threads.add(threading.get_ident())
+        if mode == 'sample':
+            return threading.get_ident()
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def finish_request(self, token):
+        if isinstance(token, cProfile.Profile):
+            token.disable()
+        with self._lock:
+            if isinstance(token, cProfile.Profile):
+                if self._stats is None:
+                    self._stats = pstats.Stats(token)
+                else:
+                    self._stats.add(token)
+            else:
+                self._threads.discard(token)
+            self._in_flight -= 1
+            self.captured += 1
+            if not self.remaining and not self._in_flight:
+                self._dump()
+
+    def _sample(self):
+        while True:
+            time.sleep(self.sample_interval)
+            with self._lock:
+                if self.mode != 'sample' or (not self.remaining and not self._in_flight):
+                    return
+                threads = set(self._threads)
+            frames = sys._current_frames()
+            stacks = []
+            for ident in threads:
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                if stack:
+                    stacks.append(';'.join(reversed(stack)))
+            del frames
+            with self._lock:
+                self._stacks.update(stacks)
+
+    def _dump(self):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        base = os.path.join(self.profile_dir, f"profile-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}")
+        if self.mode == 'sample':
+            path = base + '.collapsed'
+            with open(path, 'w') as f:
+                for stack, count in self._stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+        else:
+            path = base + '.pstats'
+            if self._stats is not None:
+                self._stats.dump_stats(path)
+        self.last_output = path
+
+    def status(self):
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "remaining": self.remaining,
+                "captured": self.captured,
+                "in_flight": self._in_flight,
+                "last_output": self.last_output
+            }
+
+
+profiler = RequestProfiler()
+
+
+def _timed_view(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        timing = current_timing()
+        if timing is None:
+            return view(*args, **kwargs)
+        timing.in_endpoint = True
+        start = time.perf_counter_ns()
+        try:
+            return view(*args, **kwargs)
+        finally:
+            timing.endpoint_ns += time.perf_counter_ns() - start
+            timing.in_endpoint = False
+    return wrapper
+
+
+def install_request_timing(app):
+    """
+    Cronometra cada request por etapas (routing, cuerpo del endpoint, logging y resto)
+    y habilita el profiler. Se llama después de registrar todas las rutas.
+    """
+    wsgi_app = app.wsgi_app
+
+    def timed_wsgi_app(environ, start_response):
+        environ[_START_KEY] = time.perf_counter_ns()
+        return wsgi_app(environ, start_response)
+
+    app.wsgi_app = timed_wsgi_app
+
+    for endpoint, view in list(app.view_functions.items()):
+        if endpoint != 'static':
+            app.view_functions[endpoint] = _timed_view(view)
+
+    def start_timing():
+        start_ns = request.environ.get(_START_KEY) or time.perf_counter_ns()
+        timing = begin_timing(start_ns)
+        # Contexto de Flask + routing: desde que llega al WSGI hasta el primer before_request
+        timing.routing_ns = time.perf_counter_ns() - start_ns
+        request.environ['profiling.token'] = profiler.start_request()
+
+    def record_timing(response):
+        timing = current_timing()
+        if timing is not None:
+            total = time.perf_counter_ns() - timing.start_ns
+            body = timing.endpoint_ns - timing.logging_in_endpoint_ns
+            stage_timings.record('request.total', total)
+            stage_timings.record('request.routing', timing.routing_ns)
+            stage_timings.record('request.endpoint_body', body)
+            stage_timings.record('request.logging', timing.logging_ns)
+            stage_timings.record('request.other', max(0, total - timing.routing_ns - body - timing.logging_ns))
+            stage_timings.record(f"endpoint.{request.endpoint or 'unmatched'}", timing.endpoint_ns)
+        return response
+
+    def finish_profiling(exc):
+        end_timing()
+        token = request.environ.pop('profiling.token', None)
+        if token is not None:
+            profiler.finish_request(token)
+
+    # Primero de los before_request y último de los after_request (Flask los corre en orden inverso)
+    app.before_request_funcs.setdefault(None, []).insert(0, start_timing)
+    app.after_request_funcs.setdefault(None, []).insert(0, record_timing)
+    app.teardown_request_funcs.setdefault(None, []).append(finish_profiling)
+
+
+# Blueprint de diagnóstico (solo se registra con PROFILING_ENABLED=1)
+debug_bp = Blueprint('debug', __name__, url_prefix='/debug')
+
+@debug_bp.route('/timings', methods=['GET'])
+def get_timings():
+    """Tiempos agregados por etapa; con reset=1 se reinician después de leerlos"""
+    stages = stage_timings.snapshot()
+    if request.args.get('reset') == '1':
+        stage_timings.reset()
+    return jsonify({
+        "status": "success",
+        "stages": stages
+    }), 200
+
+@debug_bp.route('/profile', methods=['POST'])
+def start_profile():
+    """Perfila los próximos N requests (requests=N, mode=cprofile|sample)"""
+    try:
+        count = int(request.args.get('requests', 100))
+        if not 1 <= count <= PROFILE_MAX_REQUESTS:
+            raise ValueError(f"requests must be between 1 and {PROFILE_MAX_REQUESTS}")
+        profiler.arm(count, request.args.get('mode', 'cprofile'))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except ProfilerBusyError:
+        return jsonify({"status": "error", "message": "A profile capture is already running"}), 409
+
+    return jsonify({"status": "accepted", "profile": profiler.status()}), 202
+
+@debug_bp.route('/profile', methods=['GET'])
+def profile_status():
+    """Estado de la captura y archivo de la última"""
+    return jsonify({"status": "success", "profile": profiler.status()}), 200
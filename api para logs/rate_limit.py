@@ -0,0 +1,169 @@
+import collections
+import logging
+import os
+import threading
+import time
+from request_context import RequestContextAdapter
+
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1') == '1'
+RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', '10000'))
+# Como máximo una línea de log por clave limitada en este intervalo (segundos)
+RATE_LIMIT_LOG_INTERVAL = float(os.environ.get('RATE_LIMIT_LOG_INTERVAL', '60'))
+
+_PERIODS = {'second': 1, 'minute': 60, 'hour': 3600}
+
+throttle_log = RequestContextAdapter(logging.getLogger('security'), ('request_id',), timestamp=True)
+
+
+class RateLimit:
+    """Límite de token bucket: capacity tokens que se reponen a rate tokens por segundo"""
+
+    __slots__ = ('rate', 'capacity')
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+
+    @classmethod
+    def parse(cls, spec):
+        """Convierte "10/minute" (o "10/minute;burst=20") en un RateLimit"""
+        limit, _, burst = spec.partition(';')
+        amount, _, period = limit.partition('/')
+        amount = int(amount)
+        capacity = int(burst.partition('=')[2]) if burst else amount
+        return cls(amount / _PERIODS[period.strip()], capacity)
+
+
+class _Bucket:
+    __slots__ = ('tokens', 'updated', 'throttled', 'logged_at')
+
+    def __init__(self, tokens, now):
+        self.tokens = tokens
+        self.updated = now
+        self.throttled = 0
+        self.logged_at = None
+
+
+class TokenBucketTable:
+    """
+    Token buckets por clave en memoria, acotados a max_keys.
+    Al superar el límite se descarta el bucket usado hace más tiempo
+    (equivale a que ese cliente vuelva con el bucket lleno).
+    """
+
+    def __init__(self, max_keys=RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, limit, now=None):
+        """
+        Consume un token de la clave. Devuelve (bucket, 0.0) si se permite
+        o (bucket, segundos hasta el próximo token) si está limitado.
+        """
+        if now is None:
+            now = time.monotonic()
+
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = _Bucket(limit.capacity, now)
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket.tokens = min(limit.capacity, bucket.tokens + (now - bucket.updated) * limit.rate)
+                bucket.updated = now
+
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                return bucket, 0.0
+            bucket.throttled += 1
+            return bucket, (1 - bucket.tokens) / limit.rate
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+def rate_limited(per_ip=None, per_user=None):
+    """
+    Decorador para endpoints del blueprint: declara los límites de la ruta,
+    por ejemplo @rate_limited(per_ip='20/minute', per_user='10/minute').
+    per_user toma el campo username del cuerpo JSON.
+    """
+    limits = (
+        RateLimit.parse(per_ip) if per_ip else None,
+        RateLimit.parse(per_user) if per_user else None
+    )
+
+    def decorator(view):
+        view.rate_limits = limits
+        return view
+    return decorator
+
+
+class RateLimiter:
+    """
+    Aplica los límites declarados con @rate_limited antes de ejecutar el endpoint.
+    Un request limitado se corta sin loguear request ni response; por cada clave
+    se emite como máximo una línea por log_interval con el total de rechazos.
+    """
+
+    def __init__(self, max_keys=RATE_LIMIT_MAX_KEYS, log_interval=RATE_LIMIT_LOG_INTERVAL):
+        self.table = TokenBucketTable(max_keys)
+        self.log_interval = log_interval
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def check(self, view, endpoint, source_ip, get_username):
+        """Devuelve None si el request puede seguir, o los segundos de Retry-After"""
+        limits = getattr(view, 'rate_limits', None)
+        if limits is None:
+            return None
+        ip_limit, user_limit = limits
+
+        now = time.monotonic()
+        if ip_limit is not None:
+            bucket, wait = self.table.consume(('ip', endpoint, source_ip), ip_limit, now)
+            if wait:
+                self._throttled(bucket, now, endpoint, 'source_ip', source_ip, wait, source_ip)
+                return wait
+
+        if user_limit is not None:
+            username = get_username()
+            if isinstance(username, str):
+                bucket, wait = self.table.consume(('user', endpoint, username), user_limit, now)
+                if wait:
+                    self._throttled(bucket, now, endpoint, 'username', username, wait, source_ip)
+                    return wait
+        return None
+
+    def _throttled(self, bucket, now, endpoint, field, key, wait, source_ip):
+        with self._lock:
+            self.throttled += 1
+            if bucket.logged_at is not None and now - bucket.logged_at < self.log_interval:
+                return
+            throttled, bucket.throttled = bucket.throttled, 0
+            bucket.logged_at = now
+
+        extra = {
+            "event_type": "rate_limit",
+            "endpoint": endpoint,
+            "limit_key": field,
+            "source_ip": source_ip,
+            "throttled_requests": throttled,
+            "retry_after_seconds": round(wait, 3)
+        }
+        if field == 'username':
+            extra["username"] = key
+        throttle_log.warning("Rate limit exceeded", extra=extra)
+
+    def stats(self):
+        return {
+            "throttled": self.throttled,
+            "tracked_keys": len(self.table)
+        }
+
+
+# Limitador compartido por el proceso
+limiter = RateLimiter() if RATE_LIMIT_ENABLED else None
@@ -0,0 +1,108 @@
+import contextvars
+import itertools
+import logging
+import os
+import re
+import time
+from datetime import datetime
+
+# Contexto de logging del request en curso (uno por hilo / tarea)
+_current_context = contextvars.ContextVar('request_log_context', default=None)
+
+# IDs entrantes aceptados en X-Request-ID (evita inyectar contenido arbitrario en los logs)
+_VALID_REQUEST_ID = re.compile(r'^[A-Za-z0-9._:-]{1,128}$')
+
+
+class RequestIdGenerator:
+    """
+    Genera IDs de request baratos y monotónicos: un prefijo aleatorio por
+    proceso más un contador. Solo se lee os.urandom al iniciar (y tras un fork).
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.prefix = os.urandom(6).hex()
+        self._counter = itertools.count(1)
+
+    def __call__(self):
+        return f"{self.prefix}-{next(self._counter):010x}"
+
+
+generate_request_id = RequestIdGenerator()
+
+if hasattr(os, 'register_at_fork'):
+    # Cada worker hijo necesita su propio prefijo
+    os.register_at_fork(after_in_child=generate_request_id.reset)
+
+
+def resolve_request_id(incoming=None):
+    """Usa el X-Request-ID entrante si es válido, si no genera uno nuevo"""
+    if incoming and _VALID_REQUEST_ID.match(incoming):
+        return incoming
+    return generate_request_id()
+
+
+class RequestLogContext:
+    """Datos del request que se repiten en cada log, calculados una sola vez"""
+
+    __slots__ = ('request_id', 'source_ip', 'user_agent', 'start_ns')
+
+    def __init__(self, request_id, source_ip, user_agent):
+        self.request_id = request_id
+        self.source_ip = source_ip
+        self.user_agent = user_agent
+        self.start_ns = time.perf_counter_ns()
+
+
+def begin_request(request_id, source_ip, user_agent):
+    """Crea el contexto del request y lo deja activo"""
+    context = RequestLogContext(request_id, source_ip, user_agent)
+    _current_context.set(context)
+    return context
+
+
+def elapsed_ms(context):
+    """Milisegundos transcurridos desde el inicio del request"""
+    return round((time.perf_counter_ns() - context.start_ns) / 1_000_000, 3)
+
+
+def end_request():
+    """Descarta el contexto al terminar el request"""
+    _current_context.set(None)
+
+
+def current_context():
+    """Devuelve el contexto activo, o None fuera de un request"""
+    return _current_context.get()
+
+
+class RequestContextAdapter(logging.LoggerAdapter):
+    """
+    LoggerAdapter que agrega los campos del contexto del request
+    (y opcionalmente el timestamp) al extra de cada log.
+    Los campos que ya vienen en extra no se pisan.
+    """
+
+    def __init__(self, logger, fields=('request_id',), timestamp=False):
+        super().__init__(logger, {})
+        self.fields = tuple(fields)
+        self.timestamp = timestamp
+
+    def process(self, msg, kwargs):
+        extra = kwargs.get('extra')
+        if extra is None:
+            extra = {}
+
+        context = _current_context.get()
+        if context is not None:
+            for field in self.fields:
+                if field not in extra:
+                    extra[field] = getattr(context, field)
+
+        if self.timestamp and 'timestamp' not in extra:
+            extra['timestamp'] = datetime.now().isoformat()
+
+        kwargs['extra'] = extra
+        return msg, kwargs
@@ -38,100 +38,121 @@ def test_endpoint(method, endpoint, data=None, description=""):
     except Exception as e:
         print(f"   ❌ Error: {str(e)}")
 
-def simulate_user_activity():
-    """Simula actividad normal de usuarios"""
-    print("\n📊 SIMULANDO ACTIVIDAD DE USUARIOS")
-    
+# Escenarios: cada uno genera pasos (método, endpoint, datos, descripción, pausa en segundos).
+# Los usa este script y también benchmarks/load_bench.py (con un RNG con semilla y sin pausas)
+
+def user_activity_steps(rng=random):
+    """Pasos de actividad normal de usuarios"""
     usernames = ["juan_perez", "maria_garcia", "admin", "test_user", "developer"]
     
     for i in range(5):
-        username = random.choice(usernames)
+        username = rng.choice(usernames)
         
         # Registro de usuario
-        test_endpoint(
+        yield (
             "POST", 
             "/api/user/register",
             {"username": username, "email": f"{username}@example.com"},
-            f"Registro de usuario #{i+1}"
+            f"Registro de usuario #{i+1}",
+            1
         )
         
-        time.sleep(1)
-        
         # Login de usuario (la mayoría exitosos)
-        password = "password123" if random.random() < 0.8 else "wrong_password"
-        test_endpoint(
+        password = "password123" if rng.random() < 0.8 else "wrong_password"
+        yield (
             "POST",
             "/api/user/login", 
             {"username": username, "password": password},
-            f"Login de usuario #{i+1}"
+            f"Login de usuario #{i+1}",
+            1
         )
-        
-        time.sleep(1)
 
-def simulate_data_processing():
-    """Simula procesamiento de datos"""
-    print("\n🔄 SIMULANDO PROCESAMIENTO DE DATOS")
-    
+def data_processing_steps(rng=random):
+    """Pasos de procesamiento de datos"""
     for i in range(3):
         test_data = {
             "operation": "process_batch",
-            "data": [f"record_{j}" for j in range(random.randint(10, 100))],
-            "priority": random.choice(["high", "medium", "low"])
+            "data": [f"record_{j}" for j in range(rng.randint(10, 100))],
+            "priority": rng.choice(["high", "medium", "low"])
         }
         
-        test_endpoint(
+        yield (
             "POST",
             "/api/data/process",
             test_data,
-            f"Procesamiento de datos #{i+1}"
+            f"Procesamiento de datos #{i+1}",
+            2
         )
-        
-        time.sleep(2)
 
-def simulate_system_events():
-    """Simula eventos del sistema"""
-    print("\n⚠️  SIMULANDO EVENTOS DEL SISTEMA")
-    
+def system_events_steps(rng=random):
+    """Pasos de eventos del sistema"""
     # Generar algunos warnings
     for i in range(2):
-        test_endpoint(
-            "GET",
-            "/api/system/warning",
-            description=f"Warning del sistema #{i+1}"
-        )
-        time.sleep(1)
+        yield ("GET", "/api/system/warning", None, f"Warning del sistema #{i+1}", 1)
     
     # Generar algunos errores
     for i in range(2):
-        test_endpoint(
-            "GET", 
-            "/api/system/error",
-            description=f"Error del sistema #{i+1}"
-        )
-        time.sleep(1)
+        yield ("GET", "/api/system/error", None, f"Error del sistema #{i+1}", 1)
 
-def simulate_brute_force_attack():
-    """Simula un ataque de fuerza bruta"""
-    print("\n🚨 SIMULANDO ATAQUE DE FUERZA BRUTA")
-    
+def brute_force_steps(rng=random):
+    """Pasos de un ataque de fuerza bruta"""
     target_user = "admin"
     passwords = ["123456", "password", "admin", "qwerty", "letmein", "password123"]
     
     for i, password in enumerate(passwords):
-        test_endpoint(
+        yield (
             "POST",
             "/api/user/login",
             {"username": target_user, "password": password},
-            f"Intento de fuerza bruta #{i+1} - {target_user}:{password}"
+            f"Intento de fuerza bruta #{i+1} - {target_user}:{password}",
+            0.5  # Rápido para simular ataque automatizado
         )
-        time.sleep(0.5)  # Rápido para simular ataque automatizado
+
+def health_check_steps(rng=random):
+    """Pasos de health checks"""
+    yield ("GET", "/", None, "Endpoint principal", 0)
+    yield ("GET", "/health", None, "Health check", 0)
+
+SCENARIOS = {
+    "user_activity": user_activity_steps,
+    "data_processing": data_processing_steps,
+    "system_events": system_events_steps,
+    "brute_force": brute_force_steps,
+    "health_checks": health_check_steps
+}
+
+def run_steps(steps):
+    """Ejecuta los pasos de un escenario contra la API"""
+    for method, endpoint, data, description, pause in steps:
+        test_endpoint(method, endpoint, data, description)
+        if pause:
+            time.sleep(pause)
+
+def simulate_user_activity():
+    """Simula actividad normal de usuarios"""
+    print("\n📊 SIMULANDO ACTIVIDAD DE USUARIOS")
+    run_steps(user_activity_steps())
+
+def simulate_data_processing():
+    """Simula procesamiento de datos"""
+    print("\n🔄 SIMULANDO PROCESAMIENTO DE DATOS")
+    run_steps(data_processing_steps())
+
+def simulate_system_events():
+    """Simula eventos del sistema"""
+    print("\n⚠️  SIMULANDO EVENTOS DEL SISTEMA")
+    run_steps(system_events_steps())
+
+def simulate_brute_force_attack():
+    """Simula un ataque de fuerza bruta"""
+    print("\n🚨 SIMULANDO ATAQUE DE FUERZA BRUTA")
+    run_steps(brute_force_steps())
 
 def perform_health_checks():
     """Realiza health checks"""
     print("\n💚 REALIZANDO HEALTH CHECKS")
     
-    test_endpoint("GET", "/", description="Endpoint principal")
-    test_endpoint("GET", "/health", description="Health check")
+    run_steps(health_check_steps())
 
 def main():
     """Función principal del script de prueba"""
@@ -0,0 +1,61 @@
+import gzip
+import json
+
+from config.log_archive import write_archive
+from log_replay import log_files, plan_chunks, replay, window_rules
+
+
+def _write_requests(path, count, remote_addr='10.0.0.7'):
+    with open(path, 'w') as f:
+        for i in range(count):
+            f.write(json.dumps({
+                "asctime": f"2024-05-01 10:00:{i % 60:02d}",
+                "name": "api_microservice",
+                "levelname": "INFO",
+                "message": "Incoming request",
+                "event_type": "api_request",
+                "request_id": f"req-{i}",
+                "method": "GET",
+                "endpoint": "/",
+                "remote_addr": remote_addr
+            }) + "\n")
+
+
+def test_request_flood_by_remote_addr(tmp_path):
+    path = tmp_path / 'api_all.log'
+    _write_requests(path, 120)
+
+    report = replay([str(path)], rules=window_rules(request_flood=100, request_window=60), workers=1)
+
+    window = report["windows"]["requests_by_ip"]
+    assert window["key_field"] == "remote_addr"
+    assert window["events"] == 120
+    assert window["alerts"] == 1
+    assert window["alert_list"][0]["remote_addr"] == "10.0.0.7"
+
+
+def test_request_flood_below_threshold(tmp_path):
+    path = tmp_path / 'api_all.log'
+    _write_requests(path, 50)
+
+    report = replay([str(path)], rules=window_rules(request_flood=100, request_window=60), workers=1)
+
+    assert report["windows"]["requests_by_ip"]["alerts"] == 0
+
+
+def test_unreadable_archives_are_skipped(tmp_path):
+    archive_dir = tmp_path / 'archive'
+    archive_dir.mkdir()
+    segment = tmp_path / 'segment.log'
+    _write_requests(segment, 120)
+    write_archive(str(segment), str(archive_dir / 'api_all-20240501T100000-1-000001.ndjson.gz'), 'api_all')
+    # Un gzip sin footer y un archivo truncado
+    (archive_dir / 'api_all-20240502T100000-1-000001.ndjson.gz').write_bytes(gzip.compress(b'{}\n'))
+    (archive_dir / 'api_all-20240503T100000-1-000001.ndjson.gz').write_bytes(b'tiny')
+
+    paths = log_files('api_all', str(tmp_path), archives=True, archive_dir=str(archive_dir))
+    assert len(plan_chunks(paths)) == 1
+
+    report = replay(paths, rules=window_rules(request_flood=100, request_window=60), workers=1)
+
+    assert report["windows"]["requests_by_ip"]["events"] == 120